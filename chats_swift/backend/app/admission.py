@@ -0,0 +1,205 @@
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from enum import IntEnum
+from functools import lru_cache
+from typing import AsyncIterator, Callable
+
+from fastapi import HTTPException, status
+
+from .config import settings
+
+
+class Priority(IntEnum):
+    """Lower value wins: sends/writes beat history reads, which beat friend lists."""
+
+    send = 0
+    history = 1
+    friends = 2
+
+
+class Overloaded(Exception):
+    def __init__(self, retry_after: float) -> None:
+        super().__init__("overloaded")
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    __slots__ = ("priority", "seq", "future", "enqueued_at", "cancelled")
+
+    def __init__(self, priority: int, seq: int, future: asyncio.Future, enqueued_at: float) -> None:
+        self.priority = priority
+        self.seq = seq
+        self.future = future
+        self.enqueued_at = enqueued_at
+        self.cancelled = False
+
+    def __lt__(self, other: "_Waiter") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class AdaptiveLimiter:
+    """AIMD concurrency limit with a priority queue and a queue-time budget.
+
+    The limit grows by ~1 per `limit` fast completions and shrinks multiplicatively
+    when a request's service time exceeds the latency target. Requests beyond the
+    limit wait in priority order; a request whose expected wait already exceeds the
+    budget is shed immediately, and one that waits past it is shed on timeout.
+    """
+
+    def __init__(
+        self,
+        initial_limit: int = 32,
+        min_limit: int = 4,
+        max_limit: int = 256,
+        queue_budget_seconds: float = 0.5,
+        latency_target_seconds: float = 0.8,
+        max_queue: int = 1000,
+        backoff_ratio: float = 0.9,
+    ) -> None:
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.queue_budget_seconds = queue_budget_seconds
+        self.latency_target_seconds = latency_target_seconds
+        self.max_queue = max_queue
+        self.backoff_ratio = backoff_ratio
+        self.in_flight = 0
+        self.shed = 0
+        self.service_time_ewma = 0.0
+        self._queue: list[_Waiter] = []
+        self._queued = 0
+        self._queued_by_priority: dict[int, int] = {}
+        self._seq = itertools.count()
+        self._last_decrease = 0.0
+
+    @property
+    def queued(self) -> int:
+        return self._queued
+
+    async def acquire(self, priority: int) -> float:
+        """Wait for a slot; returns the time spent queued or raises Overloaded."""
+        if self.in_flight < int(self.limit) and not self._queued:
+            self.in_flight += 1
+            return 0.0
+
+        ahead = sum(count for level, count in self._queued_by_priority.items() if level <= priority)
+        expected_wait = (ahead + 1) / max(int(self.limit), 1) * self.service_time_ewma
+        if expected_wait > self.queue_budget_seconds:
+            self._reject()
+        if self._queued >= self.max_queue and not self._evict_lower_than(priority):
+            self._reject()
+
+        loop = asyncio.get_running_loop()
+        waiter = _Waiter(priority, next(self._seq), loop.create_future(), time.perf_counter())
+        heapq.heappush(self._queue, waiter)
+        self._count(waiter, 1)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), self.queue_budget_seconds)
+        except asyncio.TimeoutError:
+            if not waiter.future.done():
+                self._cancel(waiter)
+                self._reject()
+        except BaseException:
+            if waiter.future.done() and not waiter.future.cancelled() and waiter.future.exception() is None:
+                # We were handed a slot while being cancelled; give it back.
+                self.release(0.0)
+            else:
+                self._cancel(waiter)
+            raise
+        if waiter.future.exception() is not None:
+            raise waiter.future.exception()
+        return time.perf_counter() - waiter.enqueued_at
+
+    def release(self, service_time: float) -> None:
+        self.in_flight -= 1
+        if service_time > 0:
+            self.service_time_ewma = (
+                service_time if not self.service_time_ewma else 0.9 * self.service_time_ewma + 0.1 * service_time
+            )
+            now = time.perf_counter()
+            if service_time > self.latency_target_seconds:
+                # At most one decrease per target interval, so a burst of slow
+                # completions from the same overload episode counts once.
+                if now - self._last_decrease > self.latency_target_seconds:
+                    self.limit = max(self.min_limit, self.limit * self.backoff_ratio)
+                    self._last_decrease = now
+            else:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+        self._wake()
+
+    def _wake(self) -> None:
+        while self._queue and self.in_flight < int(self.limit):
+            waiter = heapq.heappop(self._queue)
+            if waiter.cancelled or waiter.future.done():
+                continue
+            self._count(waiter, -1)
+            self.in_flight += 1
+            waiter.future.set_result(None)
+
+    def _cancel(self, waiter: _Waiter) -> None:
+        if not waiter.cancelled:
+            waiter.cancelled = True
+            self._count(waiter, -1)
+
+    def _count(self, waiter: _Waiter, delta: int) -> None:
+        self._queued += delta
+        self._queued_by_priority[waiter.priority] = self._queued_by_priority.get(waiter.priority, 0) + delta
+
+    def _evict_lower_than(self, priority: int) -> bool:
+        victims = [waiter for waiter in self._queue if not waiter.cancelled and waiter.priority > priority]
+        if not victims:
+            return False
+        victim = max(victims)
+        self._cancel(victim)
+        self.shed += 1
+        victim.future.set_exception(Overloaded(self._retry_after()))
+        return True
+
+    def _reject(self) -> None:
+        self.shed += 1
+        raise Overloaded(self._retry_after())
+
+    def _retry_after(self) -> float:
+        return max(1.0, self.queue_budget_seconds * 2)
+
+
+@lru_cache(maxsize=1)
+def get_admission_limiter() -> AdaptiveLimiter:
+    return AdaptiveLimiter(
+        initial_limit=settings.admission_initial_limit,
+        min_limit=settings.admission_min_limit,
+        max_limit=settings.admission_max_limit,
+        queue_budget_seconds=settings.admission_queue_budget_ms / 1000,
+        latency_target_seconds=settings.admission_latency_target_ms / 1000,
+        max_queue=settings.admission_max_queue,
+    )
+
+
+def admit(priority: Priority) -> Callable[[], AsyncIterator[None]]:
+    """Route dependency holding an admission slot for the duration of the handler."""
+
+    async def _dependency() -> AsyncIterator[None]:
+        if not settings.admission_enabled:
+            yield
+            return
+        limiter = get_admission_limiter()
+        try:
+            await limiter.acquire(priority)
+        except Overloaded as exc:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="服务繁忙，请稍后重试",
+                headers={"Retry-After": str(math.ceil(exc.retry_after))},
+            )
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            limiter.release(time.perf_counter() - started)
+
+    return _dependency
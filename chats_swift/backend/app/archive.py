@@ -0,0 +1,325 @@
+"""Cold message archive: per-chat, append-only, block-compressed segment files.
+
+Layout under `CHAT_ARCHIVE_DIR`:
+
+    <chat_id>/<first_us>-<last_us>.seg   concatenated compressed blocks of NDJSON
+    <chat_id>/<first_us>-<last_us>.idx   header + one record per block
+
+Each block holds up to `archive_block_messages` flattened message rows (the
+MessageModel shape, sender_name resolved at archive time) in (created_at, id)
+order, compressed independently. A read maps the segment and decompresses
+only the blocks it needs. Segments are written to a temp name and renamed,
+with the index last, so readers never see a partial segment.
+
+Run the mover from cron:
+
+    python -m app.archive --older-than-days 90
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import base64
+import bisect
+import json
+import mmap
+import os
+import struct
+import threading
+import zlib
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterator, Sequence
+from uuid import UUID
+
+from .compression import _zstd
+from .config import settings
+
+Key = tuple[int, bytes]  # (created_at in µs since epoch, uuid bytes) == Postgres (created_at, id) order
+
+_MAGIC = b"CHATSEG1"
+_HEADER = struct.Struct("<8sBq16sI")  # magic, codec, last_us, last_id, block count
+_RECORD = struct.Struct("<q16sQII")  # first_us, first_id, offset, length, rows
+_ZLIB, _ZSTD = 0, 1
+
+
+def _micros(timestamp: str) -> int:
+    moment = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return int(moment.timestamp()) * 1_000_000 + moment.microsecond
+
+
+def message_key(row: dict) -> Key:
+    return _micros(row["created_at"]), UUID(str(row["id"])).bytes
+
+
+def key_timestamp(key: Key) -> str:
+    """PostgREST-compatible timestamp for the created_at half of a key."""
+    seconds, micros = divmod(key[0], 1_000_000)
+    moment = datetime.fromtimestamp(seconds, timezone.utc).replace(microsecond=micros)
+    return moment.isoformat(timespec="microseconds")
+
+
+def key_id(key: Key) -> str:
+    return str(UUID(bytes=key[1]))
+
+
+def encode_cursor(key: Key) -> str:
+    """Opaque history cursor; valid for hot and archived messages alike."""
+    return base64.urlsafe_b64encode(struct.pack("<q16s", *key)).decode().rstrip("=")
+
+
+def decode_cursor(token: str) -> Key:
+    try:
+        return struct.unpack("<q16s", base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+    except (ValueError, struct.error):
+        raise ValueError("分页游标无效") from None
+
+
+def _compress(codec: int, data: bytes) -> bytes:
+    if codec == _ZSTD:
+        return _zstd().ZstdCompressor(level=3).compress(data)
+    return zlib.compress(data, 6)
+
+
+def _decompress(codec: int, data: bytes) -> bytes:
+    if codec == _ZSTD:
+        return _zstd().ZstdDecompressor().decompress(data)
+    return zlib.decompress(data)
+
+
+class _Segment:
+    """One mapped segment and its block index."""
+
+    def __init__(self, path: Path) -> None:
+        index = path.with_suffix(".idx").read_bytes()
+        magic, self.codec, last_us, last_id, blocks = _HEADER.unpack_from(index)
+        if magic != _MAGIC:
+            raise ValueError(f"{path} is not a message archive segment")
+        self.last_key: Key = (last_us, last_id)
+        self.first_keys: list[Key] = []
+        self.blocks: list[tuple[int, int]] = []
+        for position in range(blocks):
+            first_us, first_id, offset, length, _ = _RECORD.unpack_from(index, _HEADER.size + position * _RECORD.size)
+            self.first_keys.append((first_us, first_id))
+            self.blocks.append((offset, length))
+        self._file = path.open("rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def block(self, position: int) -> list[dict]:
+        offset, length = self.blocks[position]
+        data = _decompress(self.codec, self._map[offset : offset + length])
+        return [json.loads(line) for line in data.splitlines()]
+
+    def close(self) -> None:
+        self._map.close()
+        self._file.close()
+
+
+class MessageArchive:
+    def __init__(
+        self,
+        root: str | Path,
+        block_messages: int = 256,
+        max_open_segments: int = 64,
+        shared: bool = False,
+    ) -> None:
+        self.root = Path(root)
+        self.shared = shared
+        self.block_messages = block_messages
+        self.max_open_segments = max_open_segments
+        self._open: OrderedDict[Path, _Segment] = OrderedDict()
+        self._lock = threading.Lock()  # reads run on executor threads
+
+    # Reads ----------------------------------------------------------------------
+
+    def segment_paths(self, chat_id: str) -> list[Path]:
+        directory = self.root / str(chat_id).lower()
+        if not directory.is_dir():
+            return []
+        return sorted(path.with_suffix(".seg") for path in directory.glob("*.idx"))
+
+    def high_water(self, chat_id: str) -> Key | None:
+        paths = self.segment_paths(chat_id)
+        return self._segment(paths[-1]).last_key if paths else None
+
+    def read_before(self, chat_id: str, before: Key | None, limit: int) -> list[dict]:
+        """Up to `limit` newest archived rows with key < `before`, oldest first."""
+        collected: list[dict] = []
+        for path in reversed(self.segment_paths(chat_id)):
+            segment = self._segment(path)
+            position = len(segment.blocks) if before is None else bisect.bisect_left(segment.first_keys, before)
+            for block in range(position - 1, -1, -1):
+                rows = segment.block(block)
+                if before is not None:
+                    rows = [row for row in rows if message_key(row) < before]
+                collected[:0] = rows
+                if len(collected) >= limit:
+                    return collected[-limit:]
+        return collected
+
+    def iter_after(self, chat_id: str, after: Key | None) -> Iterator[list[dict]]:
+        """Archived rows with key > `after`, oldest first, one block at a time."""
+        for path in self.segment_paths(chat_id):
+            segment = self._segment(path)
+            if after is not None and segment.last_key <= after:
+                continue
+            start = 0 if after is None else max(bisect.bisect_right(segment.first_keys, after) - 1, 0)
+            for block in range(start, len(segment.blocks)):
+                rows = segment.block(block)
+                if after is not None:
+                    rows = [row for row in rows if message_key(row) > after]
+                if rows:
+                    yield rows
+
+    def locate(self, chat_id: str, message_id: str) -> Key | None:
+        """Key of an archived message; scans blocks, so only for rare lookups such as export resume."""
+        for rows in self.iter_after(chat_id, None):
+            for row in rows:
+                if row["id"] == message_id:
+                    return message_key(row)
+        return None
+
+    def _segment(self, path: Path) -> _Segment:
+        with self._lock:
+            segment = self._open.get(path)
+            if segment is not None:
+                self._open.move_to_end(path)
+                return segment
+            segment = self._open[path] = _Segment(path)
+            while len(self._open) > self.max_open_segments:
+                # No explicit close: a reader on another thread may still hold it;
+                # the map and file are released with the last reference.
+                self._open.popitem(last=False)
+            return segment
+
+    # Writes ---------------------------------------------------------------------
+
+    def check_durable(self) -> None:
+        """Raise unless rows may be deleted once they are in this archive.
+
+        Archived rows exist only in the segments. Segments on a host's local disk
+        would be lost with the host and invisible to other workers, and a missing
+        root usually means the shared volume is not mounted.
+        """
+        if not self.shared:
+            raise RuntimeError(
+                "refusing to archive: set CHAT_ARCHIVE_SHARED_STORAGE=true once CHAT_ARCHIVE_DIR is shared storage"
+            )
+        if not self.root.is_dir():
+            raise RuntimeError(f"refusing to archive: {self.root} does not exist (is the shared volume mounted?)")
+
+    def append(self, chat_id: str, rows: Sequence[dict]) -> Path:
+        """Write `rows` (sorted by key, all newer than the high-water mark) as a new segment."""
+        codec = _ZSTD if _zstd() is not None else _ZLIB
+        keys = [message_key(row) for row in rows]
+        directory = self.root / str(chat_id).lower()
+        directory.mkdir(parents=True, exist_ok=True)
+        name = f"{keys[0][0]:020d}-{keys[-1][0]:020d}"
+        segment_path, index_path = directory / f"{name}.seg", directory / f"{name}.idx"
+
+        records = []
+        offset = 0
+        with open(f"{segment_path}.tmp", "wb") as handle:
+            for start in range(0, len(rows), self.block_messages):
+                chunk = rows[start : start + self.block_messages]
+                payload = _compress(
+                    codec,
+                    b"".join(
+                        json.dumps(row, ensure_ascii=False, separators=(",", ":")).encode() + b"\n"
+                        for row in chunk
+                    ),
+                )
+                handle.write(payload)
+                records.append(_RECORD.pack(*keys[start], offset, len(payload), len(chunk)))
+                offset += len(payload)
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.replace(f"{segment_path}.tmp", segment_path)
+        with open(f"{index_path}.tmp", "wb") as handle:
+            handle.write(_HEADER.pack(_MAGIC, codec, *keys[-1], len(records)))
+            handle.write(b"".join(records))
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.replace(f"{index_path}.tmp", index_path)
+        return segment_path
+
+
+@lru_cache(maxsize=1)
+def get_message_archive() -> MessageArchive | None:
+    if not settings.archive_dir:
+        return None
+    return MessageArchive(
+        settings.archive_dir,
+        block_messages=settings.archive_block_messages,
+        max_open_segments=settings.archive_max_open_segments,
+        shared=settings.archive_shared_storage,
+    )
+
+
+async def archive_messages(client, archive: MessageArchive, cutoff: datetime, page_size: int = 5000) -> int:
+    """Move rows older than `cutoff` into the archive, keeping each chat's newest row hot.
+
+    Rows at or below a chat's high-water mark are already archived (a previous
+    run died between writing and deleting) and are only deleted.
+    """
+    archive.check_durable()
+    from .services.social_service import MEMBER_DELETE_CHUNK, SocialService  # imports this module
+
+    service = SocialService(client)
+    moved = 0
+    after: tuple[str, str, str] | None = None  # (chat_id, created_at, id) of the last row read
+    newest: dict[str, str | None] = {}
+    while True:
+        rows = await service.fetch_cold_messages(cutoff.isoformat(), after, page_size)
+        by_chat: dict[str, list[dict]] = {}
+        for row in rows:
+            by_chat.setdefault(row["chat_id"], []).append(row)
+        for chat_id, chat_rows in by_chat.items():
+            if chat_id not in newest:
+                # chat_summaries reads the last message from the hot table.
+                newest[chat_id] = await service.newest_message_id(chat_id)
+            chat_rows = [row for row in chat_rows if row["id"] != newest[chat_id]]
+            high_water = archive.high_water(chat_id)
+            fresh = [
+                service.flatten_message(row)
+                for row in chat_rows
+                if high_water is None or message_key(row) > high_water
+            ]
+            if fresh:
+                await asyncio.to_thread(archive.append, chat_id, fresh)
+            ids = [row["id"] for row in chat_rows]
+            for start in range(0, len(ids), MEMBER_DELETE_CHUNK):
+                await service.delete_messages(ids[start : start + MEMBER_DELETE_CHUNK])
+            moved += len(fresh)
+        if len(rows) < page_size:
+            return moved
+        last = rows[-1]
+        after = (last["chat_id"], last["created_at"], last["id"])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Move cold messages into the segment archive.")
+    parser.add_argument("--older-than-days", type=float, default=settings.archive_after_days)
+    parser.add_argument("--page-size", type=int, default=5000)
+    args = parser.parse_args()
+
+    archive = get_message_archive()
+    if archive is None:
+        raise SystemExit("CHAT_ARCHIVE_DIR is not set")
+    try:
+        archive.check_durable()
+    except RuntimeError as exc:
+        raise SystemExit(str(exc))
+    from .supabase_client import get_supabase
+
+    cutoff = datetime.now(timezone.utc) - timedelta(days=args.older_than_days)
+    moved = asyncio.run(archive_messages(get_supabase(), archive, cutoff, page_size=args.page_size))
+    print(f"archived {moved} messages older than {cutoff.isoformat()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+"""Message attachments: streamed uploads, pluggable storage, thumbnails off the event loop.
+
+An upload is written to the store as it arrives, in buffered chunks, so a
+request never holds the whole file. Its metadata (name, type, size, sha256,
+and for images the dimensions and a JPEG thumbnail) is saved next to it.
+Sending a message with `attachment_ids` copies that metadata into the message
+row, so history pages carry a few hundred bytes per attachment and clients
+fetch the media itself lazily.
+
+Keys under a store:
+
+    <chat_id>/<attachment_id>              the uploaded bytes
+    <chat_id>/<attachment_id>.json         metadata (AttachmentModel fields plus uploader and sha256)
+    <chat_id>/<attachment_id>.thumb.jpg    thumbnail, images only
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import importlib.util
+import json
+import logging
+import os
+import re
+from concurrent.futures import BrokenExecutor
+from functools import lru_cache
+from pathlib import Path
+from typing import TYPE_CHECKING, AsyncIterator, Iterator, Protocol
+from uuid import UUID, uuid4
+
+from .config import settings
+from .thumbnails import make_thumbnail
+
+if TYPE_CHECKING:
+    from concurrent.futures import ProcessPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Uploads reach the store in writes of at least this size, not per network read.
+_WRITE_BUFFER_BYTES = 1 << 20
+# What a message row carries per attachment (AttachmentModel).
+_MESSAGE_FIELDS = ("id", "name", "mime_type", "size", "width", "height", "thumbnail")
+
+
+class AttachmentTooLarge(ValueError):
+    pass
+
+
+class Upload(Protocol):
+    def write(self, data: bytes) -> None: ...
+
+    def commit(self) -> None: ...
+
+    def abort(self) -> None: ...
+
+
+class AttachmentStore(Protocol):
+    """Blocking storage API; callers run it in worker threads."""
+
+    def open_upload(self, key: str) -> Upload: ...
+
+    def put(self, key: str, data: bytes) -> None: ...
+
+    def get(self, key: str) -> bytes | None: ...
+
+    def iter_bytes(self, key: str, chunk_size: int = 1 << 16) -> Iterator[bytes]: ...
+
+    def local_path(self, key: str) -> Path:
+        """A readable file with the object's bytes, for the thumbnail workers."""
+        ...
+
+
+class _LocalUpload:
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._tmp = path.with_name(f"{path.name}.part")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._handle = self._tmp.open("wb")
+
+    def write(self, data: bytes) -> None:
+        self._handle.write(data)
+
+    def commit(self) -> None:
+        self._handle.flush()
+        os.fsync(self._handle.fileno())
+        self._handle.close()
+        os.replace(self._tmp, self.path)
+
+    def abort(self) -> None:
+        self._handle.close()
+        self._tmp.unlink(missing_ok=True)
+
+
+class LocalAttachmentStore:
+    """Files under `root`; fine for one host, a shared volume, or tests."""
+
+    def __init__(self, root: str | Path) -> None:
+        self.root = Path(root)
+
+    def open_upload(self, key: str) -> _LocalUpload:
+        return _LocalUpload(self.local_path(key))
+
+    def put(self, key: str, data: bytes) -> None:
+        upload = self.open_upload(key)
+        upload.write(data)
+        upload.commit()
+
+    def get(self, key: str) -> bytes | None:
+        try:
+            return self.local_path(key).read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def iter_bytes(self, key: str, chunk_size: int = 1 << 16) -> Iterator[bytes]:
+        with self.local_path(key).open("rb") as handle:
+            while chunk := handle.read(chunk_size):
+                yield chunk
+
+    def local_path(self, key: str) -> Path:
+        return self.root / key
+
+
+@lru_cache(maxsize=1)
+def get_attachment_store() -> AttachmentStore | None:
+    if not settings.attachment_dir:
+        return None
+    return LocalAttachmentStore(settings.attachment_dir)
+
+
+@lru_cache(maxsize=1)
+def get_thumbnail_pool() -> ProcessPoolExecutor | None:
+    """Worker processes for image decoding; None when Pillow is not installed."""
+    if settings.thumbnail_workers <= 0 or importlib.util.find_spec("PIL") is None:
+        return None
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    # spawn: the parent runs threads (the Supabase executor), which fork would copy mid-flight.
+    return ProcessPoolExecutor(settings.thumbnail_workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+def shutdown_thumbnail_pool() -> None:
+    if get_thumbnail_pool.cache_info().currsize:
+        pool = get_thumbnail_pool()
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+        get_thumbnail_pool.cache_clear()
+
+
+def attachment_key(chat_id: UUID | str, attachment_id: UUID | str, suffix: str = "") -> str:
+    # Both halves are parsed as UUIDs so a key can never escape its chat directory.
+    return f"{UUID(str(chat_id))}/{UUID(str(attachment_id))}{suffix}"
+
+
+_UNSAFE_NAME = re.compile(r'[\x00-\x1f/\\"]+')
+
+
+def clean_filename(name: str | None) -> str:
+    cleaned = _UNSAFE_NAME.sub("_", (name or "").strip())[:255]
+    return cleaned or "attachment"
+
+
+async def save_upload(
+    store: AttachmentStore,
+    chat_id: UUID,
+    uploader_id: str,
+    name: str | None,
+    mime_type: str,
+    chunks: AsyncIterator[bytes],
+    max_bytes: int,
+) -> dict:
+    """Stream `chunks` into the store, probe images, and persist the metadata; returns it."""
+    attachment_id = str(uuid4())
+    key = attachment_key(chat_id, attachment_id)
+    upload = await asyncio.to_thread(store.open_upload, key)
+    digest = hashlib.sha256()
+    size = 0
+    buffer = bytearray()
+    try:
+        async for chunk in chunks:
+            size += len(chunk)
+            if size > max_bytes:
+                raise AttachmentTooLarge(f"附件不能超过 {max_bytes // (1 << 20)} MB")
+            digest.update(chunk)
+            buffer += chunk
+            if len(buffer) >= _WRITE_BUFFER_BYTES:
+                data, buffer = bytes(buffer), bytearray()
+                await asyncio.to_thread(upload.write, data)
+        if not size:
+            raise ValueError("附件内容为空")
+        if buffer:
+            await asyncio.to_thread(upload.write, bytes(buffer))
+        await asyncio.to_thread(upload.commit)
+    except BaseException:
+        await asyncio.to_thread(upload.abort)
+        raise
+
+    meta = {
+        "id": attachment_id,
+        "name": clean_filename(name),
+        "mime_type": mime_type,
+        "size": size,
+        "width": None,
+        "height": None,
+        "thumbnail": False,
+    }
+    if mime_type.startswith("image/"):
+        probed = await _probe_image(store, key)
+        if probed is not None:
+            width, height, thumbnail = probed
+            await asyncio.to_thread(store.put, attachment_key(chat_id, attachment_id, ".thumb.jpg"), thumbnail)
+            meta.update(width=width, height=height, thumbnail=True)
+    record = {**meta, "chat_id": str(chat_id), "uploader_id": uploader_id.lower(), "sha256": digest.hexdigest()}
+    await asyncio.to_thread(
+        store.put, attachment_key(chat_id, attachment_id, ".json"), json.dumps(record).encode()
+    )
+    return meta
+
+
+async def _probe_image(store: AttachmentStore, key: str) -> tuple[int, int, bytes] | None:
+    pool = get_thumbnail_pool()
+    if pool is None:
+        return None
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(
+        pool,
+        make_thumbnail,
+        str(store.local_path(key)),
+        settings.thumbnail_max_edge,
+        settings.thumbnail_max_pixels,
+    )
+    try:
+        return await asyncio.wait_for(future, settings.thumbnail_timeout_seconds)
+    except asyncio.TimeoutError:
+        # The attachment is still usable; clients fall back to the full image.
+        return None
+    except BrokenExecutor:
+        logger.warning("thumbnail worker died; restarting the pool")
+        shutdown_thumbnail_pool()
+        return None
+
+
+def load_attachments(store: AttachmentStore, chat_id: UUID, uploader_id: str, attachment_ids: list[str]) -> list[dict]:
+    """Metadata for a message's attachments, in the order given; blocking."""
+    attachments = []
+    for attachment_id in attachment_ids:
+        try:
+            raw = store.get(attachment_key(chat_id, attachment_id, ".json"))
+        except ValueError:
+            raw = None
+        record = json.loads(raw) if raw else None
+        if record is None or record["uploader_id"] != uploader_id.lower():
+            raise ValueError("附件不存在或不属于当前用户")
+        attachments.append({field: record[field] for field in _MESSAGE_FIELDS})
+    return attachments
+
+
+def read_attachment_meta(store: AttachmentStore, chat_id: UUID, attachment_id: UUID) -> dict | None:
+    raw = store.get(attachment_key(chat_id, attachment_id, ".json"))
+    return json.loads(raw) if raw else None
+
@@ -0,0 +1,177 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any
+
+from fastapi import HTTPException, Request, WebSocket, status
+
+from .config import settings
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+token_checks = registry.counter(
+    "chat_auth_tokens_total",
+    "Bearer tokens checked, by outcome (cache_hit, verified, rejected).",
+    ("result",),
+)
+_CACHE_HIT = token_checks.labels("cache_hit")
+_VERIFIED = token_checks.labels("verified")
+_REJECTED = token_checks.labels("rejected")
+
+
+class AuthError(Exception):
+    pass
+
+
+@lru_cache(maxsize=1)
+def _jwt() -> Any:
+    import jwt
+
+    return jwt
+
+
+class TokenVerifier:
+    """Supabase JWT verification behind an LRU of verified claims.
+
+    Entries are keyed by the token's SHA-256, so raw tokens are never held, and
+    each lives until the token's own `exp`. A reconnect storm after a deploy then
+    costs one hash and a dict lookup per client instead of a signature check.
+    Rejected tokens are remembered briefly, so replaying a bad token cannot buy
+    a signature check per attempt either.
+    """
+
+    def __init__(
+        self,
+        secret: str,
+        audience: str | None = "authenticated",
+        max_entries: int = 100_000,
+        leeway_seconds: float = 30.0,
+        reject_ttl_seconds: float = 30.0,
+    ) -> None:
+        self.secret = secret
+        self.audience = audience
+        self.max_entries = max_entries
+        self.leeway_seconds = leeway_seconds
+        self.reject_ttl_seconds = reject_ttl_seconds
+        self._cache: OrderedDict[bytes, tuple[float, dict | str]] = OrderedDict()
+
+    def verify(self, token: str) -> dict:
+        digest = hashlib.sha256(token.encode()).digest()
+        now = time.time()
+        entry = self._cache.get(digest)
+        if entry is not None:
+            expires_at, outcome = entry
+            if now < expires_at:
+                self._cache.move_to_end(digest)
+                if isinstance(outcome, str):
+                    _REJECTED.inc()
+                    raise AuthError(outcome)
+                _CACHE_HIT.inc()
+                return outcome
+            del self._cache[digest]
+
+        jwt = _jwt()
+        try:
+            claims = jwt.decode(
+                token,
+                self.secret,
+                algorithms=["HS256"],
+                audience=self.audience,
+                leeway=self.leeway_seconds,
+                options={"require": ["exp", "sub"], "verify_aud": self.audience is not None},
+            )
+        except jwt.PyJWTError as exc:
+            self._remember(digest, now + self.reject_ttl_seconds, str(exc) or type(exc).__name__)
+            _REJECTED.inc()
+            raise AuthError(str(exc)) from None
+        self._remember(digest, float(claims["exp"]) + self.leeway_seconds, claims)
+        _VERIFIED.inc()
+        return claims
+
+    def _remember(self, digest: bytes, expires_at: float, outcome: dict | str) -> None:
+        self._cache[digest] = (expires_at, outcome)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+
+@lru_cache(maxsize=1)
+def get_token_verifier() -> TokenVerifier | None:
+    if not settings.supabase_jwt_secret:
+        if settings.auth_mode == "required":
+            raise RuntimeError("CHAT_AUTH_MODE=required needs CHAT_SUPABASE_JWT_SECRET")
+        if settings.auth_mode != "off":
+            logger.warning("CHAT_SUPABASE_JWT_SECRET is not set; bearer tokens are not verified")
+        return None
+    return TokenVerifier(
+        settings.supabase_jwt_secret,
+        audience=settings.auth_audience or None,
+        max_entries=settings.auth_cache_size,
+        leeway_seconds=settings.auth_leeway_seconds,
+    )
+
+
+def _bearer(authorization: str | None) -> str | None:
+    if not authorization:
+        return None
+    scheme, _, token = authorization.partition(" ")
+    return token.strip() if scheme.lower() == "bearer" and token.strip() else None
+
+
+def caller_from_token(token: str | None) -> str | None:
+    """Verified `sub` (lowercased) for `token`; None when auth is off or optional and absent.
+
+    Raises AuthError when a token is required but missing, or present but invalid.
+    """
+    if settings.auth_mode == "off":
+        return None
+    verifier = get_token_verifier()
+    if verifier is None:
+        return None
+    if token is None:
+        if settings.auth_mode == "required":
+            raise AuthError("missing bearer token")
+        return None
+    return str(verifier.verify(token)["sub"]).lower()
+
+
+async def authenticate(request: Request) -> str | None:
+    """Router dependency: the verified caller, or None for anonymous legacy clients."""
+    try:
+        return caller_from_token(_bearer(request.headers.get("authorization")))
+    except AuthError:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="登录已失效，请重新登录",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+
+def websocket_caller(websocket: WebSocket) -> str | None:
+    """Same check for the websocket handshake; browsers can only pass `access_token` in the query."""
+    token = _bearer(websocket.headers.get("authorization")) or websocket.query_params.get("access_token")
+    return caller_from_token(token)
+
+
+def ensure_caller(caller: str | None, claimed_id: object) -> None:
+    """Reject a request that acts as someone other than the token's subject."""
+    if caller is not None and caller != str(claimed_id).lower():
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="无权以其他用户身份操作")
+
+
+def require_caller(caller: str | None, claimed_id: object) -> None:
+    """`ensure_caller` that also refuses anonymous callers whenever tokens can be verified."""
+    if caller is None and settings.auth_mode != "off" and get_token_verifier() is not None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="请先登录",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    ensure_caller(caller, claimed_id)
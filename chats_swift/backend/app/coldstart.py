@@ -0,0 +1,127 @@
+"""Cold-start profile: how long a fresh interpreter takes to import the app, and where it goes.
+
+    python -m app.coldstart                      # median over 5 runs, top modules, per-package totals
+    python -m app.coldstart --budget-ms 450      # exit 1 over budget, or if a deferred module loads eagerly
+
+Each run is a new interpreter started with `-X importtime` that imports
+`app.main`. The budget is checked against the median import time, so one
+noisy run does not fail CI. Modules in `DEFERRED` must stay out of the
+import graph entirely; that check is deterministic and catches most
+regressions long before the timing does.
+
+Missing `CHAT_SUPABASE_*` variables are filled with placeholders; nothing
+connects during an import.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+
+# Loaded on first use by the code that needs them; importing app.main must not pull them in.
+DEFERRED = ("supabase", "postgrest", "gotrue", "jwt", "PIL", "multiprocessing", "redis")
+
+_CHILD = """
+import json, sys, time
+started = time.perf_counter()
+import app.main
+elapsed = time.perf_counter() - started
+print(json.dumps({"import_ms": elapsed * 1000, "modules": sorted(sys.modules)}))
+"""
+
+
+def _run_once(env: dict[str, str]) -> tuple[float, float, dict[str, tuple[int, int]], list[str]]:
+    started = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _CHILD],
+        capture_output=True,
+        text=True,
+        env=env,
+        cwd=Path(__file__).resolve().parent.parent,
+        check=False,
+    )
+    wall_ms = (time.perf_counter() - started) * 1000
+    if completed.returncode != 0:
+        raise SystemExit(f"importing app.main failed:\n{completed.stderr[-2000:]}")
+    report = json.loads(completed.stdout.strip().splitlines()[-1])
+    timings: dict[str, tuple[int, int]] = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        timings[name.strip()] = (int(self_us), int(cumulative_us))
+    return report["import_ms"], wall_ms, timings, report["modules"]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=20, help="modules to list by cumulative time")
+    parser.add_argument("--budget-ms", type=float, help="fail when the median import of app.main exceeds this")
+    parser.add_argument("--json", action="store_true", help="print the summary as JSON")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.setdefault("CHAT_SUPABASE_URL", "http://localhost:54321")
+    env.setdefault("CHAT_SUPABASE_SERVICE_KEY", "coldstart")
+
+    imports, walls = [], []
+    per_module: dict[str, list[tuple[int, int]]] = defaultdict(list)
+    modules: list[str] = []
+    for _ in range(max(args.runs, 1)):
+        import_ms, wall_ms, timings, modules = _run_once(env)
+        imports.append(import_ms)
+        walls.append(wall_ms)
+        for name, timing in timings.items():
+            per_module[name].append(timing)
+
+    median_self = {name: statistics.median(t[0] for t in runs) / 1000 for name, runs in per_module.items()}
+    median_cumulative = {name: statistics.median(t[1] for t in runs) / 1000 for name, runs in per_module.items()}
+    packages: dict[str, float] = defaultdict(float)
+    for name, self_ms in median_self.items():
+        packages[name.split(".")[0]] += self_ms
+    eager = sorted({name.split(".")[0] for name in modules} & set(DEFERRED))
+
+    summary = {
+        "import_ms_median": statistics.median(imports),
+        "import_ms_min": min(imports),
+        "process_ms_median": statistics.median(walls),
+        "modules_loaded": len(modules),
+        "eager_deferred_modules": eager,
+        "top_modules_ms": dict(sorted(median_cumulative.items(), key=lambda item: -item[1])[: args.top]),
+        "packages_ms": dict(sorted(packages.items(), key=lambda item: -item[1])[: args.top]),
+    }
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        print(f"import app.main   median {summary['import_ms_median']:7.1f} ms   min {summary['import_ms_min']:7.1f} ms")
+        print(f"whole process     median {summary['process_ms_median']:7.1f} ms   ({len(modules)} modules loaded)")
+        print("\nslowest imports (cumulative ms):")
+        for name, value in summary["top_modules_ms"].items():
+            print(f"  {value:8.1f}  {name}")
+        print("\nby top-level package (self ms):")
+        for name, value in summary["packages_ms"].items():
+            print(f"  {value:8.1f}  {name}")
+        if eager:
+            print(f"\nimported eagerly but meant to be deferred: {', '.join(eager)}")
+
+    failures = []
+    if eager:
+        failures.append(f"deferred modules imported at startup: {', '.join(eager)}")
+    if args.budget_ms is not None and summary["import_ms_median"] > args.budget_ms:
+        failures.append(f"median import {summary['import_ms_median']:.1f} ms exceeds budget {args.budget_ms:.0f} ms")
+    if failures:
+        print("\nFAIL: " + "; ".join(failures), file=sys.stderr)
+        raise SystemExit(1)
+    if args.budget_ms is not None:
+        print(f"\nOK: within {args.budget_ms:.0f} ms budget")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,6 @@
+from functools import lru_cache
+from typing import Any
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -7,9 +10,117 @@ class Settings(BaseSettings):
     supabase_url: str
     supabase_service_key: str
     backend_port: int = 8080
+    # Build the Supabase client in the background right after startup rather than
+    # on the first request that needs it.
+    warm_up_on_start: bool = True
     apns_team_id: str | None = None
     apns_key_id: str | None = None
     apns_key_path: str | None = None
 
+    # Read replica endpoints (same service key); empty means every query hits the primary.
+    supabase_read_urls: list[str] = []
+    replica_max_lag_seconds: float = 2.0
+    replica_lag_check_seconds: float = 5.0
+    read_your_writes_seconds: float = 5.0
+
+    # off: trust user ids as sent; optional: verify bearer tokens when present and
+    # reject id mismatches; required: every /social and /ws call needs a valid token.
+    auth_mode: str = "optional"
+    supabase_jwt_secret: str | None = None
+    auth_audience: str = "authenticated"
+    auth_cache_size: int = 100_000
+    auth_leeway_seconds: float = 30.0
+
+    people_search_backend: str = "memory"  # memory | database
+    people_search_budget_ms: float = 20.0
+    people_index_refresh_seconds: float = 5.0
+    people_index_rebuild_seconds: float = 3600.0
+
+    rate_limit_enabled: bool = True
+    rate_limit_redis_url: str | None = None
+    rate_limit_max_buckets: int = 100_000
+    rate_limit_idle_seconds: float = 600.0
+    rate_limit_send_message_burst: float = 30
+    rate_limit_send_message_per_second: float = 5.0
+    rate_limit_friend_request_burst: float = 10
+    rate_limit_friend_request_per_second: float = 0.2
+    rate_limit_chat_write_burst: float = 10
+    rate_limit_chat_write_per_second: float = 0.5
+    rate_limit_attachment_upload_burst: float = 20
+    rate_limit_attachment_upload_per_second: float = 1.0
+
+    admission_enabled: bool = True
+    admission_initial_limit: int = 32
+    admission_min_limit: int = 4
+    admission_max_limit: int = 256
+    admission_queue_budget_ms: float = 500.0
+    admission_latency_target_ms: float = 800.0
+    admission_max_queue: int = 1000
+
+    # Deploy drain (POST /admin/drain): sockets are closed at random points over
+    # the window and told to wait up to the jitter before reconnecting.
+    admin_token: str | None = None
+    drain_window_seconds: float = 30.0
+    drain_reconnect_jitter_ms: float = 5000.0
+    drain_flush_timeout_seconds: float = 5.0
+
+    # ETags come from per-process version counters (app/versioning.py), so they are
+    # only correct when a single worker serves the API; see `enforce_single_worker`.
+    etags_enabled: bool = True
+    etag_max_age_seconds: int = 30
+
+    # Routes answered from raw PostgREST rows via orjson instead of pydantic models
+    # (opt-in: "list_messages", "list_friend_requests").
+    fast_json_routes: set[str] = set()
+
+    compression_enabled: bool = True
+    compression_minimum_size: int = 1024
+    compression_gzip_level: int = 6
+    compression_zstd_level: int = 3
+
+    # Chat exports bypass admission control, so they get their own concurrency cap.
+    export_max_concurrent: int = 4
+    export_page_size: int = 500
+
+    # Attachment uploads (see app/attachments.py); disabled while unset.
+    # Thumbnails need Pillow; without it images are stored without dimensions.
+    attachment_dir: str | None = None
+    attachment_max_bytes: int = 25 * 1024 * 1024
+    thumbnail_workers: int = 2
+    thumbnail_max_edge: int = 320
+    thumbnail_max_pixels: int = 64_000_000
+    thumbnail_timeout_seconds: float = 10.0
+
+    # Cold message archive (see app/archive.py); disabled while unset. The archive job
+    # deletes rows from Postgres, so it only runs once `archive_shared_storage` states
+    # that `archive_dir` is persistent storage mounted by every API worker.
+    archive_dir: str | None = None
+    archive_shared_storage: bool = False
+    archive_after_days: float = 90.0
+    archive_block_messages: int = 256
+    archive_max_open_segments: int = 64
+
+
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    return Settings()
+
+
+class _LazySettings:
+    """`settings` proxy that reads the environment and `.env` on first attribute access.
+
+    Importing a module no longer requires a complete environment (tooling, the
+    thumbnail workers, `python -m app.coldstart`), and a misconfiguration is
+    reported by whatever first needs the value.
+    """
+
+    __slots__ = ()
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(get_settings(), name)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        setattr(get_settings(), name, value)
+
 
-settings = Settings()
+settings: Settings = _LazySettings()  # type: ignore[assignment]
@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+Job = Callable[[], Awaitable[None]]
+
+
+class ChatDispatcher:
+    """Per-chat FIFO of fan-out jobs, each chat drained by its own short-lived task.
+
+    Jobs for one chat run strictly in submission order; different chats proceed
+    independently. A chat's worker exits as soon as its queue is empty, so idle
+    chats hold no task and no queue.
+    """
+
+    def __init__(self, max_pending_per_chat: int = 10_000) -> None:
+        self.max_pending_per_chat = max_pending_per_chat
+        self._queues: dict[str, deque[tuple[float, Job]]] = {}
+        self._workers: dict[str, asyncio.Task] = {}
+        self.pending = 0
+        self.dispatched = 0
+        self.dropped = 0
+        self.failed = 0
+        self.last_lag_seconds = 0.0
+        self.max_lag_seconds = 0.0
+
+    def submit(self, chat_id: str, job: Job) -> None:
+        queue = self._queues.setdefault(chat_id, deque())
+        if len(queue) >= self.max_pending_per_chat:
+            # Clients recover dropped fan-outs from history; unbounded queues would not recover.
+            queue.popleft()
+            self.pending -= 1
+            self.dropped += 1
+        queue.append((time.monotonic(), job))
+        self.pending += 1
+        if chat_id not in self._workers:
+            self._workers[chat_id] = asyncio.create_task(self._run(chat_id, queue))
+
+    async def _run(self, chat_id: str, queue: deque[tuple[float, Job]]) -> None:
+        try:
+            while queue:
+                enqueued_at, job = queue.popleft()
+                self.pending -= 1
+                lag = time.monotonic() - enqueued_at
+                self.last_lag_seconds = lag
+                self.max_lag_seconds = max(self.max_lag_seconds, lag)
+                try:
+                    await job()
+                    self.dispatched += 1
+                except Exception:
+                    self.failed += 1
+                    logger.exception("fan-out failed for chat %s", chat_id)
+        finally:
+            # No await between the empty check and here, so nothing can slip in unseen.
+            self._workers.pop(chat_id, None)
+            if not queue:
+                self._queues.pop(chat_id, None)
+
+    def oldest_pending_seconds(self) -> float:
+        now = time.monotonic()
+        return max((now - queue[0][0] for queue in self._queues.values() if queue), default=0.0)
+
+    def stats(self) -> dict[str, float]:
+        return {
+            "pending": self.pending,
+            "active_chats": len(self._workers),
+            "dispatched": self.dispatched,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "lag_seconds": self.oldest_pending_seconds(),
+            "last_lag_seconds": self.last_lag_seconds,
+            "max_lag_seconds": self.max_lag_seconds,
+        }
+
+    async def drain(self, timeout: float) -> None:
+        workers = list(self._workers.values())
+        if workers:
+            await asyncio.wait(workers, timeout=timeout)
+
+
+chat_dispatcher = ChatDispatcher()
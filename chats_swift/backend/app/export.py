@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+from functools import lru_cache
+from typing import Any, AsyncIterator
+
+from fastapi.responses import StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+from .config import settings
+from .serialization import dumps
+
+
+class ExportSlots:
+    """Non-blocking cap on concurrent exports; a full house is answered with 503 right away."""
+
+    def __init__(self, limit: int) -> None:
+        self.limit = limit
+        self.active = 0
+
+    def try_acquire(self) -> bool:
+        if self.active >= self.limit:
+            return False
+        self.active += 1
+        return True
+
+    def release(self) -> None:
+        self.active -= 1
+
+
+@lru_cache(maxsize=1)
+def get_export_slots() -> ExportSlots:
+    return ExportSlots(settings.export_max_concurrent)
+
+
+class ExportResponse(StreamingResponse):
+    """Streams an export and frees its slot however the stream ends.
+
+    Releasing in the body generator alone would leak the slot when the client
+    disconnects before the first chunk, because the generator never starts.
+    """
+
+    def __init__(self, content: AsyncIterator[bytes], slots: ExportSlots, **kwargs: Any) -> None:
+        super().__init__(content, **kwargs)
+        self._slots = slots
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self._slots.release()
+
+
+async def ndjson_stream(pages: AsyncIterator[list[dict]]) -> AsyncIterator[bytes]:
+    async for rows in pages:
+        yield b"".join(dumps(row) + b"\n" for row in rows)
+
+
+class _Spool:
+    """Write-only sink for ZipFile; it has no seek/tell, so zipfile streams with data descriptors."""
+
+    def __init__(self) -> None:
+        self._chunks: list[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def take(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+async def zip_stream(pages: AsyncIterator[list[dict]], manifest: dict) -> AsyncIterator[bytes]:
+    """Zip with `chat.json` and `messages.ndjson`, emitted page by page."""
+    import zipfile
+
+    spool = _Spool()
+    archive = zipfile.ZipFile(spool, "w", compression=zipfile.ZIP_DEFLATED)
+    archive.writestr("chat.json", dumps(manifest))
+    yield spool.take()
+    with archive.open("messages.ndjson", "w", force_zip64=True) as entry:
+        async for rows in pages:
+            entry.write(b"".join(dumps(row) + b"\n" for row in rows))
+            if chunk := spool.take():
+                yield chunk
+    archive.close()
+    yield spool.take()
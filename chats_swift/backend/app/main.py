@@ -1,14 +1,136 @@
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
 
+from fastapi import Depends, FastAPI, Response, status
+from fastapi.responses import PlainTextResponse
+
+from .admission import get_admission_limiter
+from .attachments import shutdown_thumbnail_pool
+from .compression import CompressionMiddleware
 from .config import settings
-from .routes import notifications, realtime_ws, social
+from .dispatcher import chat_dispatcher
+from .metrics import MetricsMiddleware, registry
+from .realtime import message_hub
+from .routes import admin, notifications, realtime_ws, social
+from .routes.admin import require_admin
+from .supabase_client import get_replica_pool, warm_up
+from .versioning import enforce_single_worker
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    enforce_single_worker()
+    # The port opens before the Supabase client exists; it is built in the
+    # background so health checks and websockets are not held up by its imports.
+    warming = asyncio.create_task(asyncio.to_thread(warm_up)) if settings.warm_up_on_start else None
+    try:
+        yield
+    finally:
+        # Let queued fan-outs reach connected clients before the process exits.
+        await chat_dispatcher.drain(timeout=5.0)
+        shutdown_thumbnail_pool()
+        if warming is not None:
+            await warming
 
-app = FastAPI(title="Chats Backend", version="0.1.0")
+
+app = FastAPI(title="Chats Backend", version="0.1.0", lifespan=lifespan)
+if settings.compression_enabled:
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=settings.compression_minimum_size,
+        gzip_level=settings.compression_gzip_level,
+        zstd_level=settings.compression_zstd_level,
+    )
+# Added last so it wraps compression and times the full response.
+app.add_middleware(MetricsMiddleware)
 app.include_router(notifications.router)
 app.include_router(social.router)
 app.include_router(realtime_ws.router)
+app.include_router(admin.router)
 
 
 @app.get("/health")
-async def health() -> dict[str, str]:
+async def health(response: Response) -> dict[str, str]:
+    if message_hub.draining:
+        # Load balancers stop routing new connections here while sockets hand off.
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+        return {"status": "draining", "port": str(settings.backend_port)}
     return {"status": "ok", "port": str(settings.backend_port)}
+
+
+@app.get("/stats/dispatcher", dependencies=[Depends(require_admin)])
+async def dispatcher_stats() -> dict[str, float]:
+    return chat_dispatcher.stats()
+
+
+@app.get("/stats/replicas", dependencies=[Depends(require_admin)])
+async def replica_stats() -> list[dict[str, object]]:
+    pool = get_replica_pool()
+    return pool.stats() if pool is not None else []
+
+
+@app.get("/metrics", response_class=PlainTextResponse, dependencies=[Depends(require_admin)])
+async def metrics() -> PlainTextResponse:
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+
+registry.gauge(
+    "chat_hub_connected_users",
+    "Users with at least one websocket on this process.",
+    lambda: len(message_hub.connections),
+)
+registry.gauge(
+    "chat_hub_connected_sockets",
+    "Open websockets on this process.",
+    lambda: len(message_hub.connection_index),
+)
+registry.gauge(
+    "chat_hub_draining",
+    "1 while this process is handing its websockets off for a restart.",
+    lambda: int(message_hub.draining),
+)
+registry.gauge(
+    "chat_hub_drain_handed_off_total",
+    "Websockets told to reconnect elsewhere by the current drain.",
+    lambda: message_hub.drain_progress.get("handed_off", 0),
+    kind="counter",
+)
+registry.gauge("chat_dispatcher_pending", "Queued fan-out jobs.", lambda: chat_dispatcher.pending)
+registry.gauge(
+    "chat_dispatcher_lag_seconds",
+    "Age of the oldest queued fan-out job.",
+    chat_dispatcher.oldest_pending_seconds,
+)
+registry.gauge(
+    "chat_dispatcher_dropped_total",
+    "Fan-out jobs dropped because a chat's queue was full.",
+    lambda: chat_dispatcher.dropped,
+    kind="counter",
+)
+registry.gauge(
+    "chat_dispatcher_failed_total",
+    "Fan-out jobs that raised.",
+    lambda: chat_dispatcher.failed,
+    kind="counter",
+)
+registry.gauge(
+    "chat_admission_limit",
+    "Current adaptive concurrency limit.",
+    lambda: int(get_admission_limiter().limit),
+)
+registry.gauge(
+    "chat_admission_in_flight",
+    "Admitted requests in progress.",
+    lambda: get_admission_limiter().in_flight,
+)
+registry.gauge(
+    "chat_admission_queued",
+    "Requests waiting for admission.",
+    lambda: get_admission_limiter().queued,
+)
+registry.gauge(
+    "chat_admission_shed_total",
+    "Requests shed by admission control.",
+    lambda: get_admission_limiter().shed,
+    kind="counter",
+)
@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+import time
+from bisect import bisect_left
+from typing import Iterable, Sequence
+
+
+def contains(members: Sequence[str], user_id: str) -> bool:
+    index = bisect_left(members, user_id)
+    return index < len(members) and members[index] == user_id
+
+
+def merge_sorted(members: Sequence[str], user_ids: Iterable[str]) -> list[str]:
+    return sorted(set(members).union(user_ids))
+
+
+def subtract_sorted(members: Sequence[str], user_ids: Iterable[str]) -> list[str]:
+    removed = set(user_ids)
+    return [user_id for user_id in members if user_id not in removed]
+
+
+class ChatMembershipCache:
+    """Per-chat member ids kept as sorted lists for bisect lookups and cheap intersections.
+
+    Each process has its own copy and only sees its own writes, so entries are
+    short-lived; fan-out re-checks the recipients it is about to reach.
+    """
+
+    def __init__(self, ttl_seconds: float = 5.0, max_chats: int = 10_000) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.max_chats = max_chats
+        self._entries: dict[str, tuple[list[str], float]] = {}
+
+    def get(self, chat_id: str) -> list[str] | None:
+        entry = self._entries.get(chat_id)
+        if entry is None:
+            return None
+        members, loaded_at = entry
+        if time.monotonic() - loaded_at > self.ttl_seconds:
+            self._entries.pop(chat_id, None)
+            return None
+        return members
+
+    def set(self, chat_id: str, user_ids: Iterable[str]) -> list[str]:
+        if len(self._entries) >= self.max_chats and chat_id not in self._entries:
+            # dicts keep insertion order, so the first key is the oldest load.
+            self._entries.pop(next(iter(self._entries)))
+        members = sorted(set(user_ids))
+        self._entries[chat_id] = (members, time.monotonic())
+        return members
+
+    def add(self, chat_id: str, user_ids: Iterable[str]) -> None:
+        entry = self._entries.get(chat_id)
+        if entry is not None:
+            self._entries[chat_id] = (merge_sorted(entry[0], user_ids), entry[1])
+
+    def remove(self, chat_id: str, user_ids: Iterable[str]) -> None:
+        entry = self._entries.get(chat_id)
+        if entry is not None:
+            self._entries[chat_id] = (subtract_sorted(entry[0], user_ids), entry[1])
+
+    def invalidate(self, chat_id: str) -> None:
+        self._entries.pop(chat_id, None)
+
+
+chat_membership = ChatMembershipCache()
@@ -0,0 +1,290 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Callable, Iterable, TypeVar
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (0, 1, 2, 5, 10, 50, 100, 500, 1000, 5000, 10000)
+
+T = TypeVar("T")
+
+
+class _Sharded:
+    """Per-thread value arrays: writers only touch their own shard, readers sum them all.
+
+    Observations come from the event loop and from executor threads (Supabase calls),
+    so this keeps the hot path free of locks without losing increments.
+    """
+
+    def __init__(self, width: int) -> None:
+        self._width = width
+        self._local = threading.local()
+        self._shards: list[list[float]] = []
+
+    def shard(self) -> list[float]:
+        values = getattr(self._local, "values", None)
+        if values is None:
+            values = self._local.values = [0.0] * self._width
+            self._shards.append(values)  # list.append is atomic under the GIL
+        return values
+
+    def totals(self) -> list[float]:
+        totals = [0.0] * self._width
+        for values in list(self._shards):
+            for index, value in enumerate(values):
+                totals[index] += value
+        return totals
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labelnames: Iterable[str] = ()) -> None:
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._children: dict[tuple[str, ...], object] = {}
+
+    def labels(self, *values: object):
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _new_child(self) -> object:
+        raise NotImplementedError
+
+    def _label_text(self, key: tuple[str, ...], extra: str = "") -> str:
+        pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, key)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        for key, child in list(self._children.items()):
+            lines.extend(self._render_child(key, child))
+        return lines
+
+    def _render_child(self, key: tuple[str, ...], child: object) -> list[str]:
+        raise NotImplementedError
+
+
+class _CounterChild:
+    def __init__(self) -> None:
+        self._values = _Sharded(1)
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._values.shard()[0] += amount
+
+    def value(self) -> float:
+        return self._values.totals()[0]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self) -> _CounterChild:
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+    def _render_child(self, key: tuple[str, ...], child: _CounterChild) -> list[str]:
+        return [f"{self.name}{self._label_text(key)} {_number(child.value())}"]
+
+
+class _HistogramChild:
+    def __init__(self, buckets: tuple[float, ...]) -> None:
+        self.buckets = buckets
+        # One slot per bucket, then +Inf, then the running sum.
+        self._values = _Sharded(len(buckets) + 2)
+
+    def observe(self, value: float) -> None:
+        values = self._values.shard()
+        values[bisect_left(self.buckets, value)] += 1
+        values[-1] += value
+
+    def snapshot(self) -> tuple[list[float], float, float]:
+        totals = self._values.totals()
+        cumulative, running = [], 0.0
+        for count in totals[:-1]:
+            running += count
+            cumulative.append(running)
+        return cumulative, running, totals[-1]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: Iterable[str] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ) -> None:
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self) -> _HistogramChild:
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def _render_child(self, key: tuple[str, ...], child: _HistogramChild) -> list[str]:
+        cumulative, count, total = child.snapshot()
+        lines = []
+        for bound, running in zip((*self.buckets, float("inf")), cumulative):
+            le = "+Inf" if bound == float("inf") else _number(bound)
+            labels = self._label_text(key, 'le="' + le + '"')
+            lines.append(f"{self.name}_bucket{labels} {_number(running)}")
+        lines.append(f"{self.name}_sum{self._label_text(key)} {_number(total)}")
+        lines.append(f"{self.name}_count{self._label_text(key)} {_number(count)}")
+        return lines
+
+
+class Gauge(_Metric):
+    """Read at scrape time from a callback, so owners keep their plain attributes.
+
+    `kind="counter"` exposes a monotonic attribute (e.g. a shed count) as a counter.
+    """
+
+    def __init__(self, name: str, help_text: str, read: Callable[[], float], kind: str = "gauge") -> None:
+        super().__init__(name, help_text)
+        self.kind = kind
+        self.read = read
+        self._children[()] = None
+
+    def _render_child(self, key: tuple[str, ...], child: object) -> list[str]:
+        return [f"{self.name} {_number(self.read())}"]
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, help_text: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self.register(Counter(name, help_text, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: Iterable[str] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ) -> Histogram:
+        return self.register(Histogram(name, help_text, labelnames, buckets))
+
+    def gauge(self, name: str, help_text: str, read: Callable[[], float], kind: str = "gauge") -> Gauge:
+        return self.register(Gauge(name, help_text, read, kind))
+
+    def render(self) -> str:
+        lines: list[str] = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+registry = Registry()
+
+http_request_seconds = registry.histogram(
+    "chat_http_request_duration_seconds",
+    "HTTP request latency by route template.",
+    ("method", "route", "status"),
+)
+supabase_call_seconds = registry.histogram(
+    "chat_supabase_call_duration_seconds",
+    "Supabase/PostgREST round trip by table and operation.",
+    ("table", "operation"),
+)
+supabase_call_errors = registry.counter(
+    "chat_supabase_call_errors_total",
+    "Supabase/PostgREST calls that raised.",
+    ("table", "operation"),
+)
+executor_wait_seconds = registry.histogram(
+    "chat_executor_queue_wait_seconds",
+    "Time a blocking call waited for an executor thread.",
+)
+hub_fanout_recipients = registry.histogram(
+    "chat_hub_fanout_sockets",
+    "Locally connected sockets reached per broadcast.",
+    buckets=SIZE_BUCKETS,
+)
+hub_broadcast_seconds = registry.histogram(
+    "chat_hub_broadcast_duration_seconds",
+    "Time to write one broadcast to every target socket.",
+)
+hub_send_failures = registry.counter(
+    "chat_hub_send_failures_total",
+    "Socket writes that failed and dropped the connection.",
+)
+
+
+async def run_query(table: str, operation: str, fn: Callable[..., T], *args: Any) -> T:
+    """`asyncio.to_thread` for a blocking Supabase call, timing queue wait and round trip.
+
+    The timings are recorded on the worker thread, which only touches its own shard.
+    """
+    submitted = time.perf_counter()
+
+    def _timed() -> T:
+        started = time.perf_counter()
+        executor_wait_seconds.observe(started - submitted)
+        try:
+            return fn(*args)
+        except Exception:
+            supabase_call_errors.labels(table, operation).inc()
+            raise
+        finally:
+            supabase_call_seconds.labels(table, operation).observe(time.perf_counter() - started)
+
+    return await asyncio.to_thread(_timed)
+
+
+class MetricsMiddleware:
+    """Per-route latency histogram keyed by the route template, not the raw path."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            template = getattr(route, "path", None) or "unmatched"
+            http_request_seconds.labels(scope["method"], template, status_code).observe(
+                time.perf_counter() - started
+            )
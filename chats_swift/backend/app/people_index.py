@@ -0,0 +1,278 @@
+from __future__ import annotations
+
+import asyncio
+import heapq
+import re
+import time
+import unicodedata
+from collections import deque
+from dataclasses import dataclass
+from typing import Iterable
+
+# Names longer than this only get their word prefixes indexed, not every suffix.
+_MAX_SUFFIX_INDEX_LEN = 32
+# Shorter name queries match too much of the directory to be worth answering.
+MIN_NAME_QUERY_LEN = 2
+_TIME_CHECK_EVERY = 256
+
+
+def normalize_text(text: str | None) -> str:
+    text = unicodedata.normalize("NFKC", text or "").casefold()
+    return " ".join(text.split())
+
+
+def phone_digits(phone: str | None) -> str:
+    return re.sub(r"\D", "", phone or "")
+
+
+def mask_phone(phone: str | None) -> str | None:
+    """Keep the first three and last two digits so a match can be recognised, not harvested."""
+    if not phone:
+        return phone
+    digits = phone_digits(phone)
+    if len(digits) <= 5:
+        return "*" * len(digits)
+    return f"{digits[:3]}{'*' * (len(digits) - 5)}{digits[-2:]}"
+
+
+def trigrams(text: str) -> set[str]:
+    padded = f"  {text} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+@dataclass(slots=True)
+class IndexedProfile:
+    id: str
+    display_name: str
+    phone: str | None
+    avatar_url: str | None
+    status_message: str | None
+    name_key: str
+    phone_key: str
+
+    def as_row(self) -> dict:
+        return {
+            "id": self.id,
+            "display_name": self.display_name,
+            "phone": mask_phone(self.phone),
+            "avatar_url": self.avatar_url,
+            "status_message": self.status_message,
+        }
+
+
+class _TrieNode:
+    __slots__ = ("children", "ids")
+
+    def __init__(self) -> None:
+        self.children: dict[str, _TrieNode] = {}
+        self.ids: set[str] = set()
+
+
+class PeopleIndex:
+    """In-process substring trie + trigram index over profile names, plus exact phone lookup.
+
+    Every suffix of the (space-free) name is inserted into a single trie, so a
+    prefix walk answers substring queries such as "三丰" for "张三丰". Trigrams
+    back a fuzzy pass when the trie walk does not fill the requested page.
+    Phones only match on the full normalized number: partial digits would
+    turn the search into a way to enumerate everyone's phone.
+    """
+
+    def __init__(self) -> None:
+        self.root = _TrieNode()
+        self.profiles: dict[str, IndexedProfile] = {}
+        self.keys: dict[str, list[str]] = {}
+        self.phones: dict[str, set[str]] = {}
+        self.grams: dict[str, set[str]] = {}
+        self.profile_grams: dict[str, set[str]] = {}
+        self.cursor: tuple[str, str] | None = None
+        self.refreshed_at = 0.0
+        self.built_at = 0.0
+        self.refresh_lock = asyncio.Lock()
+
+    def __len__(self) -> int:
+        return len(self.profiles)
+
+    def clear(self) -> None:
+        self.root = _TrieNode()
+        self.profiles.clear()
+        self.keys.clear()
+        self.phones.clear()
+        self.grams.clear()
+        self.profile_grams.clear()
+        self.cursor = None
+        self.built_at = 0.0
+
+    def upsert(self, row: dict) -> None:
+        profile_id = str(row["id"]).lower()
+        self.remove(profile_id)
+        profile = IndexedProfile(
+            id=profile_id,
+            display_name=row.get("display_name") or "",
+            phone=row.get("phone"),
+            avatar_url=row.get("avatar_url"),
+            status_message=row.get("status_message"),
+            name_key=normalize_text(row.get("display_name")),
+            phone_key=phone_digits(row.get("phone")),
+        )
+        keys = self._keys_for(profile)
+        for key in keys:
+            self._insert(key, profile_id)
+        if profile.phone_key:
+            self.phones.setdefault(profile.phone_key, set()).add(profile_id)
+        grams = trigrams(profile.name_key) if profile.name_key else set()
+        for gram in grams:
+            self.grams.setdefault(gram, set()).add(profile_id)
+        self.profiles[profile_id] = profile
+        self.keys[profile_id] = keys
+        self.profile_grams[profile_id] = grams
+
+    def upsert_many(self, rows: Iterable[dict]) -> None:
+        for row in rows:
+            self.upsert(row)
+
+    def remove(self, profile_id: str) -> None:
+        profile_id = profile_id.lower()
+        profile = self.profiles.pop(profile_id, None)
+        if profile is None:
+            return
+        owners = self.phones.get(profile.phone_key)
+        if owners is not None:
+            owners.discard(profile_id)
+            if not owners:
+                del self.phones[profile.phone_key]
+        for key in self.keys.pop(profile_id, []):
+            self._discard(key, profile_id)
+        for gram in self.profile_grams.pop(profile_id, set()):
+            postings = self.grams.get(gram)
+            if postings is not None:
+                postings.discard(profile_id)
+                if not postings:
+                    del self.grams[gram]
+
+    def search(
+        self,
+        query: str,
+        limit: int = 20,
+        budget_seconds: float = 0.02,
+        exclude_id: str | None = None,
+    ) -> list[dict]:
+        deadline = time.perf_counter() + budget_seconds
+        name_query = normalize_text(query).replace(" ", "")
+        digit_query = phone_digits(query)
+        exclude = exclude_id.lower() if exclude_id else None
+        scores: dict[str, float] = {}
+        candidate_cap = max(limit * 8, 64)
+
+        if len(name_query) < MIN_NAME_QUERY_LEN:
+            name_query = ""
+        for profile_id in self.phones.get(digit_query, ()) if digit_query else ():
+            if profile_id != exclude:
+                scores[profile_id] = 95.0
+        if name_query:
+            for profile_id in self._walk(name_query, candidate_cap, deadline):
+                if profile_id == exclude:
+                    continue
+                score = self._score(self.profiles[profile_id], name_query)
+                if score > scores.get(profile_id, 0.0):
+                    scores[profile_id] = score
+
+        if len(scores) < limit and name_query and time.perf_counter() < deadline:
+            for profile_id, similarity in self._fuzzy(name_query, deadline):
+                if profile_id == exclude or profile_id in scores:
+                    continue
+                scores[profile_id] = 40.0 * similarity
+
+        top = heapq.nsmallest(
+            limit,
+            scores.items(),
+            key=lambda item: (-item[1], self.profiles[item[0]].name_key, item[0]),
+        )
+        return [self.profiles[profile_id].as_row() for profile_id, _ in top]
+
+    @staticmethod
+    def _keys_for(profile: IndexedProfile) -> list[str]:
+        keys: set[str] = set()
+        compact = profile.name_key.replace(" ", "")
+        if compact:
+            if len(compact) <= _MAX_SUFFIX_INDEX_LEN:
+                keys.update(compact[i:] for i in range(len(compact)))
+            else:
+                keys.add(compact)
+                keys.update(word for word in profile.name_key.split(" ") if word)
+        return sorted(keys)
+
+    @staticmethod
+    def _score(profile: IndexedProfile, name_query: str) -> float:
+        compact = profile.name_key.replace(" ", "")
+        if compact == name_query:
+            return 100.0
+        if compact.startswith(name_query) or any(word.startswith(name_query) for word in profile.name_key.split(" ")):
+            return 80.0
+        if name_query in compact:
+            return 60.0
+        return 0.0
+
+    def _insert(self, key: str, profile_id: str) -> None:
+        node = self.root
+        for char in key:
+            child = node.children.get(char)
+            if child is None:
+                child = node.children[char] = _TrieNode()
+            node = child
+        node.ids.add(profile_id)
+
+    def _discard(self, key: str, profile_id: str) -> None:
+        path: list[tuple[_TrieNode, str]] = []
+        node = self.root
+        for char in key:
+            child = node.children.get(char)
+            if child is None:
+                return
+            path.append((node, char))
+            node = child
+        node.ids.discard(profile_id)
+        # Prune the branch bottom-up so deleted names do not leave dead nodes behind.
+        for parent, char in reversed(path):
+            child = parent.children[char]
+            if child.ids or child.children:
+                break
+            del parent.children[char]
+
+    def _walk(self, prefix: str, cap: int, deadline: float) -> set[str]:
+        node = self.root
+        for char in prefix:
+            node = node.children.get(char)
+            if node is None:
+                return set()
+        found: set[str] = set()
+        # Breadth-first so the shortest completions (closest matches) are collected first.
+        queue = deque([node])
+        visited = 0
+        while queue and len(found) < cap:
+            current = queue.popleft()
+            found.update(current.ids)
+            queue.extend(current.children.values())
+            visited += 1
+            if visited % _TIME_CHECK_EVERY == 0 and time.perf_counter() >= deadline:
+                break
+        return found
+
+    def _fuzzy(self, name_query: str, deadline: float) -> list[tuple[str, float]]:
+        query_grams = trigrams(name_query)
+        overlap: dict[str, int] = {}
+        for gram in query_grams:
+            for profile_id in self.grams.get(gram, ()):
+                overlap[profile_id] = overlap.get(profile_id, 0) + 1
+            if time.perf_counter() >= deadline:
+                break
+        results = []
+        for profile_id, shared in overlap.items():
+            union = len(query_grams) + len(self.profile_grams[profile_id]) - shared
+            similarity = shared / union if union else 0.0
+            if similarity >= 0.3:
+                results.append((profile_id, similarity))
+        return results
+
+
+people_index = PeopleIndex()
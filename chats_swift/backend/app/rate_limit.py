@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+import logging
+import math
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Protocol
+
+from fastapi import HTTPException, status
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class BucketPolicy:
+    capacity: float
+    refill_per_second: float
+
+    @property
+    def refill_seconds(self) -> float:
+        return self.capacity / self.refill_per_second
+
+
+class BucketStore(Protocol):
+    async def take(self, key: str, policy: BucketPolicy, cost: float = 1.0) -> float:
+        """Consume `cost` tokens; return 0 when allowed, else seconds until it would be."""
+
+
+class InMemoryBucketStore:
+    """Token buckets in an LRU-ordered dict: O(1) state per active key, idle keys evicted.
+
+    A bucket that has been idle for longer than its refill time is indistinguishable
+    from a fresh (full) one, so dropping it loses nothing.
+    """
+
+    def __init__(self, max_buckets: int = 100_000, idle_seconds: float = 600.0) -> None:
+        self.max_buckets = max_buckets
+        self.idle_seconds = idle_seconds
+        self._buckets: OrderedDict[str, tuple[float, float, float]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    async def take(self, key: str, policy: BucketPolicy, cost: float = 1.0) -> float:
+        return self.take_now(key, policy, cost, time.monotonic())
+
+    def take_now(self, key: str, policy: BucketPolicy, cost: float, now: float) -> float:
+        bucket = self._buckets.pop(key, None)
+        if bucket is None:
+            tokens = policy.capacity
+        else:
+            tokens, stamp, _ = bucket
+            tokens = min(policy.capacity, tokens + (now - stamp) * policy.refill_per_second)
+
+        if tokens >= cost:
+            tokens -= cost
+            wait = 0.0
+        else:
+            wait = (cost - tokens) / policy.refill_per_second
+
+        idle_after = max(self.idle_seconds, policy.refill_seconds)
+        self._buckets[key] = (tokens, now, now + idle_after)
+        self._evict(now)
+        return wait
+
+    def _evict(self, now: float) -> None:
+        # The head is always the least recently touched bucket.
+        while self._buckets:
+            key, (_, _, expires_at) = next(iter(self._buckets.items()))
+            if expires_at > now and len(self._buckets) <= self.max_buckets:
+                break
+            self._buckets.popitem(last=False)
+
+
+_REDIS_TAKE_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local ttl = tonumber(ARGV[4])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'stamp')
+local tokens = tonumber(state[1]) or capacity
+local stamp = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - stamp) * rate)
+local wait = 0
+if tokens >= cost then
+    tokens = tokens - cost
+else
+    wait = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'stamp', now)
+redis.call('EXPIRE', KEYS[1], ttl)
+return tostring(wait)
+"""
+
+
+class RedisBucketStore:
+    """Shared buckets for multi-process deployments; needs the optional `redis` package."""
+
+    def __init__(self, url: str, prefix: str = "chat:rl:") -> None:
+        from redis import asyncio as redis_asyncio
+
+        self.prefix = prefix
+        self._redis = redis_asyncio.from_url(url)
+        self._script = self._redis.register_script(_REDIS_TAKE_SCRIPT)
+
+    async def take(self, key: str, policy: BucketPolicy, cost: float = 1.0) -> float:
+        ttl = max(1, math.ceil(policy.refill_seconds))
+        try:
+            result = await self._script(
+                keys=[self.prefix + key],
+                args=[policy.capacity, policy.refill_per_second, cost, ttl],
+            )
+        except Exception:
+            # Fail open: losing the limiter must not take the write path down with it.
+            logger.warning("rate limit backend unavailable; allowing request", exc_info=True)
+            return 0.0
+        return float(result)
+
+
+class RateLimiter:
+    def __init__(self, store: BucketStore, policies: dict[str, BucketPolicy]) -> None:
+        self.store = store
+        self.policies = policies
+
+    async def check(self, endpoint: str, user_id: str) -> None:
+        policy = self.policies.get(endpoint)
+        if policy is None:
+            return
+        wait = await self.store.take(f"{endpoint}:{user_id.lower()}", policy)
+        if wait > 0:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="请求过于频繁，请稍后再试",
+                headers={"Retry-After": str(max(1, math.ceil(wait)))},
+            )
+
+
+@lru_cache(maxsize=1)
+def get_rate_limiter() -> RateLimiter:
+    if settings.rate_limit_redis_url:
+        store: BucketStore = RedisBucketStore(settings.rate_limit_redis_url)
+    else:
+        store = InMemoryBucketStore(
+            max_buckets=settings.rate_limit_max_buckets,
+            idle_seconds=settings.rate_limit_idle_seconds,
+        )
+    policies = {
+        "send_message": BucketPolicy(
+            settings.rate_limit_send_message_burst, settings.rate_limit_send_message_per_second
+        ),
+        "friend_request": BucketPolicy(
+            settings.rate_limit_friend_request_burst, settings.rate_limit_friend_request_per_second
+        ),
+        "chat_write": BucketPolicy(
+            settings.rate_limit_chat_write_burst, settings.rate_limit_chat_write_per_second
+        ),
+        "attachment_upload": BucketPolicy(
+            settings.rate_limit_attachment_upload_burst, settings.rate_limit_attachment_upload_per_second
+        ),
+    }
+    return RateLimiter(store, policies)
+
+
+async def enforce_rate_limit(endpoint: str, user_id: str) -> None:
+    """Reject with 429 + Retry-After before any Supabase work is done for the request."""
+    if settings.rate_limit_enabled:
+        await get_rate_limiter().check(endpoint, user_id)
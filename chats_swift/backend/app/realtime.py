@@ -1,27 +1,78 @@
 from __future__ import annotations
 
 import asyncio
-from typing import Any
+import json
+import logging
+import random
+import time
+from functools import lru_cache
+from typing import Any, Iterable, Sequence
 
-from fastapi import WebSocket
+from fastapi import WebSocket, status
+
+from .dispatcher import chat_dispatcher
+from .membership import contains
+from .metrics import hub_broadcast_seconds, hub_fanout_recipients, hub_send_failures
+
+logger = logging.getLogger(__name__)
+
+MSGPACK = "msgpack"
+JSON = "json"
+
+
+@lru_cache(maxsize=1)
+def _msgpack() -> Any:
+    import msgpack
+
+    return msgpack
+
+
+def _offers_msgpack(websocket: WebSocket) -> bool:
+    offered = websocket.headers.get("sec-websocket-protocol", "")
+    return MSGPACK in (protocol.strip() for protocol in offered.split(","))
+
+
+def negotiate_frame_encoding(websocket: WebSocket) -> str:
+    """Clients opt into binary MessagePack frames via the `msgpack` subprotocol or
+    `?encoding=msgpack`; everyone else (including current iOS builds) gets JSON text."""
+    if _offers_msgpack(websocket):
+        return MSGPACK
+    if websocket.query_params.get("encoding") == MSGPACK:
+        return MSGPACK
+    return JSON
 
 
 class MessageHub:
     def __init__(self) -> None:
         self.connections: dict[str, set[WebSocket]] = {}
         self.connection_index: dict[WebSocket, str] = {}
+        self.encodings: dict[WebSocket, str] = {}
         self.lock = asyncio.Lock()
+        self.draining = False
+        self.drain_progress: dict[str, Any] = {}
+        self._drain_task: asyncio.Task | None = None
 
-    async def connect(self, websocket: WebSocket, user_id: str) -> None:
-        await websocket.accept()
+    async def connect(self, websocket: WebSocket, user_id: str, encoding: str = JSON) -> bool:
+        """Accept and register a socket; while draining it is handed off at once and False is returned."""
+        subprotocol = MSGPACK if encoding == MSGPACK and _offers_msgpack(websocket) else None
+        await websocket.accept(subprotocol=subprotocol)
+        if self.draining:
+            # Accept first so the client gets the hint; a refused handshake looks like an outage.
+            self.drain_progress["turned_away"] += 1
+            await self._hand_off(websocket, encoding, self.drain_progress["reconnect_jitter_ms"])
+            return False
         async with self.lock:
             sockets = self.connections.setdefault(user_id, set())
             sockets.add(websocket)
             self.connection_index[websocket] = user_id
+            if encoding != JSON:
+                self.encodings[websocket] = encoding
+        return True
 
     async def disconnect(self, websocket: WebSocket) -> None:
         async with self.lock:
             user_id = self.connection_index.pop(websocket, None)
+            self.encodings.pop(websocket, None)
             if user_id is None:
                 return
             sockets = self.connections.get(user_id)
@@ -31,20 +82,137 @@ class MessageHub:
             if not sockets:
                 self.connections.pop(user_id, None)
 
-    async def broadcast(self, target_user_ids: list[str], payload: dict[str, Any]) -> None:
-        unique_ids = set(target_user_ids)
+    async def broadcast(self, target_user_ids: Iterable[str], payload: dict[str, Any]) -> None:
+        await self.broadcast_sorted(sorted(set(target_user_ids)), payload)
+
+    async def broadcast_sorted(self, members: Sequence[str], payload: dict[str, Any]) -> None:
+        """Fan out to the locally connected subset of an already sorted member list."""
         async with self.lock:
-            targets: list[WebSocket] = []
-            for user_id in unique_ids:
-                sockets = self.connections.get(user_id)
-                if sockets:
-                    targets.extend(sockets)
+            targets = self._local_targets(members)
+        hub_fanout_recipients.observe(len(targets))
+        if not targets:
+            return
+        started = time.perf_counter()
 
+        # Encode once per frame encoding rather than once per recipient.
+        text: str | None = None
+        packed: bytes | None = None
         for websocket in targets:
             try:
-                await websocket.send_json(payload)
+                if self.encodings.get(websocket) == MSGPACK:
+                    if packed is None:
+                        packed = _msgpack().packb(payload)
+                    await websocket.send_bytes(packed)
+                else:
+                    if text is None:
+                        # Same encoding as WebSocket.send_json.
+                        text = json.dumps(payload, separators=(",", ":"), ensure_ascii=False)
+                    await websocket.send_text(text)
             except Exception:
+                hub_send_failures.inc()
                 await self.disconnect(websocket)
+        hub_broadcast_seconds.observe(time.perf_counter() - started)
+
+    def start_drain(self, window_seconds: float, reconnect_jitter_ms: float, flush_timeout: float = 5.0) -> dict[str, Any]:
+        """Begin handing every socket off to other instances; idempotent while a drain runs.
+
+        New sockets are turned away from now on. Once queued fan-outs are
+        flushed, each open socket gets a `reconnect` frame and a 1012 close at a
+        random point in the next `window_seconds`. The frame carries a further
+        random `after_ms` (up to `reconnect_jitter_ms`) for clients that honour
+        it, so reconnects and the history refetches behind them are spread out
+        even for clients that reconnect immediately.
+        """
+        if not self.draining:
+            self.draining = True
+            self.drain_progress = {
+                "state": "flushing",
+                "started_at": time.time(),
+                "window_seconds": window_seconds,
+                "reconnect_jitter_ms": reconnect_jitter_ms,
+                "sockets": len(self.connection_index),
+                "handed_off": 0,
+                "failed": 0,
+                "left": 0,
+                "turned_away": 0,
+            }
+            self._drain_task = asyncio.create_task(self._drain(window_seconds, reconnect_jitter_ms, flush_timeout))
+        return self.drain_status()
+
+    def drain_status(self) -> dict[str, Any]:
+        return {"draining": self.draining, "remaining": len(self.connection_index), **self.drain_progress}
+
+    async def _drain(self, window_seconds: float, reconnect_jitter_ms: float, flush_timeout: float) -> None:
+        progress = self.drain_progress
+        try:
+            # Deliver what is already queued before telling clients to leave.
+            await chat_dispatcher.drain(timeout=flush_timeout)
+            progress["state"] = "handing_off"
+            async with self.lock:
+                sockets = list(self.connection_index)
+            progress["sockets"] = len(sockets)
+            deadlines = sorted((random.uniform(0, window_seconds), index) for index in range(len(sockets)))
+
+            async def hand_off(websocket: WebSocket) -> None:
+                if websocket not in self.connection_index:
+                    progress["left"] += 1  # closed by the client while waiting its turn
+                    return
+                handed_off = await self._hand_off(websocket, self.encodings.get(websocket, JSON), reconnect_jitter_ms)
+                progress["handed_off" if handed_off else "failed"] += 1
+
+            started = time.monotonic()
+            handoffs = []
+            for deadline, index in deadlines:
+                delay = started + deadline - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                # One slow socket must not hold up the schedule for the rest.
+                handoffs.append(asyncio.create_task(hand_off(sockets[index])))
+            await asyncio.gather(*handoffs)
+            progress["state"] = "drained"
+        except Exception:
+            logger.exception("hub drain failed")
+            progress["state"] = "failed"
+        finally:
+            progress["finished_at"] = time.time()
+
+    async def _hand_off(self, websocket: WebSocket, encoding: str, reconnect_jitter_ms: float) -> bool:
+        hint = {"type": "reconnect", "after_ms": int(random.uniform(0, reconnect_jitter_ms))}
+        try:
+            if encoding == MSGPACK:
+                await asyncio.wait_for(websocket.send_bytes(_msgpack().packb(hint)), timeout=2.0)
+            else:
+                await asyncio.wait_for(websocket.send_text(json.dumps(hint, separators=(",", ":"))), timeout=2.0)
+            await asyncio.wait_for(
+                websocket.close(code=status.WS_1012_SERVICE_RESTART, reason="server restarting"), timeout=2.0
+            )
+            return True
+        except Exception:
+            # Already gone or stuck; either way it reconnects on its own.
+            return False
+        finally:
+            await self.disconnect(websocket)
+
+    def local_members(self, members: Sequence[str]) -> list[str]:
+        """The ids in a sorted member list that have a socket on this process, still sorted."""
+        if len(self.connections) < len(members):
+            return sorted(user_id for user_id in self.connections if contains(members, user_id))
+        return [user_id for user_id in members if user_id in self.connections]
+
+    def _local_targets(self, members: Sequence[str]) -> list[WebSocket]:
+        targets: list[WebSocket] = []
+        # Walk whichever side is smaller: a 10k-member group usually has only a
+        # handful of members connected to this process.
+        if len(self.connections) < len(members):
+            for user_id, sockets in self.connections.items():
+                if contains(members, user_id):
+                    targets.extend(sockets)
+        else:
+            for user_id in members:
+                sockets = self.connections.get(user_id)
+                if sockets:
+                    targets.extend(sockets)
+        return targets
 
 
 message_hub = MessageHub()
@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+import time
+
+from .metrics import registry
+
+count_lookups = registry.counter(
+    "chat_request_count_lookups_total",
+    "Pending friend-request count lookups, by whether the cache answered.",
+    ("result",),
+)
+_HIT = count_lookups.labels("hit")
+_MISS = count_lookups.labels("miss")
+
+
+class PendingRequestCounts:
+    """Pending friend-request counts per `requests_key`, for badge polling.
+
+    Kept current by this process's writes: answering a pending request
+    decrements both sides, and sending one drops both entries, because an
+    upsert does not say whether the pair was already pending. Entries expire
+    after `ttl_seconds` so that writes made on other workers show up.
+    """
+
+    def __init__(self, ttl_seconds: float = 30.0, max_entries: int = 100_000) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: dict[str, tuple[int, float]] = {}
+
+    def get(self, key: str) -> int | None:
+        entry = self._entries.get(key)
+        if entry is None or time.monotonic() - entry[1] > self.ttl_seconds:
+            self._entries.pop(key, None)
+            _MISS.inc()
+            return None
+        _HIT.inc()
+        return entry[0]
+
+    def set(self, key: str, count: int) -> int:
+        if len(self._entries) >= self.max_entries and key not in self._entries:
+            # dicts keep insertion order, so the first key is the oldest load.
+            self._entries.pop(next(iter(self._entries)))
+        self._entries[key] = (count, time.monotonic())
+        return count
+
+    def adjust(self, key: str, delta: int) -> None:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries[key] = (max(entry[0] + delta, 0), entry[1])
+
+    def invalidate(self, *keys: str) -> None:
+        for key in keys:
+            self._entries.pop(key, None)
+
+
+pending_request_counts = PendingRequestCounts()
@@ -0,0 +1,35 @@
+import hmac
+from typing import Any
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status
+
+from ..config import settings
+from ..realtime import message_hub
+
+
+def require_admin(x_admin_token: str | None = Header(default=None)) -> None:
+    if not settings.admin_token:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if x_admin_token is None or not hmac.compare_digest(x_admin_token, settings.admin_token):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="无权执行管理操作")
+
+
+router = APIRouter(prefix="/admin", tags=["admin"], dependencies=[Depends(require_admin)])
+
+
+@router.post("/drain", status_code=status.HTTP_202_ACCEPTED)
+async def start_drain(
+    window_seconds: float | None = Query(default=None, ge=0, le=3600),
+    reconnect_jitter_ms: float | None = Query(default=None, ge=0, le=600_000),
+) -> dict[str, Any]:
+    """Start handing websockets off before a restart; call from the deploy's pre-stop hook."""
+    return message_hub.start_drain(
+        settings.drain_window_seconds if window_seconds is None else window_seconds,
+        settings.drain_reconnect_jitter_ms if reconnect_jitter_ms is None else reconnect_jitter_ms,
+        flush_timeout=settings.drain_flush_timeout_seconds,
+    )
+
+
+@router.get("/drain")
+async def drain_status() -> dict[str, Any]:
+    return message_hub.drain_status()
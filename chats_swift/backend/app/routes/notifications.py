@@ -1,5 +1,6 @@
 from fastapi import APIRouter, Depends
 
+from ..admission import Priority, admit
 from ..schemas import NotificationResponse, OfflineMessagePayload
 from ..services.notification_service import NotificationService
 from ..supabase_client import get_supabase
@@ -7,7 +8,11 @@ from ..supabase_client import get_supabase
 router = APIRouter(prefix="/notify", tags=["notifications"])
 
 
-@router.post("/offline-message", response_model=NotificationResponse)
+@router.post(
+    "/offline-message",
+    response_model=NotificationResponse,
+    dependencies=[Depends(admit(Priority.send))],
+)
 async def offline_message(
     payload: OfflineMessagePayload,
     service: NotificationService = Depends(lambda: NotificationService(get_supabase())),
@@ -2,7 +2,8 @@ import asyncio
 
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, status
 
-from ..realtime import message_hub
+from ..auth import AuthError, websocket_caller
+from ..realtime import message_hub, negotiate_frame_encoding
 
 
 router = APIRouter(prefix="/ws", tags=["realtime"])
@@ -10,12 +11,22 @@ router = APIRouter(prefix="/ws", tags=["realtime"])
 
 @router.websocket("/messages")
 async def messages_socket(websocket: WebSocket):
-    user_id = websocket.query_params.get("user_id")
+    try:
+        caller = websocket_caller(websocket)
+    except AuthError:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="invalid token")
+        return
+    user_id = websocket.query_params.get("user_id") or caller
     if not user_id:
         await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="user_id is required")
         return
+    if caller is not None and user_id.lower() != caller:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="user_id does not match token")
+        return
 
-    await message_hub.connect(websocket, user_id)
+    # Member ids come back from Postgres in lowercase; iOS sends uuidString (uppercase).
+    if not await message_hub.connect(websocket, user_id.lower(), negotiate_frame_encoding(websocket)):
+        return  # draining: already told to reconnect elsewhere
     try:
         while True:
             await asyncio.sleep(3600)
@@ -1,10 +1,36 @@
+import asyncio
+from datetime import datetime, timezone
+from typing import Awaitable, Callable
+from urllib.parse import quote
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
 
+from ..admission import Priority, admit
+from ..archive import decode_cursor, get_message_archive
+from ..attachments import (
+    AttachmentStore,
+    AttachmentTooLarge,
+    attachment_key,
+    get_attachment_store,
+    read_attachment_meta,
+    save_upload,
+)
+from ..auth import authenticate, ensure_caller, require_caller
+from ..config import settings
+from ..export import ExportResponse, get_export_slots, ndjson_stream, zip_stream
+from ..people_index import MIN_NAME_QUERY_LEN
+from ..rate_limit import enforce_rate_limit
 from ..schemas import (
+    AttachmentModel,
     ChatCreatePayload,
     ChatCreateResponse,
+    ChatMembersPayload,
+    ChatMembersResponse,
+    ExportFormat,
+    FriendRequestCountResponse,
     FriendRequestCreatePayload,
     FriendRequestListResponse,
     FriendRequestModel,
@@ -13,20 +39,67 @@ from ..schemas import (
     FriendsListResponse,
     MessageModel,
     MessagesResponse,
+    PeopleSearchResponse,
     SendMessagePayload,
 )
+from ..serialization import fast_json_enabled, fast_json_response, project_rows
 from ..services.social_service import SocialService
-from ..supabase_client import get_supabase
+from ..supabase_client import get_replica_pool, get_supabase
+from ..versioning import chat_key, conditional_get, friends_key, requests_key
 
 
-router = APIRouter(prefix="/social", tags=["social"])
+router = APIRouter(prefix="/social", tags=["social"], dependencies=[Depends(authenticate)])
 
 
 def get_social_service() -> SocialService:
-    return SocialService(get_supabase())
+    return SocialService(get_supabase(), get_replica_pool(), get_message_archive(), get_attachment_store())
+
+
+def require_attachment_store() -> AttachmentStore:
+    store = get_attachment_store()
+    if store is None:
+        raise HTTPException(status_code=404, detail="附件功能未启用")
+    return store
+
+
+async def require_member(service: SocialService, chat_id: UUID, user_id: UUID | str) -> None:
+    if not await service.is_member(chat_id, user_id):
+        raise HTTPException(status_code=403, detail="不是该会话成员")
+
+
+# Listed ahead of `admit(...)` in `dependencies`, which FastAPI resolves in order,
+# so impersonation and rate-limited callers are turned away before they hold a slot.
+def payload_actor(model: type[BaseModel], field: str, bucket: str) -> Callable[..., Awaitable[None]]:
+    """Caller check and rate limit for the user named by `field` of the JSON body."""
+
+    async def _dependency(payload: model, caller: str | None = Depends(authenticate)) -> None:
+        actor = getattr(payload, field)
+        ensure_caller(caller, actor)
+        await enforce_rate_limit(bucket, actor)
+
+    return _dependency
+
 
+def query_actor(strict: bool = False) -> Callable[..., Awaitable[None]]:
+    """Caller check for the `user_id` query parameter; `strict` also refuses anonymous callers."""
 
-@router.post("/friends/request", response_model=FriendRequestModel)
+    async def _dependency(
+        user_id: UUID = Query(..., description="当前用户 ID"),
+        caller: str | None = Depends(authenticate),
+    ) -> None:
+        (require_caller if strict else ensure_caller)(caller, user_id)
+
+    return _dependency
+
+
+@router.post(
+    "/friends/request",
+    response_model=FriendRequestModel,
+    dependencies=[
+        Depends(payload_actor(FriendRequestCreatePayload, "requester_id", "friend_request")),
+        Depends(admit(Priority.send)),
+    ],
+)
 async def create_friend_request(
     payload: FriendRequestCreatePayload,
     service: SocialService = Depends(get_social_service),
@@ -37,7 +110,14 @@ async def create_friend_request(
         raise HTTPException(status_code=400, detail=str(exc))
 
 
-@router.post("/friends/respond", response_model=FriendRequestModel)
+@router.post(
+    "/friends/respond",
+    response_model=FriendRequestModel,
+    dependencies=[
+        Depends(payload_actor(FriendRequestRespondPayload, "responder_id", "friend_request")),
+        Depends(admit(Priority.send)),
+    ],
+)
 async def respond_friend_request(
     payload: FriendRequestRespondPayload,
     service: SocialService = Depends(get_social_service),
@@ -48,44 +128,332 @@ async def respond_friend_request(
         raise HTTPException(status_code=400, detail=str(exc))
 
 
-@router.get("/friends/requests", response_model=FriendRequestListResponse)
+@router.get(
+    "/friends/requests",
+    response_model=FriendRequestListResponse,
+    dependencies=[Depends(query_actor()), Depends(admit(Priority.friends))],
+)
 async def list_friend_requests(
+    request: Request,
+    response: Response,
     user_id: UUID = Query(..., description="当前用户 ID"),
     role: FriendRequestRole = Query(..., description="incoming/outgoing"),
+    limit: int | None = Query(None, ge=1, le=200, description="分页读取：每页条数，省略则返回全部"),
+    cursor: str | None = Query(None, description="上一页返回的 next_cursor"),
     service: SocialService = Depends(get_social_service),
 ) -> FriendRequestListResponse:
+    if not_modified := conditional_get(request, response, requests_key(user_id, role.value)):
+        return not_modified
+    if limit is not None:
+        try:
+            before = decode_cursor(cursor) if cursor else None
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
+        rows, next_cursor = await service.list_friend_request_page(user_id, role, before, limit)
+        if fast_json_enabled("list_friend_requests"):
+            return fast_json_response(
+                {"requests": project_rows(rows, FriendRequestModel), "next_cursor": next_cursor}, response
+            )
+        return FriendRequestListResponse(
+            requests=[FriendRequestModel.model_validate(row) for row in rows], next_cursor=next_cursor
+        )
+    if fast_json_enabled("list_friend_requests"):
+        rows = await service.list_friend_request_rows(user_id, role)
+        return fast_json_response({"requests": project_rows(rows, FriendRequestModel), "next_cursor": None}, response)
     return await service.list_friend_requests(user_id, role)
 
 
-@router.get("/friends/list", response_model=FriendsListResponse)
+@router.get(
+    "/friends/requests/count",
+    response_model=FriendRequestCountResponse,
+    dependencies=[Depends(query_actor()), Depends(admit(Priority.friends))],
+)
+async def count_friend_requests(
+    request: Request,
+    response: Response,
+    user_id: UUID = Query(..., description="当前用户 ID"),
+    service: SocialService = Depends(get_social_service),
+) -> FriendRequestCountResponse:
+    """Pending request counts for badges; far cheaper to poll than the lists."""
+    keys = (
+        requests_key(user_id, FriendRequestRole.incoming.value),
+        requests_key(user_id, FriendRequestRole.outgoing.value),
+    )
+    if not_modified := conditional_get(request, response, *keys):
+        return not_modified
+    return await service.count_pending_requests(user_id)
+
+
+@router.get(
+    "/friends/list",
+    response_model=FriendsListResponse,
+    dependencies=[Depends(query_actor()), Depends(admit(Priority.friends))],
+)
 async def list_friends(
+    request: Request,
+    response: Response,
     user_id: UUID = Query(..., description="当前用户 ID"),
     service: SocialService = Depends(get_social_service),
 ) -> FriendsListResponse:
+    if not_modified := conditional_get(request, response, friends_key(user_id)):
+        return not_modified
     return await service.list_friends(user_id)
 
 
-@router.post("/chats", response_model=ChatCreateResponse)
+@router.get(
+    "/people/search",
+    response_model=PeopleSearchResponse,
+    dependencies=[Depends(query_actor(strict=True)), Depends(admit(Priority.friends))],
+)
+async def search_people(
+    q: str = Query(..., min_length=MIN_NAME_QUERY_LEN, max_length=64, description="昵称片段或完整手机号"),
+    limit: int = Query(20, ge=1, le=50),
+    user_id: UUID = Query(..., description="当前用户 ID，结果中排除自己"),
+    service: SocialService = Depends(get_social_service),
+) -> PeopleSearchResponse:
+    return await service.search_people(q, limit, user_id)
+
+
+@router.post(
+    "/chats",
+    response_model=ChatCreateResponse,
+    dependencies=[
+        Depends(payload_actor(ChatCreatePayload, "initiator_id", "chat_write")),
+        Depends(admit(Priority.send)),
+    ],
+)
 async def create_chat(
     payload: ChatCreatePayload,
     service: SocialService = Depends(get_social_service),
 ) -> ChatCreateResponse:
-    chat = await service.create_chat(payload)
+    try:
+        chat = await service.create_chat(payload)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
     return ChatCreateResponse(chat=chat)
 
 
-@router.post("/chats/{chat_id}/messages", response_model=MessageModel)
+@router.post(
+    "/chats/{chat_id}/members",
+    response_model=ChatMembersResponse,
+    dependencies=[
+        Depends(payload_actor(ChatMembersPayload, "actor_id", "chat_write")),
+        Depends(admit(Priority.send)),
+    ],
+)
+async def add_chat_members(
+    chat_id: UUID,
+    payload: ChatMembersPayload,
+    service: SocialService = Depends(get_social_service),
+) -> ChatMembersResponse:
+    try:
+        return await service.add_chat_members(chat_id, payload)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+
+@router.post(
+    "/chats/{chat_id}/members/remove",
+    response_model=ChatMembersResponse,
+    dependencies=[
+        Depends(payload_actor(ChatMembersPayload, "actor_id", "chat_write")),
+        Depends(admit(Priority.send)),
+    ],
+)
+async def remove_chat_members(
+    chat_id: UUID,
+    payload: ChatMembersPayload,
+    service: SocialService = Depends(get_social_service),
+) -> ChatMembersResponse:
+    try:
+        return await service.remove_chat_members(chat_id, payload)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+
+@router.post(
+    "/chats/{chat_id}/messages",
+    response_model=MessageModel,
+    dependencies=[
+        Depends(payload_actor(SendMessagePayload, "sender_id", "send_message")),
+        Depends(admit(Priority.send)),
+    ],
+)
 async def send_message(
     chat_id: UUID,
     payload: SendMessagePayload,
     service: SocialService = Depends(get_social_service),
 ) -> MessageModel:
-    return await service.send_message(chat_id, payload)
+    await require_member(service, chat_id, payload.sender_id)
+    try:
+        return await service.send_message(chat_id, payload)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+
+_IMMUTABLE = "private, max-age=31536000, immutable"
+# Uploads carry a client-chosen Content-Type; only these render in place. Anything
+# else (HTML, SVG, ...) is served as a download so it cannot run on the API origin.
+_INLINE_TYPES = frozenset({"image/jpeg", "image/png", "image/gif", "image/webp"})
+
+
+# Like exports, uploads skip admission: a slow client would hold a slot for the
+# whole transfer. The per-user upload bucket and the size cap bound them instead.
+@router.post("/chats/{chat_id}/attachments", response_model=AttachmentModel)
+async def upload_attachment(
+    chat_id: UUID,
+    request: Request,
+    uploader_id: str = Query(..., description="上传者 ID"),
+    filename: str | None = Query(None, max_length=255),
+    caller: str | None = Depends(authenticate),
+    store: AttachmentStore = Depends(require_attachment_store),
+    service: SocialService = Depends(get_social_service),
+) -> AttachmentModel:
+    """Raw request body (not multipart), streamed to storage; reference the returned id in `attachment_ids`."""
+    ensure_caller(caller, uploader_id)
+    await enforce_rate_limit("attachment_upload", uploader_id)
+    await require_member(service, chat_id, uploader_id)
+    max_bytes = settings.attachment_max_bytes
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > max_bytes:
+        raise HTTPException(status_code=413, detail=f"附件不能超过 {max_bytes // (1 << 20)} MB")
+    mime_type = request.headers.get("content-type", "application/octet-stream").split(";")[0].strip().lower()
+    try:
+        meta = await save_upload(
+            store, chat_id, uploader_id, filename, mime_type or "application/octet-stream", request.stream(), max_bytes
+        )
+    except AttachmentTooLarge as exc:
+        raise HTTPException(status_code=413, detail=str(exc))
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return AttachmentModel.model_validate(meta)
+
 
+@router.get(
+    "/chats/{chat_id}/attachments/{attachment_id}",
+    dependencies=[Depends(query_actor(strict=True)), Depends(admit(Priority.history))],
+)
+async def download_attachment(
+    chat_id: UUID,
+    attachment_id: UUID,
+    request: Request,
+    user_id: UUID = Query(..., description="当前用户 ID"),
+    store: AttachmentStore = Depends(require_attachment_store),
+    service: SocialService = Depends(get_social_service),
+) -> Response:
+    await require_member(service, chat_id, user_id)
+    meta = await asyncio.to_thread(read_attachment_meta, store, chat_id, attachment_id)
+    if meta is None:
+        raise HTTPException(status_code=404, detail="附件不存在")
+    # Attachments never change once uploaded, so the content hash is a permanent validator.
+    headers = {"ETag": f'"{meta["sha256"]}"', "Cache-Control": _IMMUTABLE, "X-Content-Type-Options": "nosniff"}
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+    headers["Content-Length"] = str(meta["size"])
+    disposition = "inline" if meta["mime_type"] in _INLINE_TYPES else "attachment"
+    headers["Content-Disposition"] = f"{disposition}; filename*=UTF-8''{quote(meta['name'])}"
+    return StreamingResponse(
+        store.iter_bytes(attachment_key(chat_id, attachment_id)), media_type=meta["mime_type"], headers=headers
+    )
+
+
+@router.get(
+    "/chats/{chat_id}/attachments/{attachment_id}/thumbnail",
+    dependencies=[Depends(query_actor(strict=True)), Depends(admit(Priority.history))],
+)
+async def attachment_thumbnail(
+    chat_id: UUID,
+    attachment_id: UUID,
+    user_id: UUID = Query(..., description="当前用户 ID"),
+    store: AttachmentStore = Depends(require_attachment_store),
+    service: SocialService = Depends(get_social_service),
+) -> Response:
+    await require_member(service, chat_id, user_id)
+    thumbnail = await asyncio.to_thread(store.get, attachment_key(chat_id, attachment_id, ".thumb.jpg"))
+    if thumbnail is None:
+        raise HTTPException(status_code=404, detail="缩略图不存在")
+    return Response(
+        thumbnail, media_type="image/jpeg", headers={"Cache-Control": _IMMUTABLE, "X-Content-Type-Options": "nosniff"}
+    )
 
-@router.get("/chats/{chat_id}/messages", response_model=MessagesResponse)
+
+@router.get(
+    "/chats/{chat_id}/messages",
+    response_model=MessagesResponse,
+    dependencies=[Depends(query_actor(strict=True)), Depends(admit(Priority.history))],
+)
 async def list_messages(
     chat_id: UUID,
+    request: Request,
+    response: Response,
+    user_id: UUID = Query(..., description="当前用户 ID"),
+    limit: int | None = Query(None, ge=1, le=500, description="分页读取：每页条数，省略则返回全部"),
+    before: str | None = Query(None, description="上一页返回的 next_before"),
     service: SocialService = Depends(get_social_service),
 ) -> MessagesResponse:
+    # Before the ETag check, so a 304 cannot confirm a chat's version to non-members.
+    await require_member(service, chat_id, user_id)
+    if not_modified := conditional_get(request, response, chat_key(chat_id)):
+        return not_modified
+    if limit is not None:
+        try:
+            cursor = decode_cursor(before) if before else None
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
+        rows, next_before = await service.list_message_page(chat_id, cursor, limit)
+        if fast_json_enabled("list_messages"):
+            return fast_json_response(
+                {"messages": project_rows(rows, MessageModel), "next_before": next_before}, response
+            )
+        return MessagesResponse(
+            messages=[MessageModel.model_validate(row) for row in rows], next_before=next_before
+        )
+    if fast_json_enabled("list_messages"):
+        rows = await service.list_message_rows(chat_id)
+        return fast_json_response({"messages": project_rows(rows, MessageModel), "next_before": None}, response)
     return await service.list_messages(chat_id)
+
+
+# No admission slot: an export would hold it for minutes. Exports are capped
+# separately and read from replicas when they are configured.
+@router.get("/chats/{chat_id}/export", dependencies=[Depends(query_actor(strict=True))])
+async def export_chat(
+    chat_id: UUID,
+    user_id: UUID = Query(..., description="当前用户 ID"),
+    format: ExportFormat = Query(ExportFormat.ndjson),
+    cursor: str | None = Query(None, description="上次收到的最后一条消息 id，从其后继续导出"),
+    service: SocialService = Depends(get_social_service),
+) -> ExportResponse:
+    await require_member(service, chat_id, user_id)
+    slots = get_export_slots()
+    if not slots.try_acquire():
+        raise HTTPException(
+            status_code=503,
+            detail="导出任务过多，请稍后重试",
+            headers={"Retry-After": "30"},
+        )
+    try:
+        after = await service.message_cursor(chat_id, cursor) if cursor else None
+    except BaseException as exc:
+        slots.release()
+        if isinstance(exc, ValueError):
+            raise HTTPException(status_code=400, detail=str(exc))
+        raise
+
+    pages = service.iter_message_pages(chat_id, after)
+    if format == ExportFormat.zip:
+        manifest = {
+            "chat_id": str(chat_id),
+            "exported_at": datetime.now(timezone.utc).isoformat(),
+            "resumed_after": cursor,
+        }
+        body, media_type = zip_stream(pages, manifest), "application/zip"
+    else:
+        body, media_type = ndjson_stream(pages), "application/x-ndjson"
+    suffix = f"-after-{cursor}" if cursor else ""
+    return ExportResponse(
+        body,
+        slots,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="chat-{chat_id}{suffix}.{format.value}"'},
+    )
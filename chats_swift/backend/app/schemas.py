@@ -2,7 +2,7 @@ from datetime import datetime, timezone
 from enum import Enum
 from typing import List
 
-from pydantic import BaseModel, Field, field_validator
+from pydantic import BaseModel, Field, field_validator, model_validator
 
 
 class OfflineMessagePayload(BaseModel):
@@ -70,17 +70,47 @@ class FriendRequestRole(str, Enum):
     outgoing = "outgoing"
 
 
+class ExportFormat(str, Enum):
+    ndjson = "ndjson"
+    zip = "zip"
+
+
 class FriendRequestListResponse(BaseModel):
     requests: List[FriendRequestModel]
+    # Set on paged reads (`limit`) while more requests remain; pass back as `cursor`.
+    next_cursor: str | None = None
+
+
+class FriendRequestCountResponse(BaseModel):
+    incoming: int
+    outgoing: int
 
 
 class FriendsListResponse(BaseModel):
     friends: List[ProfileSummary]
 
 
+MAX_GROUP_MEMBERS = 10_000
+
+
 class ChatCreatePayload(BaseModel):
     initiator_id: str
-    participant_id: str
+    participant_id: str | None = None
+    participant_ids: List[str] = Field(default_factory=list, max_length=MAX_GROUP_MEMBERS)
+    title: str | None = None
+
+    @model_validator(mode="after")
+    def ensure_participants(self) -> "ChatCreatePayload":
+        if not self.participant_id and not self.participant_ids:
+            raise ValueError("participant_id or participant_ids is required")
+        return self
+
+    def member_ids(self) -> List[str]:
+        ids = [self.initiator_id]
+        if self.participant_id:
+            ids.append(self.participant_id)
+        ids.extend(self.participant_ids)
+        return sorted({str(user_id).lower() for user_id in ids})
 
 
 class ChatSummaryModel(BaseModel):
@@ -96,9 +126,48 @@ class ChatCreateResponse(BaseModel):
     chat: ChatSummaryModel
 
 
+class ChatMembersPayload(BaseModel):
+    actor_id: str
+    user_ids: List[str] = Field(..., max_length=MAX_GROUP_MEMBERS)
+
+    @field_validator("user_ids")
+    @classmethod
+    def ensure_non_empty(cls, value: List[str]) -> List[str]:
+        if not value:
+            raise ValueError("user_ids cannot be empty")
+        return value
+
+
+class ChatMembersResponse(BaseModel):
+    chat_id: str
+    changed: int
+    member_count: int
+
+
+MAX_MESSAGE_ATTACHMENTS = 10
+
+
 class SendMessagePayload(BaseModel):
     sender_id: str
-    content: str
+    content: str = ""
+    # Ids returned by POST /social/chats/{chat_id}/attachments, uploaded by the sender.
+    attachment_ids: List[str] = Field(default_factory=list, max_length=MAX_MESSAGE_ATTACHMENTS)
+
+    @model_validator(mode="after")
+    def ensure_body(self) -> "SendMessagePayload":
+        if not self.content and not self.attachment_ids:
+            raise ValueError("content or attachment_ids is required")
+        return self
+
+
+class AttachmentModel(BaseModel):
+    id: str
+    name: str
+    mime_type: str
+    size: int
+    width: int | None = None
+    height: int | None = None
+    thumbnail: bool = False
 
 
 class MessageModel(BaseModel):
@@ -108,7 +177,14 @@ class MessageModel(BaseModel):
     sender_name: str | None = None
     content: str
     created_at: datetime
+    attachments: List[AttachmentModel] = Field(default_factory=list)
 
 
 class MessagesResponse(BaseModel):
     messages: List[MessageModel]
+    # Set on paged reads (`limit`) while older messages remain; pass back as `before`.
+    next_before: str | None = None
+
+
+class PeopleSearchResponse(BaseModel):
+    people: List[ProfileSummary]
@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+import json
+import types
+import typing
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Iterable
+
+from fastapi import Response
+from pydantic import BaseModel
+
+from .config import settings
+
+try:
+    import orjson
+except ImportError:  # fall back to the stdlib encoder
+    orjson = None
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(Response):
+    """Encodes plain dicts/lists straight to bytes, skipping model validation and jsonable_encoder."""
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def fast_json_enabled(route: str) -> bool:
+    return route in settings.fast_json_routes
+
+
+def _json_datetime(value: Any) -> Any:
+    # Same text as pydantic: six-digit fractions when there are any, `Z` for UTC.
+    if not isinstance(value, str):
+        return value
+    text = datetime.fromisoformat(value).isoformat()
+    return text[:-6] + "Z" if text.endswith("+00:00") else text
+
+
+def _unwrap(annotation: Any) -> tuple[Any, bool]:
+    """(inner type, is_list) for `X`, `X | None` and `List[X]` annotations."""
+    origin = typing.get_origin(annotation)
+    if origin in (typing.Union, types.UnionType):
+        args = [arg for arg in typing.get_args(annotation) if arg is not type(None)]
+        return _unwrap(args[0]) if len(args) == 1 else (annotation, False)
+    if origin is list:
+        return typing.get_args(annotation)[0], True
+    return annotation, False
+
+
+@lru_cache(maxsize=None)
+def _plan(model: type[BaseModel]) -> tuple[tuple[str, Any, Any, bool], ...]:
+    fields = []
+    for name, field in model.model_fields.items():
+        inner, many = _unwrap(field.annotation)
+        if isinstance(inner, type) and issubclass(inner, BaseModel):
+            convert: Any = inner
+        elif inner is datetime:
+            convert = datetime
+        else:
+            convert = None
+        fields.append((name, field.get_default(call_default_factory=True), convert, many))
+    return tuple(fields)
+
+
+def project(row: dict | None, model: type[BaseModel]) -> dict | None:
+    """`row` reduced to `model`'s fields and formatted as the model would serialize it, without validating."""
+    if row is None:
+        return None
+    out = {}
+    for name, default, convert, many in _plan(model):
+        value = row.get(name, default)
+        if convert is datetime:
+            value = _json_datetime(value)
+        elif convert is not None and value is not None:
+            value = [project(item, convert) for item in value] if many else project(value, convert)
+        out[name] = value
+    return out
+
+
+def project_rows(rows: Iterable[dict], model: type[BaseModel]) -> list[dict]:
+    return [project(row, model) for row in rows]
+
+
+def fast_json_response(content: Any, response: Response) -> FastJSONResponse:
+    # Returning a Response bypasses FastAPI's merge of the injected response's headers (ETag etc.).
+    return FastJSONResponse(content, headers=dict(response.headers))
@@ -1,12 +1,13 @@
 from __future__ import annotations
 
-import asyncio
-from typing import Iterable
-
-from supabase import Client
+from typing import TYPE_CHECKING, Iterable
 
+from ..metrics import run_query
 from ..schemas import NotificationRecord, OfflineMessagePayload
 
+if TYPE_CHECKING:
+    from supabase import Client
+
 
 class NotificationService:
     """Persist notification intents and fan out to push providers."""
@@ -40,5 +41,4 @@ class NotificationService:
                 return
             self.client.table("message_notifications").insert(rows).execute()
 
-        loop = asyncio.get_event_loop()
-        await loop.run_in_executor(None, _insert)
+        await run_query("message_notifications", "insert", _insert)
@@ -1,41 +1,75 @@
 from __future__ import annotations
 
 import asyncio
+import time
 from datetime import datetime, timezone
-from typing import List
+from typing import TYPE_CHECKING, AsyncIterator, List, Sequence
 from uuid import UUID, uuid4
 
-from supabase import Client
-
+from ..archive import Key, MessageArchive, encode_cursor, key_id, key_timestamp, message_key
+from ..attachments import AttachmentStore, load_attachments
+from ..config import settings
+from ..dispatcher import chat_dispatcher
+from ..membership import chat_membership, contains, subtract_sorted
+from ..metrics import run_query
+from ..people_index import mask_phone, people_index
 from ..realtime import message_hub
+from ..request_counts import pending_request_counts
 from ..schemas import (
+    MAX_GROUP_MEMBERS,
     ChatCreatePayload,
     ChatCreateResponse,
+    ChatMembersPayload,
+    ChatMembersResponse,
     ChatSummaryModel,
+    FriendRequestCountResponse,
     FriendRequestCreatePayload,
     FriendRequestListResponse,
     FriendRequestModel,
     FriendRequestRespondPayload,
     FriendRequestRole,
+    FriendRequestStatus,
     FriendsListResponse,
     MessageModel,
     MessagesResponse,
+    PeopleSearchResponse,
     ProfileSummary,
     SendMessagePayload,
 )
+from ..supabase_client import ReplicaPool
+from ..versioning import chat_key, friends_key, requests_key, versions
+
+if TYPE_CHECKING:
+    from supabase import Client
 
 _SELECT_FRIEND_REQUEST = (
     "*,requester:requester_id(id,display_name,phone,avatar_url,status_message),"
     "addressee:addressee_id(id,display_name,phone,avatar_url,status_message)"
 )
+_SELECT_MESSAGE = "id,chat_id,sender_id,content,created_at,attachments,sender:sender_id(display_name)"
 PROFILE_FIELDS = "id,display_name,phone,avatar_url,status_message,friend_ids"
 CHAT_SUMMARY_FIELDS = "id,title,last_message_preview,last_message_at,unread_count,participant_ids"
-MESSAGE_FIELDS = "id,chat_id,sender_id,content,created_at"
+MESSAGE_FIELDS = "id,chat_id,sender_id,content,created_at,attachments"
+PEOPLE_INDEX_FIELDS = "id,display_name,phone,avatar_url,status_message,updated_at"
+PEOPLE_INDEX_PAGE_SIZE = 1000
+# Member writes are chunked to keep PostgREST bodies and `in.(...)` URLs bounded.
+MEMBER_WRITE_CHUNK = 500
+MEMBER_DELETE_CHUNK = 200
+MEMBER_PAGE_SIZE = 1000
 
 
 class SocialService:
-    def __init__(self, client: Client) -> None:
+    def __init__(
+        self,
+        client: Client,
+        replicas: ReplicaPool | None = None,
+        archive: MessageArchive | None = None,
+        attachments: AttachmentStore | None = None,
+    ) -> None:
         self.client = client
+        self.replicas = replicas
+        self.archive = archive
+        self.attachments = attachments
 
     async def create_friend_request(self, payload: FriendRequestCreatePayload) -> FriendRequestModel:
         requester_id = str(payload.requester_id).lower()
@@ -62,7 +96,13 @@ class SocialService:
             )
             return response.data[0]
 
-        row = await asyncio.to_thread(_upsert)
+        row = await run_query("friend_requests", "upsert", _upsert)
+        keys = (
+            requests_key(requester_id, FriendRequestRole.outgoing.value),
+            requests_key(target_id, FriendRequestRole.incoming.value),
+        )
+        self._wrote(*keys)
+        pending_request_counts.invalidate(*keys)
         return await self._fetch_request_by_id(row["id"])
 
     async def respond_friend_request(self, payload: FriendRequestRespondPayload) -> FriendRequestModel:
@@ -79,51 +119,209 @@ class SocialService:
             )
             return response.data[0]
 
-        _ = await asyncio.to_thread(_update_request)
+        _ = await run_query("friend_requests", "update", _update_request)
+        keys = (
+            requests_key(request.requester_id, FriendRequestRole.outgoing.value),
+            requests_key(request.addressee_id, FriendRequestRole.incoming.value),
+        )
+        self._wrote(*keys)
+        if request.status == FriendRequestStatus.pending:
+            for key in keys:
+                pending_request_counts.adjust(key, -1)
         if payload.accept:
             await self._link_profiles(UUID(request.requester_id), UUID(request.addressee_id))
+            self._wrote(friends_key(request.requester_id), friends_key(request.addressee_id))
         return await self._fetch_request_by_id(payload.request_id)
 
     async def list_friend_requests(self, user_id: UUID, role: FriendRequestRole) -> FriendRequestListResponse:
+        rows = await self.list_friend_request_rows(user_id, role)
+        requests = [FriendRequestModel.model_validate(row) for row in rows]
+        return FriendRequestListResponse(requests=requests)
+
+    async def list_friend_request_rows(
+        self,
+        user_id: UUID,
+        role: FriendRequestRole,
+        before: Key | None = None,
+        limit: int | None = None,
+    ) -> List[dict]:
+        """Pending requests exactly as PostgREST returns them; already in FriendRequestModel shape.
+
+        Newest first; with `limit`, a keyset page of the requests older than `before`.
+        """
+
+        client = self._reader(requests_key(user_id, role.value))
+
         def _query() -> List[dict]:
-            query = self.client.table("friend_requests").select(_SELECT_FRIEND_REQUEST)
-            if role == FriendRequestRole.incoming:
-                query = query.eq("addressee_id", str(user_id))
+            query = client.table("friend_requests").select(_SELECT_FRIEND_REQUEST)
+            query = self._pending_for(query, user_id, role)
+            if before is not None:
+                created_at, request_id = key_timestamp(before), key_id(before)
+                query = query.or_(
+                    f'created_at.lt."{created_at}",'
+                    f'and(created_at.eq."{created_at}",id.lt.{request_id})'
+                )
+            query = query.order("created_at", desc=True).order("id", desc=True)
+            if limit is not None:
+                query = query.limit(limit)
+            return query.execute().data
+
+        return await run_query("friend_requests", "select", _query)
+
+    async def list_friend_request_page(
+        self, user_id: UUID, role: FriendRequestRole, before: Key | None, limit: int
+    ) -> tuple[List[dict], str | None]:
+        """Up to `limit` pending requests older than `before`, and the cursor for the next page."""
+        rows = await self.list_friend_request_rows(user_id, role, before, limit + 1)
+        if len(rows) <= limit:
+            return rows, None
+        rows = rows[:limit]
+        return rows, encode_cursor(message_key(rows[-1]))
+
+    async def count_pending_requests(self, user_id: UUID) -> FriendRequestCountResponse:
+        """Badge counts for both roles, from the counter cache when it has them."""
+        counts: dict[str, int] = {}
+        missing = []
+        for role in FriendRequestRole:
+            cached = pending_request_counts.get(requests_key(user_id, role.value))
+            if cached is None:
+                missing.append(role)
             else:
-                query = query.eq("requester_id", str(user_id))
-            return (
-                query
-                .eq("status", "pending")
-                .order("created_at", desc=True)
-                .execute()
-                .data
-            )
+                counts[role.value] = cached
+        if missing:
+            loaded = await asyncio.gather(*(self._count_pending(user_id, role) for role in missing))
+            for role, count in zip(missing, loaded):
+                counts[role.value] = count
+        return FriendRequestCountResponse(**counts)
+
+    async def _count_pending(self, user_id: UUID, role: FriendRequestRole) -> int:
+        key = requests_key(user_id, role.value)
+        version = versions.get(key)
+        client = self._reader(key)
+
+        def _query() -> int:
+            # No embeds and one row at most: the total comes back in Content-Range.
+            query = client.table("friend_requests").select("id", count="exact")
+            return self._pending_for(query, user_id, role).limit(1).execute().count or 0
+
+        count = await run_query("friend_requests", "count", _query)
+        if versions.get(key) == version:
+            # A write that landed while counting bumped the version; caching would pin the stale total.
+            pending_request_counts.set(key, count)
+        return count
 
-        rows = await asyncio.to_thread(_query)
-        requests = [FriendRequestModel.model_validate(row) for row in rows]
-        return FriendRequestListResponse(requests=requests)
+    @staticmethod
+    def _pending_for(query, user_id: UUID, role: FriendRequestRole):
+        column = "addressee_id" if role == FriendRequestRole.incoming else "requester_id"
+        return query.eq(column, str(user_id)).eq("status", "pending")
 
     async def list_friends(self, user_id: UUID) -> FriendsListResponse:
+        client = self._reader(friends_key(user_id))
+
         def _query() -> List[dict]:
             return (
-                self.client.table("profiles")
+                client.table("profiles")
                 .select(PROFILE_FIELDS)
                 .contains("friend_ids", [str(user_id)])
                 .execute()
                 .data
             )
 
-        rows = await asyncio.to_thread(_query)
+        rows = await run_query("profiles", "select", _query)
         friends = [ProfileSummary.model_validate(row) for row in rows]
         return FriendsListResponse(friends=friends)
 
+    async def search_people(
+        self, query: str, limit: int, exclude_id: UUID | None = None
+    ) -> PeopleSearchResponse:
+        query = query.strip()
+        if not query:
+            return PeopleSearchResponse(people=[])
+        exclude = str(exclude_id).lower() if exclude_id else None
+
+        if settings.people_search_backend == "database":
+            client = self._reader()
+
+            def _rpc() -> List[dict]:
+                return (
+                    client.rpc("search_profiles", {"q": query, "max_results": limit + 1})
+                    .execute()
+                    .data
+                )
+
+            rows = await run_query("search_profiles", "rpc", _rpc)
+            rows = [
+                {**row, "phone": mask_phone(row.get("phone"))}
+                for row in rows
+                if str(row["id"]).lower() != exclude
+            ]
+        else:
+            await self._refresh_people_index()
+            rows = people_index.search(
+                query,
+                limit=limit,
+                budget_seconds=settings.people_search_budget_ms / 1000,
+                exclude_id=exclude,
+            )
+        people = [ProfileSummary.model_validate(row) for row in rows[:limit]]
+        return PeopleSearchResponse(people=people)
+
+    async def _refresh_people_index(self) -> None:
+        now = time.monotonic()
+        if now - people_index.refreshed_at < settings.people_index_refresh_seconds:
+            return
+        async with people_index.refresh_lock:
+            if time.monotonic() - people_index.refreshed_at < settings.people_index_refresh_seconds:
+                return
+            # Periodic full rebuild drops profiles that were deleted since the last one;
+            # in between, only rows whose updated_at moved past the cursor are fetched.
+            if now - people_index.built_at >= settings.people_index_rebuild_seconds:
+                people_index.clear()
+                people_index.built_at = now
+
+            cursor = people_index.cursor
+            while True:
+                rows = await run_query("profiles", "select", self._changed_profiles_page, self._reader(), cursor)
+                people_index.upsert_many(rows)
+                if rows:
+                    cursor = (rows[-1]["updated_at"], rows[-1]["id"])
+                    people_index.cursor = cursor
+                if len(rows) < PEOPLE_INDEX_PAGE_SIZE:
+                    break
+            people_index.refreshed_at = time.monotonic()
+
+    def _changed_profiles_page(self, client: Client, cursor: tuple[str, str] | None) -> List[dict]:
+        query = client.table("profiles").select(PEOPLE_INDEX_FIELDS)
+        if cursor is not None:
+            updated_at, profile_id = cursor
+            query = query.or_(
+                f'updated_at.gt."{updated_at}",'
+                f'and(updated_at.eq."{updated_at}",id.gt.{profile_id})'
+            )
+        return (
+            query.order("updated_at")
+            .order("id")
+            .limit(PEOPLE_INDEX_PAGE_SIZE)
+            .execute()
+            .data
+        )
+
     async def create_chat(self, payload: ChatCreatePayload) -> ChatSummaryModel:
         initiator_id = UUID(payload.initiator_id)
-        participant_id = UUID(payload.participant_id)
+        member_ids = [str(UUID(user_id)) for user_id in payload.member_ids()]
+        if len(member_ids) < 2:
+            raise ValueError("聊天至少需要两名成员")
+        if len(member_ids) > MAX_GROUP_MEMBERS:
+            raise ValueError(f"群成员不能超过 {MAX_GROUP_MEMBERS} 人")
+        is_group = len(member_ids) > 2
         chat_id = uuid4()
 
-        participant_profile = await self._profile_by_id(participant_id)
-        title = self._display_name_or_phone(participant_profile) if participant_profile else "Chat"
+        if is_group:
+            title = (payload.title or "").strip() or "群聊"
+        else:
+            participant_id = next(user_id for user_id in member_ids if user_id != str(initiator_id))
+            participant_profile = await self._profile_by_id(UUID(participant_id))
+            title = self._display_name_or_phone(participant_profile) if participant_profile else "Chat"
 
         def _insert_chat() -> None:
             self.client.table("chats").insert(
@@ -131,45 +329,93 @@ class SocialService:
                     "id": str(chat_id),
                     "owner_id": str(initiator_id),
                     "title": title,
-                    "is_group": False,
+                    "is_group": is_group,
                 }
             ).execute()
 
-        await asyncio.to_thread(_insert_chat)
+        await run_query("chats", "insert", _insert_chat)
+        await self._insert_members(str(chat_id), member_ids)
+        chat_membership.set(str(chat_id), member_ids)
+        self._wrote(chat_key(chat_id))
 
-        members = [
-            {"chat_id": str(chat_id), "user_id": str(initiator_id)},
-            {"chat_id": str(chat_id), "user_id": str(participant_id)},
-        ]
+        return await self._fetch_chat_summary(chat_id)
 
-        def _insert_members() -> None:
-            self.client.table("chat_members").insert(members).execute()
+    async def add_chat_members(self, chat_id: UUID, payload: ChatMembersPayload) -> ChatMembersResponse:
+        chat = await self._fetch_chat(chat_id)
+        if str(chat.get("owner_id") or "").lower() != payload.actor_id.lower():
+            raise ValueError("只有群主可以添加成员")
+
+        members = await self._chat_member_ids(chat_id)
+        new_ids = sorted({str(UUID(user_id)) for user_id in payload.user_ids} - set(members))
+        if len(members) + len(new_ids) > MAX_GROUP_MEMBERS:
+            raise ValueError(f"群成员不能超过 {MAX_GROUP_MEMBERS} 人")
+        if new_ids and not chat.get("is_group"):
+            await run_query(
+                "chats",
+                "update",
+                lambda: self.client.table("chats")
+                .update({"is_group": True})
+                .eq("id", str(chat_id))
+                .execute()
+            )
 
-        await asyncio.to_thread(_insert_members)
+        added = await self._insert_members(str(chat_id), new_ids)
+        chat_membership.add(str(chat_id), new_ids)
+        self._wrote(chat_key(chat_id))
+        return ChatMembersResponse(
+            chat_id=str(chat_id), changed=added, member_count=len(members) + added
+        )
 
-        return await self._fetch_chat_summary(chat_id)
+    async def remove_chat_members(self, chat_id: UUID, payload: ChatMembersPayload) -> ChatMembersResponse:
+        chat = await self._fetch_chat(chat_id)
+        actor_id = payload.actor_id.lower()
+        target_ids = sorted({str(UUID(user_id)) for user_id in payload.user_ids})
+        is_owner = str(chat.get("owner_id") or "").lower() == actor_id
+        if not is_owner and target_ids != [actor_id]:
+            raise ValueError("只有群主可以移除其他成员")
+
+        members = await self._chat_member_ids(chat_id)
+        removed = 0
+        for start in range(0, len(target_ids), MEMBER_DELETE_CHUNK):
+            chunk = target_ids[start : start + MEMBER_DELETE_CHUNK]
+
+            def _delete(chunk: list[str] = chunk) -> int:
+                response = (
+                    self.client.table("chat_members")
+                    .delete()
+                    .eq("chat_id", str(chat_id))
+                    .in_("user_id", chunk)
+                    .execute()
+                )
+                return len(response.data)
+
+            removed += await run_query("chat_members", "delete", _delete)
+        chat_membership.remove(str(chat_id), target_ids)
+        self._wrote(chat_key(chat_id))
+        return ChatMembersResponse(
+            chat_id=str(chat_id), changed=removed, member_count=max(len(members) - removed, 0)
+        )
 
     async def send_message(self, chat_id: UUID, payload: SendMessagePayload) -> MessageModel:
         sender_profile = await self._profile_by_id(UUID(payload.sender_id))
         sender_name = sender_profile.get("display_name") if sender_profile else None
+        attachments = await self._message_attachments(chat_id, payload)
         message_id = uuid4()
+        row = {
+            "id": str(message_id),
+            "chat_id": str(chat_id),
+            "sender_id": payload.sender_id,
+            "content": payload.content,
+        }
+        if attachments:
+            row["attachments"] = attachments
 
         def _insert() -> dict:
-            response = (
-                self.client.table("messages")
-                .insert(
-                    {
-                        "id": str(message_id),
-                        "chat_id": str(chat_id),
-                        "sender_id": payload.sender_id,
-                        "content": payload.content,
-                    }
-                )
-                .execute()
-            )
+            response = self.client.table("messages").insert(row).execute()
             return response.data[0]
 
-        _ = await asyncio.to_thread(_insert)
+        _ = await run_query("messages", "insert", _insert)
+        self._wrote(chat_key(chat_id))
         message = MessageModel(
             id=str(message_id),
             chat_id=str(chat_id),
@@ -177,42 +423,318 @@ class SocialService:
             sender_name=sender_name,
             content=payload.content,
             created_at=datetime.now(timezone.utc),
+            attachments=attachments,
         )
-        recipients = await self._chat_member_ids(chat_id)
-        await message_hub.broadcast(recipients, message.model_dump(mode="json"))
+        # The row is persisted; recipients are reached asynchronously, in order per chat.
+        frame = message.model_dump(mode="json")
+        chat_dispatcher.submit(str(chat_id), lambda: self._fan_out(chat_id, frame))
         return message
 
+    async def _message_attachments(self, chat_id: UUID, payload: SendMessagePayload) -> List[dict]:
+        if not payload.attachment_ids:
+            return []
+        if self.attachments is None:
+            raise ValueError("附件功能未启用")
+        return await asyncio.to_thread(
+            load_attachments, self.attachments, chat_id, payload.sender_id, payload.attachment_ids
+        )
+
+    async def _fan_out(self, chat_id: UUID, frame: dict) -> None:
+        # Skip the membership lookup entirely when nobody is connected to this process.
+        if not message_hub.connections:
+            return
+        members = await self._chat_member_ids(chat_id)
+        local = message_hub.local_members(members)
+        if not local:
+            return
+        # The cached list may predate a removal made by another process; confirm the few
+        # recipients actually connected here before anything is sent to them.
+        recipients = await self._confirmed_members(chat_id, local)
+        if len(recipients) < len(local):
+            chat_membership.remove(str(chat_id), subtract_sorted(local, recipients))
+        await message_hub.broadcast_sorted(recipients, frame)
+
     async def list_messages(self, chat_id: UUID) -> MessagesResponse:
+        rows = await self.list_message_rows(chat_id)
+        return MessagesResponse(messages=[MessageModel.model_validate(row) for row in rows])
+
+    async def list_message_rows(self, chat_id: UUID) -> List[dict]:
+        """Full history (archived, then hot) flattened into MessageModel's shape without re-validating it."""
+        client = self._reader(chat_key(chat_id))
+        rows = await run_query("messages", "select", self._fetch_message_rows, client, chat_id)
+        archived: List[dict] = []
+        if self.archive is not None:
+            archived = await asyncio.to_thread(
+                lambda: [row for block in self.archive.iter_after(str(chat_id), None) for row in block]
+            )
+        return archived + [self.flatten_message(row) for row in rows]
+
+    async def list_message_page(
+        self, chat_id: UUID, before: Key | None, limit: int
+    ) -> tuple[List[dict], str | None]:
+        """The `limit` messages just older than `before` (newest page when None), oldest first.
+
+        Reads the hot table first and continues into the archive once it runs out.
+        Returns the rows and the cursor for the next older page (None at the start).
+        """
+        client = self._reader(chat_key(chat_id))
+        rows = await run_query(
+            "messages",
+            "select",
+            self._fetch_message_page,
+            client,
+            chat_id,
+            before,
+            limit + 1,
+            True,
+        )
+        page = [self.flatten_message(row) for row in reversed(rows[:limit])]
+        more = len(rows) > limit
+        if not more and self.archive is not None:
+            missing = limit - len(page)
+            oldest = message_key(page[0]) if page else before
+            archived = await asyncio.to_thread(self.archive.read_before, str(chat_id), oldest, missing + 1)
+            more = len(archived) > missing
+            page = (archived[-missing:] if missing else []) + page
+        return page, encode_cursor(message_key(page[0])) if more else None
+
+    async def message_cursor(self, chat_id: UUID, message_id: str) -> Key:
+        """Keyset position of `message_id` in the chat, for resuming an export after it."""
+
         def _query() -> List[dict]:
             return (
                 self.client.table("messages")
-                .select("id,chat_id,sender_id,content,created_at,sender:sender_id(display_name)")
+                .select("id,created_at")
                 .eq("chat_id", str(chat_id))
-                .order("created_at", desc=False)
+                .eq("id", message_id)
+                .limit(1)
                 .execute()
                 .data
             )
 
-        rows = await asyncio.to_thread(_query)
-        messages: List[MessageModel] = []
-        for row in rows:
-            sender = row.pop("sender", None)
-            if sender:
-                row["sender_name"] = sender.get("display_name")
-            messages.append(MessageModel.model_validate(row))
-        return MessagesResponse(messages=messages)
+        try:
+            message_id = str(UUID(message_id))
+        except ValueError:
+            raise ValueError("导出游标无效") from None
+        rows = await run_query("messages", "select", _query)
+        if rows:
+            return message_key(rows[0])
+        if self.archive is not None:
+            key = await asyncio.to_thread(self.archive.locate, str(chat_id), message_id)
+            if key is not None:
+                return key
+        raise ValueError("导出游标无效")
+
+    async def iter_message_pages(self, chat_id: UUID, after: Key | None = None) -> AsyncIterator[List[dict]]:
+        """Whole history in (created_at, id) order, archive first, one page at a time."""
+        if self.archive is not None:
+            blocks = self.archive.iter_after(str(chat_id), after)
+            while rows := await asyncio.to_thread(next, blocks, None):
+                yield rows
+                after = message_key(rows[-1])
+
+        client = self._reader(chat_key(chat_id))
+        page_size = settings.export_page_size
+        while True:
+            rows = await run_query(
+                "messages",
+                "select",
+                self._fetch_message_page,
+                client,
+                chat_id,
+                after,
+                page_size,
+            )
+            if rows:
+                yield [self.flatten_message(row) for row in rows]
+                after = message_key(rows[-1])
+            if len(rows) < page_size:
+                return
+
+    async def fetch_cold_messages(
+        self, cutoff: str, after: tuple[str, str, str] | None, page_size: int
+    ) -> List[dict]:
+        """Messages older than `cutoff` in (chat_id, created_at, id) order, for the archive job."""
+
+        def _query() -> List[dict]:
+            query = self.client.table("messages").select(_SELECT_MESSAGE).lt("created_at", cutoff)
+            if after is not None:
+                chat_id, created_at, message_id = after
+                query = query.or_(
+                    f"chat_id.gt.{chat_id},"
+                    f'and(chat_id.eq.{chat_id},created_at.gt."{created_at}"),'
+                    f'and(chat_id.eq.{chat_id},created_at.eq."{created_at}",id.gt.{message_id})'
+                )
+            return query.order("chat_id").order("created_at").order("id").limit(page_size).execute().data
+
+        return await run_query("messages", "select", _query)
+
+    async def newest_message_id(self, chat_id: str) -> str | None:
+        def _query() -> List[dict]:
+            return (
+                self.client.table("messages")
+                .select("id")
+                .eq("chat_id", chat_id)
+                .order("created_at", desc=True)
+                .order("id", desc=True)
+                .limit(1)
+                .execute()
+                .data
+            )
+
+        rows = await run_query("messages", "select", _query)
+        return rows[0]["id"] if rows else None
+
+    async def delete_messages(self, message_ids: Sequence[str]) -> None:
+        await run_query(
+            "messages",
+            "delete",
+            lambda: self.client.table("messages").delete().in_("id", list(message_ids)).execute(),
+        )
+
+    def _fetch_message_rows(self, client: Client, chat_id: UUID) -> List[dict]:
+        return (
+            client.table("messages")
+            .select(_SELECT_MESSAGE)
+            .eq("chat_id", str(chat_id))
+            .order("created_at", desc=False)
+            .execute()
+            .data
+        )
+
+    def _fetch_message_page(
+        self,
+        client: Client,
+        chat_id: UUID,
+        cursor: Key | None,
+        page_size: int,
+        descending: bool = False,
+    ) -> List[dict]:
+        """Keyset page after `cursor` (or before it when `descending`)."""
+        query = client.table("messages").select(_SELECT_MESSAGE).eq("chat_id", str(chat_id))
+        if cursor is not None:
+            created_at, message_id = key_timestamp(cursor), key_id(cursor)
+            op = "lt" if descending else "gt"
+            query = query.or_(
+                f'created_at.{op}."{created_at}",'
+                f'and(created_at.eq."{created_at}",id.{op}.{message_id})'
+            )
+        return (
+            query.order("created_at", desc=descending)
+            .order("id", desc=descending)
+            .limit(page_size)
+            .execute()
+            .data
+        )
+
+    @staticmethod
+    def flatten_message(row: dict) -> dict:
+        sender = row.get("sender")
+        return {
+            "id": row["id"],
+            "chat_id": row["chat_id"],
+            "sender_id": row["sender_id"],
+            "sender_name": sender.get("display_name") if sender else None,
+            "content": row["content"],
+            "created_at": row["created_at"],
+            "attachments": row.get("attachments") or [],
+        }
+
+    def _wrote(self, *keys: str) -> None:
+        """Invalidate ETags for `keys` and keep their reads on the primary for a while."""
+        versions.bump(*keys)
+        if self.replicas is not None:
+            self.replicas.pin(*keys)
+
+    def _reader(self, *keys: str) -> Client:
+        """Client for a lag-tolerant read; membership and write-path lookups stay on `self.client`."""
+        if self.replicas is None:
+            return self.client
+        return self.replicas.reader(*keys)
+
+    async def is_member(self, chat_id: UUID, user_id: UUID | str) -> bool:
+        return contains(await self._chat_member_ids(chat_id), str(user_id).lower())
+
+    async def _confirmed_members(self, chat_id: UUID, user_ids: Sequence[str]) -> list[str]:
+        """The subset of `user_ids` that are members right now, read from the primary."""
+        confirmed: list[str] = []
+        for start in range(0, len(user_ids), MEMBER_DELETE_CHUNK):
+            chunk = list(user_ids[start : start + MEMBER_DELETE_CHUNK])
+
+            def _select(chunk: list[str] = chunk) -> list[str]:
+                rows = (
+                    self.client.table("chat_members")
+                    .select("user_id")
+                    .eq("chat_id", str(chat_id))
+                    .in_("user_id", chunk)
+                    .execute()
+                    .data
+                )
+                return [str(row["user_id"]) for row in rows]
+
+            confirmed.extend(await run_query("chat_members", "select", _select))
+        return sorted(confirmed)
+
+    async def _chat_member_ids(self, chat_id: UUID | str) -> list[str]:
+        key = str(chat_id)
+        members = chat_membership.get(key)
+        if members is not None:
+            return members
 
-    async def _chat_member_ids(self, chat_id: UUID) -> list[str]:
         def _query() -> list[str]:
-            response = (
-                self.client.table("chat_members")
-                .select("user_id")
-                .eq("chat_id", str(chat_id))
+            # PostgREST caps rows per response, so large groups are read in keyset pages.
+            user_ids: list[str] = []
+            while True:
+                query = (
+                    self.client.table("chat_members")
+                    .select("user_id")
+                    .eq("chat_id", key)
+                    .order("user_id")
+                    .limit(MEMBER_PAGE_SIZE)
+                )
+                if user_ids:
+                    query = query.gt("user_id", user_ids[-1])
+                rows = query.execute().data
+                user_ids.extend(str(row["user_id"]) for row in rows)
+                if len(rows) < MEMBER_PAGE_SIZE:
+                    return user_ids
+
+        return chat_membership.set(key, await run_query("chat_members", "select", _query))
+
+    async def _insert_members(self, chat_id: str, user_ids: Sequence[str]) -> int:
+        inserted = 0
+        for start in range(0, len(user_ids), MEMBER_WRITE_CHUNK):
+            rows = [
+                {"chat_id": chat_id, "user_id": user_id}
+                for user_id in user_ids[start : start + MEMBER_WRITE_CHUNK]
+            ]
+
+            def _upsert(rows: list[dict] = rows) -> int:
+                response = (
+                    self.client.table("chat_members")
+                    .upsert(rows, on_conflict="chat_id,user_id", ignore_duplicates=True)
+                    .execute()
+                )
+                return len(response.data)
+
+            inserted += await run_query("chat_members", "upsert", _upsert)
+        return inserted
+
+    async def _fetch_chat(self, chat_id: UUID) -> dict:
+        def _query() -> list[dict]:
+            return (
+                self.client.table("chats")
+                .select("id,owner_id,is_group")
+                .eq("id", str(chat_id))
+                .limit(1)
                 .execute()
+                .data
             )
-            return [row["user_id"] for row in response.data]
 
-        return await asyncio.to_thread(_query)
+        rows = await run_query("chats", "select", _query)
+        if not rows:
+            raise ValueError("聊天不存在")
+        return rows[0]
 
     async def _fetch_request_by_id(self, request_id: str | UUID) -> FriendRequestModel:
         def _query() -> dict:
@@ -225,15 +747,17 @@ class SocialService:
             )
             return response.data
 
-        row = await asyncio.to_thread(_query)
+        row = await run_query("friend_requests", "select", _query)
         if not row:
             raise ValueError("请求不存在")
         return FriendRequestModel.model_validate(row)
 
     async def _fetch_chat_summary(self, chat_id: UUID) -> ChatSummaryModel:
+        client = self._reader(chat_key(chat_id))
+
         def _query() -> dict:
             response = (
-                self.client.table("chat_summaries")
+                client.table("chat_summaries")
                 .select(CHAT_SUMMARY_FIELDS)
                 .eq("id", str(chat_id))
                 .single()
@@ -241,7 +765,7 @@ class SocialService:
             )
             return response.data
 
-        row = await asyncio.to_thread(_query)
+        row = await run_query("chat_summaries", "select", _query)
         participant_ids = [str(pid) for pid in row.get("participant_ids", [])]
         row["participant_ids"] = participant_ids
         return ChatSummaryModel.model_validate(row)
@@ -260,7 +784,7 @@ class SocialService:
             except Exception:
                 return None
 
-        return await asyncio.to_thread(_query)
+        return await run_query("profiles", "select", _query)
 
     async def _link_profiles(self, requester_id: UUID, addressee_id: UUID) -> None:
         requester = await self._profile_by_id(requester_id)
@@ -274,14 +798,18 @@ class SocialService:
         requester_friends.add(str(addressee_id))
         addressee_friends.add(str(requester_id))
 
-        await asyncio.to_thread(
+        await run_query(
+            "profiles",
+            "update",
             lambda: self.client.table("profiles")
             .update({"friend_ids": list(requester_friends)})
             .eq("id", str(requester_id))
             .execute()
         )
 
-        await asyncio.to_thread(
+        await run_query(
+            "profiles",
+            "update",
             lambda: self.client.table("profiles")
             .update({"friend_ids": list(addressee_friends)})
             .eq("id", str(addressee_id))
@@ -302,7 +830,7 @@ class SocialService:
             except Exception:
                 return None
 
-        return await asyncio.to_thread(_query)
+        return await run_query("profiles", "select", _query)
 
     @staticmethod
     def _display_name_or_phone(profile: dict | None) -> str:
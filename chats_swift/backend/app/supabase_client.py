@@ -1,9 +1,179 @@
+from __future__ import annotations
+
+import asyncio
+import itertools
+import logging
+import time
+from collections import OrderedDict
 from functools import lru_cache
-from supabase import create_client, Client
+from typing import TYPE_CHECKING
 
 from .config import settings
+from .metrics import registry, run_query
+
+if TYPE_CHECKING:
+    from supabase import Client
+
+logger = logging.getLogger(__name__)
+
+read_routing = registry.counter(
+    "chat_read_routing_total",
+    "Read-only queries by the client they were sent to and why.",
+    ("target", "reason"),
+)
 
 
 @lru_cache(maxsize=1)
 def get_supabase() -> Client:
+    # Imported on first use: supabase and its httpx/h2/gotrue tree are over a
+    # quarter of the app's import time, and /health or a websocket never need it.
+    from supabase import create_client
+
     return create_client(settings.supabase_url, settings.supabase_service_key)
+
+
+def warm_up() -> None:
+    """Build the clients ahead of the first request; meant for a worker thread after startup."""
+    try:
+        get_supabase()
+        get_replica_pool()
+    except Exception:
+        logger.warning("Supabase client warm-up failed; retrying on first use", exc_info=True)
+
+
+class _Replica:
+    __slots__ = ("url", "client", "lag_seconds", "checked_at", "probing")
+
+    def __init__(self, url: str, client: Client) -> None:
+        self.url = url
+        self.client = client
+        self.lag_seconds: float | None = None  # unknown until the first probe succeeds
+        self.checked_at = 0.0
+        self.probing = False
+
+
+class ReplicaPool:
+    """Routes read-only queries to read replicas, falling back to the primary.
+
+    A replica is used only while its last lag probe (the `replication_lag_seconds`
+    RPC) is recent and under `max_lag_seconds`; probes run in the background when
+    the previous one is older than `check_seconds`, so reads never wait for them.
+    Resource keys written in the last `pin_seconds` read from the primary, which
+    gives the writer read-your-writes within this process.
+    """
+
+    def __init__(
+        self,
+        primary: Client,
+        replicas: list[tuple[str, Client]],
+        max_lag_seconds: float = 2.0,
+        check_seconds: float = 5.0,
+        pin_seconds: float = 5.0,
+        max_pins: int = 100_000,
+    ) -> None:
+        self.primary = primary
+        self.replicas = [_Replica(url, client) for url, client in replicas]
+        self.max_lag_seconds = max_lag_seconds
+        self.check_seconds = check_seconds
+        self.pin_seconds = pin_seconds
+        self.max_pins = max_pins
+        # Every pin lasts pin_seconds, so insertion order is expiry order.
+        self._pins: OrderedDict[str, float] = OrderedDict()
+        self._next = itertools.count()
+        # The loop only holds weak references to tasks; keep probes alive until done.
+        self._probes: set[asyncio.Task] = set()
+
+    def pin(self, *keys: str) -> None:
+        deadline = time.monotonic() + self.pin_seconds
+        for key in keys:
+            self._pins.pop(key, None)
+            self._pins[key] = deadline
+        while len(self._pins) > self.max_pins:
+            self._pins.popitem(last=False)
+
+    def is_pinned(self, *keys: str) -> bool:
+        now = time.monotonic()
+        while self._pins:
+            key, deadline = next(iter(self._pins.items()))
+            if deadline > now:
+                break
+            del self._pins[key]
+        return any(key in self._pins for key in keys)
+
+    def reader(self, *keys: str) -> Client:
+        """Client for a read of `keys`: a healthy replica, or the primary."""
+        if self.is_pinned(*keys):
+            read_routing.labels("primary", "pinned").inc()
+            return self.primary
+        now = time.monotonic()
+        healthy = []
+        for replica in self.replicas:
+            if now - replica.checked_at >= self.check_seconds:
+                self._schedule_probe(replica)
+            if self._usable(replica, now):
+                healthy.append(replica)
+        if not healthy:
+            read_routing.labels("primary", "replica_unavailable").inc()
+            return self.primary
+        read_routing.labels("replica", "ok").inc()
+        return healthy[next(self._next) % len(healthy)].client
+
+    def _usable(self, replica: _Replica, now: float) -> bool:
+        # A probe result older than a few intervals says nothing about current lag.
+        if replica.lag_seconds is None or now - replica.checked_at > 3 * self.check_seconds:
+            return False
+        return replica.lag_seconds <= self.max_lag_seconds
+
+    def _schedule_probe(self, replica: _Replica) -> None:
+        if replica.probing:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        replica.probing = True
+        task = loop.create_task(self._probe(replica))
+        self._probes.add(task)
+        task.add_done_callback(self._probes.discard)
+
+    async def _probe(self, replica: _Replica) -> None:
+        try:
+            lag = await run_query(
+                "replication_lag_seconds",
+                "rpc",
+                lambda: replica.client.rpc("replication_lag_seconds", {}).execute().data,
+            )
+            replica.lag_seconds = float(lag or 0.0)
+        except Exception:
+            logger.warning("lag probe failed for %s", replica.url, exc_info=True)
+            replica.lag_seconds = None
+        finally:
+            replica.checked_at = time.monotonic()
+            replica.probing = False
+
+    def stats(self) -> list[dict[str, object]]:
+        now = time.monotonic()
+        return [
+            {
+                "url": replica.url,
+                "lag_seconds": replica.lag_seconds,
+                "checked_seconds_ago": now - replica.checked_at if replica.checked_at else None,
+                "in_rotation": self._usable(replica, now),
+            }
+            for replica in self.replicas
+        ]
+
+
+@lru_cache(maxsize=1)
+def get_replica_pool() -> ReplicaPool | None:
+    if not settings.supabase_read_urls:
+        return None
+    from supabase import create_client
+
+    return ReplicaPool(
+        get_supabase(),
+        [(url, create_client(url, settings.supabase_service_key)) for url in settings.supabase_read_urls],
+        max_lag_seconds=settings.replica_max_lag_seconds,
+        check_seconds=settings.replica_lag_check_seconds,
+        pin_seconds=settings.read_your_writes_seconds,
+    )
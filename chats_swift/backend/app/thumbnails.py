@@ -0,0 +1,33 @@
+"""Image probing for attachments; runs in the thumbnail process pool.
+
+Kept free of app imports so spawned workers start quickly and never touch settings.
+"""
+from __future__ import annotations
+
+import io
+
+
+def make_thumbnail(source_path: str, max_edge: int, max_pixels: int) -> tuple[int, int, bytes] | None:
+    """(width, height, JPEG thumbnail) of an image file, or None when Pillow cannot read it."""
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        return None
+
+    Image.MAX_IMAGE_PIXELS = max_pixels
+    try:
+        with Image.open(source_path) as image:
+            width, height = image.size
+            if image.getexif().get(0x0112, 1) in (5, 6, 7, 8):  # EXIF orientation rotates by 90°
+                width, height = height, width
+            # JPEG decoders can downscale while decoding, far cheaper than a full decode.
+            image.draft("RGB", (max_edge, max_edge))
+            thumbnail = ImageOps.exif_transpose(image)
+            thumbnail.thumbnail((max_edge, max_edge))
+            if thumbnail.mode not in ("RGB", "L"):
+                thumbnail = thumbnail.convert("RGB")
+            out = io.BytesIO()
+            thumbnail.save(out, "JPEG", quality=80, optimize=True)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None
+    return width, height, out.getvalue()
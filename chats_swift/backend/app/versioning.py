@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import itertools
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict
+
+from fastapi import Request, Response
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class VersionRegistry:
+    """Per-resource version counters used to build cheap ETags.
+
+    Versions come from one process-wide counter, so a key that was evicted and
+    later reads back as `floor` can never collide with a newer write. The ETag also
+    carries a boot id and a coarse time bucket: restarts invalidate every tag, and
+    changes made outside this process (profile edits) surface within one bucket.
+
+    Writes only bump the counters of the process that made them, so another
+    worker would keep answering 304 until the bucket rolls over. ETags are
+    therefore limited to single-worker deployments (`enforce_single_worker`).
+    """
+
+    def __init__(self, max_keys: int = 200_000) -> None:
+        self.max_keys = max_keys
+        self.boot_id = uuid.uuid4().hex[:8]
+        self._versions: OrderedDict[str, int] = OrderedDict()
+        self._counter = itertools.count(1)
+        self._floor = 0
+
+    def get(self, key: str) -> int:
+        return self._versions.get(key, self._floor)
+
+    def bump(self, *keys: str) -> None:
+        for key in keys:
+            self._versions.pop(key, None)
+            self._versions[key] = next(self._counter)
+        while len(self._versions) > self.max_keys:
+            _, version = self._versions.popitem(last=False)
+            self._floor = max(self._floor, version)
+
+    def etag(self, *keys: str) -> str:
+        window = max(int(settings.etag_max_age_seconds), 1)
+        bucket = int(time.time() // window)
+        parts = ".".join(str(self.get(key)) for key in keys)
+        return f'W/"{self.boot_id}-{bucket}-{parts}"'
+
+
+def friends_key(user_id: object) -> str:
+    return f"friends:{str(user_id).lower()}"
+
+
+def requests_key(user_id: object, role: str) -> str:
+    return f"requests:{role}:{str(user_id).lower()}"
+
+
+def chat_key(chat_id: object) -> str:
+    return f"chat:{str(chat_id).lower()}"
+
+
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison (RFC 9110 §13.1.2): ignore the W/ prefix on both sides.
+    opaque = etag.removeprefix("W/")
+    return any(candidate.strip().removeprefix("W/") == opaque for candidate in if_none_match.split(","))
+
+
+def conditional_get(request: Request, response: Response, *keys: str) -> Response | None:
+    """Return a 304 when the client's ETag is current; otherwise stamp the ETag on `response`.
+
+    Must be called before the data is read so a concurrent write can only make the
+    tag older than the body, never newer.
+    """
+    if not settings.etags_enabled:
+        return None
+    etag = versions.etag(*keys)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
+
+
+def enforce_single_worker() -> None:
+    """Turn ETags off when the server was started with several workers (`WEB_CONCURRENCY`)."""
+    try:
+        workers = int(os.environ.get("WEB_CONCURRENCY", "1"))
+    except ValueError:
+        workers = 1
+    if settings.etags_enabled and workers > 1:
+        logger.warning(
+            "ETag version counters are per process; disabling ETags for %d workers "
+            "(set CHAT_ETAGS_ENABLED=false to silence this)",
+            workers,
+        )
+        settings.etags_enabled = False
+
+
+versions = VersionRegistry()
@@ -0,0 +1,61 @@
+"""Reconnect-storm cost of bearer token checks.
+
+Mints `--users` Supabase-style HS256 tokens and has every user reconnect
+`--reconnects` times. The first check per token verifies the signature; the
+rest should be served from the claims cache.
+
+    python -m bench.auth_storm --users 20000 --reconnects 3
+"""
+from __future__ import annotations
+
+import argparse
+import time
+import uuid
+
+import jwt
+
+from app.auth import TokenVerifier
+
+_SECRET = "bench-secret-bench-secret-bench-secret"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--reconnects", type=int, default=3)
+    args = parser.parse_args()
+
+    expires = int(time.time()) + 3600
+    tokens = [
+        jwt.encode(
+            {"sub": str(uuid.uuid4()), "aud": "authenticated", "role": "authenticated", "exp": expires},
+            _SECRET,
+            algorithm="HS256",
+        )
+        for _ in range(args.users)
+    ]
+
+    uncached = TokenVerifier(_SECRET, max_entries=0)
+    started = time.perf_counter()
+    for token in tokens:
+        uncached.verify(token)
+    signature_us = (time.perf_counter() - started) / len(tokens) * 1e6
+
+    verifier = TokenVerifier(_SECRET, max_entries=args.users)
+    started = time.perf_counter()
+    for token in tokens:
+        verifier.verify(token)
+    first_us = (time.perf_counter() - started) / len(tokens) * 1e6
+    started = time.perf_counter()
+    for _ in range(args.reconnects):
+        for token in tokens:
+            verifier.verify(token)
+    cached_us = (time.perf_counter() - started) / (len(tokens) * args.reconnects) * 1e6
+
+    print(f"signature check:        {signature_us:7.2f} us/token")
+    print(f"first connect (cached): {first_us:7.2f} us/token")
+    print(f"reconnect (cache hit):  {cached_us:7.2f} us/token  ({signature_us / cached_us:.0f}x cheaper)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""Bandwidth vs CPU for chat payload encodings on Chinese-heavy message mixes.
+
+HTTP history pages: identity JSON vs gzip/zstd at a few levels.
+Websocket broadcasts: JSON text vs MessagePack, each with and without a
+permessage-deflate style raw DEFLATE (no context takeover / context takeover).
+
+    python -m bench.compression
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import time
+import uuid
+import zlib
+from datetime import datetime, timedelta, timezone
+from typing import Callable
+
+import msgpack
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+_LINES = [
+    "好的",
+    "收到，马上处理",
+    "今天的会议改到下午三点了，记得带上周的报告。",
+    "晚上一起吃火锅吗？🍲",
+    "哈哈哈哈哈哈哈",
+    "我刚到公司，路上堵车堵了一个小时😭",
+    "这个 bug 已经修好了，新版本今晚发布。",
+    "OK, see you tomorrow",
+    "周末去爬山的同学请在群里接龙：1. 张伟 2. 李娜 3. 王芳",
+    "https://example.com/share/abc123 你看看这个链接",
+    "嗯嗯",
+    "明天早上九点在公司楼下集合，不要迟到哦！大家记得带身份证和充电宝。",
+]
+
+
+def _message(rng: random.Random, chat_id: str, senders: list[tuple[str, str]], at: datetime) -> dict:
+    sender_id, name = rng.choice(senders)
+    return {
+        "id": str(uuid.uuid4()),
+        "chat_id": chat_id,
+        "sender_id": sender_id,
+        "sender_name": name,
+        "content": rng.choice(_LINES),
+        "created_at": at.isoformat(),
+    }
+
+
+def _messages(count: int, seed: int = 1) -> list[dict]:
+    rng = random.Random(seed)
+    chat_id = str(uuid.uuid4())
+    senders = [(str(uuid.uuid4()), name) for name in ("张伟", "李娜", "王芳", "Alex")]
+    started = datetime(2024, 11, 1, tzinfo=timezone.utc)
+    return [_message(rng, chat_id, senders, started + timedelta(seconds=i * 13)) for i in range(count)]
+
+
+def _time_us(fn: Callable[[], object], rounds: int) -> float:
+    started = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    return (time.perf_counter() - started) / rounds * 1e6
+
+
+def _json_bytes(payload: object) -> bytes:
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _gzip(level: int) -> Callable[[bytes], bytes]:
+    def compress(data: bytes) -> bytes:
+        obj = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        return obj.compress(data) + obj.flush()
+
+    return compress
+
+
+def http_pages(sizes: list[int], rounds: int) -> None:
+    codecs: list[tuple[str, Callable[[bytes], bytes]]] = [
+        ("identity", lambda data: data),
+        ("gzip-1", _gzip(1)),
+        ("gzip-6", _gzip(6)),
+    ]
+    if zstandard is not None:
+        for level in (1, 3, 9):
+            codecs.append((f"zstd-{level}", zstandard.ZstdCompressor(level=level).compress))
+    print("HTTP history pages (JSON, UTF-8)")
+    for size in sizes:
+        body = _json_bytes({"messages": _messages(size)})
+        ascii_body = json.dumps({"messages": _messages(size)}).encode()
+        print(f"  {size} messages: utf-8 {len(body):,} B (\\u-escaped would be {len(ascii_body):,} B)")
+        for name, codec in codecs:
+            out = codec(body)
+            cost = _time_us(lambda: codec(body), rounds)
+            print(f"    {name:>9}: {len(out):>9,} B  ratio {len(out) / len(body):5.2f}  {cost:9.0f} µs")
+
+
+def ws_frames(count: int) -> None:
+    messages = _messages(count, seed=2)
+    print(f"Websocket broadcasts ({count} single-message frames)")
+
+    def stream_deflate(frames: list[bytes], takeover: bool) -> tuple[int, float]:
+        started = time.perf_counter()
+        total = 0
+        shared = zlib.compressobj(6, zlib.DEFLATED, -zlib.MAX_WBITS)
+        for frame in frames:
+            obj = shared if takeover else zlib.compressobj(6, zlib.DEFLATED, -zlib.MAX_WBITS)
+            # permessage-deflate strips the trailing 00 00 ff ff of the sync flush.
+            total += len(obj.compress(frame) + obj.flush(zlib.Z_SYNC_FLUSH)) - 4
+        return total, (time.perf_counter() - started) / len(frames) * 1e6
+
+    for name, encode in (
+        ("json text", _json_bytes),
+        ("msgpack", msgpack.packb),
+    ):
+        started = time.perf_counter()
+        frames = [encode(message) for message in messages]
+        encode_us = (time.perf_counter() - started) / count * 1e6
+        raw = sum(map(len, frames))
+        print(f"    {name:>30}: {raw / count:7.1f} B/frame  {encode_us:6.1f} µs/frame")
+        for takeover in (False, True):
+            size, cost = stream_deflate(frames, takeover)
+            label = f"{name} + deflate{' (takeover)' if takeover else ''}"
+            print(f"    {label:>30}: {size / count:7.1f} B/frame  {encode_us + cost:6.1f} µs/frame")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 200, 1000])
+    parser.add_argument("--frames", type=int, default=2000)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+    http_pages(args.sizes, args.rounds)
+    ws_frames(args.frames)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,562 @@
+"""In-process stand-in for the Supabase client used by `SocialService`.
+
+Implements the tables from `supabase/supabase/migrations` (profiles,
+friend_requests, chats, chat_members, messages, message_notifications and the
+chat_summaries view) behind the same builder chain the services call:
+`client.table(name).select(...).eq(...).order(...).limit(...).execute().data`.
+
+Only the PostgREST features the backend uses are covered: column lists with
+foreign-key embeds (`sender:sender_id(display_name)`), eq/neq/gt/gte/lt/lte,
+in_, contains, or_ (including nested `and(...)`), order, limit, range, single,
+insert, upsert (on_conflict, ignore_duplicates), update, delete and the
+`search_profiles` RPC. Every `execute()` sleeps for `latency_ms` (± `jitter_ms`)
+on the calling executor thread, like a real round trip would.
+"""
+from __future__ import annotations
+
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, Callable, Iterable
+
+
+class FakeAPIError(Exception):
+    """Raised where postgrest-py would raise APIError (constraint violations, `.single()`)."""
+
+    def __init__(self, code: str, message: str) -> None:
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+class FakeResponse:
+    def __init__(self, data: Any, count: int | None = None) -> None:
+        self.data = data
+        self.count = count if count is not None else len(data) if isinstance(data, list) else None
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="microseconds")
+
+
+_DEFAULTS: dict[str, dict[str, Callable[[], Any]]] = {
+    "profiles": {
+        "phone": lambda: None,
+        "avatar_url": lambda: None,
+        "status_message": lambda: None,
+        "friend_ids": list,
+        "created_at": _now,
+        "updated_at": _now,
+    },
+    "friend_requests": {
+        "id": lambda: str(uuid.uuid4()),
+        "status": lambda: "pending",
+        "created_at": _now,
+    },
+    "chats": {
+        "id": lambda: str(uuid.uuid4()),
+        "owner_id": lambda: None,
+        "title": lambda: None,
+        "is_group": lambda: False,
+        "created_at": _now,
+    },
+    "chat_members": {"role": lambda: "member", "joined_at": _now},
+    "messages": {
+        "id": lambda: str(uuid.uuid4()),
+        "read_by": list,
+        "attachments": list,
+        "created_at": _now,
+    },
+    "message_notifications": {
+        "id": lambda: str(uuid.uuid4()),
+        "delivered_at": lambda: None,
+        "created_at": _now,
+    },
+}
+_PRIMARY_KEYS = {
+    "profiles": ("id",),
+    "friend_requests": ("id",),
+    "chats": ("id",),
+    "chat_members": ("chat_id", "user_id"),
+    "messages": ("id",),
+    "message_notifications": ("id",),
+}
+_UNIQUE = {"profiles": [("phone",)], "friend_requests": [("requester_id", "addressee_id")]}
+# uuid columns compare case-insensitively in Postgres; store them lowercased.
+_UUID_COLUMNS = {
+    "id", "owner_id", "chat_id", "user_id", "sender_id", "requester_id", "addressee_id", "recipient_id",
+}
+_FOREIGN_KEYS = {
+    ("friend_requests", "requester_id"): "profiles",
+    ("friend_requests", "addressee_id"): "profiles",
+    ("messages", "sender_id"): "profiles",
+    ("chat_members", "user_id"): "profiles",
+    ("chat_members", "chat_id"): "chats",
+    ("chats", "owner_id"): "profiles",
+}
+# Equality lookups on these columns avoid a full scan, as the real indexes would.
+_INDEXED = {
+    "profiles": ("id", "phone"),
+    "friend_requests": ("id",),
+    "chats": ("id",),
+    "chat_members": ("chat_id",),
+    "messages": ("id", "chat_id"),
+    "message_notifications": (),
+    "chat_summaries": ("id",),
+}
+
+
+def _split_top_level(text: str) -> list[str]:
+    parts, depth, current, quoted = [], 0, [], False
+    for char in text:
+        if char == '"':
+            quoted = not quoted
+        elif not quoted and char == "(":
+            depth += 1
+        elif not quoted and char == ")":
+            depth -= 1
+        elif not quoted and char == "," and depth == 0:
+            parts.append("".join(current).strip())
+            current = []
+            continue
+        current.append(char)
+    if current:
+        parts.append("".join(current).strip())
+    return [part for part in parts if part]
+
+
+def _normalize(column: str, value: Any) -> Any:
+    if column in _UUID_COLUMNS and value is not None:
+        return str(value).lower()
+    return value
+
+
+def _compare(op: str, cell: Any, value: Any) -> bool:
+    if cell is None:
+        return False  # SQL NULL never satisfies a comparison
+    if isinstance(cell, bool):
+        value = value if isinstance(value, bool) else str(value).lower() == "true"
+    elif isinstance(cell, (int, float)):
+        value = type(cell)(value)
+    else:
+        cell, value = str(cell), str(value)
+    if op == "eq":
+        return cell == value
+    if op == "neq":
+        return cell != value
+    if op == "gt":
+        return cell > value
+    if op == "gte":
+        return cell >= value
+    if op == "lt":
+        return cell < value
+    if op == "lte":
+        return cell <= value
+    raise NotImplementedError(f"operator {op!r} is not supported by the fake")
+
+
+def _parse_logic(expression: str) -> Callable[[dict], bool]:
+    """Compile a PostgREST `or=(...)` body such as `a.gt."x",and(a.eq."x",id.gt.y)`."""
+    clauses = [_parse_clause(part) for part in _split_top_level(expression)]
+    return lambda row: any(clause(row) for clause in clauses)
+
+
+def _parse_clause(text: str) -> Callable[[dict], bool]:
+    for combinator, combine in (("and(", all), ("or(", any)):
+        if text.startswith(combinator) and text.endswith(")"):
+            clauses = [_parse_clause(part) for part in _split_top_level(text[len(combinator) : -1])]
+            return lambda row: combine(clause(row) for clause in clauses)
+    column, op, value = text.split(".", 2)
+    negate = op == "not"
+    if negate:
+        op, value = value.split(".", 1)
+    if len(value) >= 2 and value[0] == value[-1] == '"':
+        value = value[1:-1]
+    value = _normalize(column, value)
+
+    def _clause(row: dict) -> bool:
+        matched = _compare(op, row.get(column), value)
+        return not matched if negate else matched
+
+    return _clause
+
+
+class _Query:
+    def __init__(self, db: "FakeSupabase", table: str) -> None:
+        self._db = db
+        self._table = table
+        self._action = "select"
+        self._columns = "*"
+        self._payload: Any = None
+        self._on_conflict: tuple[str, ...] | None = None
+        self._ignore_duplicates = False
+        self._filters: list[Callable[[dict], bool]] = []
+        self._equals: dict[str, Any] = {}
+        self._order: list[tuple[str, bool]] = []
+        self._offset = 0
+        self._limit: int | None = None
+        self._single = False
+        self._count: str | None = None
+        self._total: int | None = None
+
+    # Builders -----------------------------------------------------------------
+
+    def select(self, columns: str = "*", count: str | None = None) -> "_Query":
+        self._columns = columns
+        self._count = count
+        return self
+
+    def insert(self, rows: dict | list[dict], **_: Any) -> "_Query":
+        self._action, self._payload = "insert", rows
+        return self
+
+    def upsert(
+        self,
+        rows: dict | list[dict],
+        on_conflict: str = "",
+        ignore_duplicates: bool = False,
+        **_: Any,
+    ) -> "_Query":
+        self._action, self._payload = "upsert", rows
+        self._on_conflict = tuple(part.strip() for part in on_conflict.split(",") if part.strip()) or None
+        self._ignore_duplicates = ignore_duplicates
+        return self
+
+    def update(self, values: dict, **_: Any) -> "_Query":
+        self._action, self._payload = "update", values
+        return self
+
+    def delete(self, **_: Any) -> "_Query":
+        self._action = "delete"
+        return self
+
+    def _filter(self, column: str, op: str, value: Any) -> "_Query":
+        value = _normalize(column, value)
+        if op == "eq" and column in _INDEXED.get(self._table, ()):
+            self._equals[column] = value
+        self._filters.append(lambda row: _compare(op, row.get(column), value))
+        return self
+
+    def eq(self, column: str, value: Any) -> "_Query":
+        return self._filter(column, "eq", value)
+
+    def neq(self, column: str, value: Any) -> "_Query":
+        return self._filter(column, "neq", value)
+
+    def gt(self, column: str, value: Any) -> "_Query":
+        return self._filter(column, "gt", value)
+
+    def gte(self, column: str, value: Any) -> "_Query":
+        return self._filter(column, "gte", value)
+
+    def lt(self, column: str, value: Any) -> "_Query":
+        return self._filter(column, "lt", value)
+
+    def lte(self, column: str, value: Any) -> "_Query":
+        return self._filter(column, "lte", value)
+
+    def in_(self, column: str, values: Iterable[Any]) -> "_Query":
+        allowed = {str(_normalize(column, value)) for value in values}
+        self._filters.append(lambda row: str(row.get(column)) in allowed)
+        return self
+
+    def contains(self, column: str, values: Iterable[Any]) -> "_Query":
+        wanted = {str(_normalize("id", value)) for value in values}
+        self._filters.append(lambda row: wanted <= {str(item).lower() for item in row.get(column) or ()})
+        return self
+
+    def or_(self, expression: str, **_: Any) -> "_Query":
+        self._filters.append(_parse_logic(expression))
+        return self
+
+    def order(self, column: str, desc: bool = False, **_: Any) -> "_Query":
+        self._order.append((column, desc))
+        return self
+
+    def limit(self, size: int, **_: Any) -> "_Query":
+        self._limit = size
+        return self
+
+    def range(self, start: int, end: int, **_: Any) -> "_Query":
+        self._offset, self._limit = start, end - start + 1
+        return self
+
+    def single(self) -> "_Query":
+        self._single = True
+        return self
+
+    # Execution ----------------------------------------------------------------
+
+    def execute(self) -> FakeResponse:
+        self._db.round_trip(self._table, self._action)
+        with self._db.lock:
+            if self._action == "select":
+                rows = self._select()
+            elif self._action == "insert":
+                rows = self._db.insert_rows(self._table, self._rows(), upsert_on=None)
+            elif self._action == "upsert":
+                rows = self._db.insert_rows(
+                    self._table,
+                    self._rows(),
+                    upsert_on=self._on_conflict or _PRIMARY_KEYS[self._table],
+                    ignore_duplicates=self._ignore_duplicates,
+                )
+            elif self._action == "update":
+                rows = self._db.update_rows(self._table, self._matching(), self._payload)
+            else:
+                rows = self._db.delete_rows(self._table, self._matching())
+            rows = [self._db.project(self._table, row, self._columns) for row in rows]
+        if self._single:
+            if len(rows) != 1:
+                raise FakeAPIError("PGRST116", "JSON object requested, multiple (or no) rows returned")
+            return FakeResponse(rows[0])
+        return FakeResponse(rows, self._total)
+
+    def _rows(self) -> list[dict]:
+        return [dict(self._payload)] if isinstance(self._payload, dict) else [dict(row) for row in self._payload]
+
+    def _matching(self) -> list[dict]:
+        rows = self._db.candidates(self._table, self._equals)
+        return [row for row in rows if all(check(row) for check in self._filters)]
+
+    def _select(self) -> list[dict]:
+        rows = self._matching()
+        for column, desc in reversed(self._order):
+            rows.sort(key=lambda row: (row.get(column) is None, row.get(column) or ""), reverse=desc)
+        if self._count:
+            self._total = len(rows)  # Content-Range total: every match, before limit/range
+        end = None if self._limit is None else self._offset + self._limit
+        return rows[self._offset : end]
+
+
+class _Rpc:
+    def __init__(self, db: "FakeSupabase", name: str, params: dict) -> None:
+        self._db = db
+        self._name = name
+        self._params = params
+
+    def execute(self) -> FakeResponse:
+        self._db.round_trip(self._name, "rpc")
+        if self._name != "search_profiles":
+            raise FakeAPIError("PGRST202", f"function {self._name} is not implemented by the fake")
+        query = str(self._params.get("q", ""))
+        needle = query.lower()
+        digits = _digits(query)
+        limit = int(self._params.get("max_results", 20))
+        with self._db.lock:
+            scored = []
+            for row in self._db.tables["profiles"]:
+                name = (row.get("display_name") or "").lower()
+                # Phones match only on the full number, compared as digits, like the migration.
+                if digits and _digits(row.get("phone")) == digits:
+                    rank = 0
+                elif len(needle) < 2:
+                    continue
+                elif needle == name:
+                    rank = 1
+                elif name.startswith(needle):
+                    rank = 2
+                elif needle in name:
+                    rank = 3
+                else:
+                    continue
+                scored.append((rank, name, row))
+            scored.sort(key=lambda item: (item[0], item[1]))
+            fields = "id,display_name,phone,avatar_url,status_message"
+            return FakeResponse([self._db.project("profiles", row, fields) for _, _, row in scored[:limit]])
+
+
+class FakeSupabase:
+    """Thread-safe in-memory tables behind a supabase-py shaped `table()` / `rpc()` API."""
+
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0, seed: int = 0) -> None:
+        self.latency_seconds = latency_ms / 1000
+        self.jitter_seconds = jitter_ms / 1000
+        self.lock = threading.Lock()
+        self.calls: Counter[tuple[str, str]] = Counter()
+        self.tables: dict[str, list[dict]] = {name: [] for name in _PRIMARY_KEYS}
+        self._indexes: dict[str, dict[str, dict[Any, list[dict]]]] = {
+            name: {column: {} for column in columns} for name, columns in _INDEXED.items()
+        }
+        self._random = random.Random(seed)
+
+    # supabase-py surface -------------------------------------------------------
+
+    def table(self, name: str) -> _Query:
+        if name != "chat_summaries" and name not in self.tables:
+            raise FakeAPIError("42P01", f'relation "public.{name}" does not exist')
+        return _Query(self, name)
+
+    def from_(self, name: str) -> _Query:
+        return self.table(name)
+
+    def rpc(self, name: str, params: dict | None = None) -> _Rpc:
+        return _Rpc(self, name, params or {})
+
+    # Seeding -------------------------------------------------------------------
+
+    def add_profiles(self, count: int, prefix: str = "user") -> list[str]:
+        rows = [
+            {
+                "id": str(uuid.uuid4()),
+                "display_name": f"{prefix}{index:06d}",
+                "phone": f"+1555{index:07d}",
+            }
+            for index in range(count)
+        ]
+        with self.lock:
+            self.insert_rows("profiles", rows, upsert_on=None)
+        return [row["id"] for row in rows]
+
+    def add_chat(self, owner_id: str, member_ids: list[str], title: str | None = None) -> str:
+        chat_id = str(uuid.uuid4())
+        with self.lock:
+            self.insert_rows(
+                "chats",
+                [{"id": chat_id, "owner_id": owner_id, "title": title, "is_group": len(member_ids) > 2}],
+                upsert_on=None,
+            )
+            self.insert_rows(
+                "chat_members",
+                [{"chat_id": chat_id, "user_id": user_id} for user_id in member_ids],
+                upsert_on=None,
+            )
+        return chat_id
+
+    # Storage (callers hold self.lock) -------------------------------------------
+
+    def round_trip(self, table: str, action: str) -> None:
+        self.calls[(table, action)] += 1
+        delay = self.latency_seconds
+        if self.jitter_seconds:
+            delay = max(0.0, delay + self._random.uniform(-self.jitter_seconds, self.jitter_seconds))
+        if delay:
+            time.sleep(delay)
+
+    def candidates(self, table: str, equals: dict[str, Any]) -> list[dict]:
+        if table == "chat_summaries":
+            return self._chat_summaries(equals.get("id"))
+        indexes = self._indexes[table]
+        for column, value in equals.items():
+            if column in indexes:
+                return list(indexes[column].get(value, ()))
+        return list(self.tables[table])
+
+    def insert_rows(
+        self,
+        table: str,
+        rows: list[dict],
+        upsert_on: tuple[str, ...] | None,
+        ignore_duplicates: bool = False,
+    ) -> list[dict]:
+        written = []
+        for row in rows:
+            row = {column: _normalize(column, value) for column, value in row.items()}
+            for column, default in _DEFAULTS[table].items():
+                row.setdefault(column, default())
+            existing = self._find(table, upsert_on, row) if upsert_on else None
+            if existing is not None:
+                if ignore_duplicates:
+                    continue
+                existing.update(row if upsert_on == _PRIMARY_KEYS[table] else _without(row, "id", "created_at"))
+                written.append(existing)
+                continue
+            for key in [_PRIMARY_KEYS[table], *_UNIQUE.get(table, [])]:
+                if all(row.get(column) is not None for column in key) and self._find(table, key, row):
+                    raise FakeAPIError("23505", f"duplicate key value violates unique constraint on {table}{key}")
+            self.tables[table].append(row)
+            for column, index in self._indexes[table].items():
+                index.setdefault(row.get(column), []).append(row)
+            written.append(row)
+        return written
+
+    def update_rows(self, table: str, rows: list[dict], values: dict) -> list[dict]:
+        values = {column: _normalize(column, value) for column, value in values.items()}
+        for row in rows:
+            row.update(values)
+            if table == "profiles":
+                row["updated_at"] = _now()
+        if set(values) & set(self._indexes[table]):
+            self._reindex(table)
+        return rows
+
+    def delete_rows(self, table: str, rows: list[dict]) -> list[dict]:
+        doomed = {id(row) for row in rows}
+        self.tables[table] = [row for row in self.tables[table] if id(row) not in doomed]
+        self._reindex(table)
+        return rows
+
+    def project(self, table: str, row: dict, columns: str) -> dict:
+        projected: dict[str, Any] = {}
+        for item in _split_top_level(columns):
+            if item == "*":
+                projected.update({key: _copy(value) for key, value in row.items()})
+            elif "(" in item:
+                alias, _, rest = item.rpartition(":") if ":" in item.split("(", 1)[0] else ("", "", item)
+                foreign_key, _, nested = rest.partition("(")
+                alias = alias or foreign_key
+                target = _FOREIGN_KEYS.get((table, foreign_key))
+                if target is None:
+                    raise FakeAPIError("PGRST200", f"no relationship {table}.{foreign_key}")
+                matches = self._indexes[target]["id"].get(row.get(foreign_key), [])
+                projected[alias] = self.project(target, matches[0], nested[:-1]) if matches else None
+            else:
+                alias, _, column = item.partition(":")
+                projected[alias] = _copy(row.get(column or alias))
+        return projected
+
+    def _find(self, table: str, key: tuple[str, ...], row: dict) -> dict | None:
+        first = key[0]
+        pool = self._indexes[table].get(first, {}).get(row.get(first)) if first in self._indexes[table] else None
+        for candidate in pool if pool is not None else self.tables[table]:
+            if all(candidate.get(column) == row.get(column) for column in key):
+                return candidate
+        return None
+
+    def _reindex(self, table: str) -> None:
+        for column, index in self._indexes[table].items():
+            index.clear()
+            for row in self.tables[table]:
+                index.setdefault(row.get(column), []).append(row)
+
+    def _chat_summaries(self, chat_id: str | None) -> list[dict]:
+        chats = self._indexes["chats"]["id"].get(chat_id, []) if chat_id else self.tables["chats"]
+        summaries = []
+        for chat in chats:
+            members = self._indexes["chat_members"]["chat_id"].get(chat["id"], [])
+            if not members:
+                continue  # the view inner-joins chat_members
+            messages = self._indexes["messages"]["chat_id"].get(chat["id"], [])
+            last = max(messages, key=lambda message: message["created_at"], default=None)
+            names = sorted(
+                profile[0]["display_name"]
+                for member in members
+                if (profile := self._indexes["profiles"]["id"].get(member["user_id"]))
+            )
+            summaries.append(
+                {
+                    "id": chat["id"],
+                    "title": chat["title"] if chat["title"] is not None else ", ".join(names),
+                    "last_message_preview": last["content"] if last else "",
+                    "last_message_at": last["created_at"] if last else chat["created_at"],
+                    "unread_count": 0,
+                    "participant_ids": sorted(member["user_id"] for member in members),
+                }
+            )
+        return summaries
+
+
+def _digits(value: Any) -> str:
+    return re.sub(r"\D", "", str(value or ""))
+
+
+def _without(row: dict, *columns: str) -> dict:
+    return {key: value for key, value in row.items() if key not in columns}
+
+
+def _copy(value: Any) -> Any:
+    return list(value) if isinstance(value, list) else value
@@ -0,0 +1,92 @@
+"""Fan-out benchmark for a 10k-member group chat.
+
+Run from the backend directory:
+
+    python -m bench.group_fanout --members 10000 --online 500 --other 2000
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+
+from app.realtime import MessageHub
+
+
+class _NullSocket:
+    headers: dict = {}
+
+    def __init__(self) -> None:
+        self.frames = 0
+
+    async def accept(self, subprotocol: str | None = None) -> None:
+        return None
+
+    async def send_text(self, text: str) -> None:
+        self.frames += 1
+
+    async def send_json(self, payload: dict) -> None:
+        self.frames += 1
+
+
+async def _legacy_broadcast(hub: MessageHub, target_user_ids: list[str], payload: dict) -> None:
+    # The pre-group implementation: re-hash the full member list and encode per socket.
+    unique_ids = set(target_user_ids)
+    async with hub.lock:
+        targets = []
+        for user_id in unique_ids:
+            sockets = hub.connections.get(user_id)
+            if sockets:
+                targets.extend(sockets)
+    for websocket in targets:
+        await websocket.send_json(payload)
+
+
+async def run(members: int, online: int, other: int, rounds: int) -> None:
+    hub = MessageHub()
+    member_ids = sorted(str(uuid.uuid4()) for _ in range(members))
+    for user_id in member_ids[:online]:
+        await hub.connect(_NullSocket(), user_id)
+    for _ in range(other):
+        await hub.connect(_NullSocket(), str(uuid.uuid4()))
+
+    payload = {
+        "id": str(uuid.uuid4()),
+        "chat_id": str(uuid.uuid4()),
+        "sender_id": member_ids[0],
+        "sender_name": "群主",
+        "content": "今晚八点开会，请大家准时参加。",
+        "created_at": "2024-11-10T12:00:00+00:00",
+    }
+
+    for label, send in (
+        ("legacy broadcast", lambda: _legacy_broadcast(hub, member_ids, payload)),
+        ("broadcast_sorted", lambda: hub.broadcast_sorted(member_ids, payload)),
+    ):
+        samples = []
+        for _ in range(rounds):
+            started = time.perf_counter()
+            await send()
+            samples.append((time.perf_counter() - started) * 1000)
+        samples.sort()
+        print(
+            f"{label:>18}: p50={statistics.median(samples):.3f}ms "
+            f"p99={samples[int(len(samples) * 0.99) - 1]:.3f}ms "
+            f"(members={members}, online={online}, other sockets={other})"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--members", type=int, default=10_000)
+    parser.add_argument("--online", type=int, default=500)
+    parser.add_argument("--other", type=int, default=2_000)
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(run(args.members, args.online, args.other, args.rounds))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+"""End-to-end load test of the real app against an in-process fake Supabase.
+
+Starts uvicorn on a loopback port with `SocialService` backed by
+`bench.fake_supabase.FakeSupabase` (`--latency-ms` per PostgREST call). It then
+connects `--users` websocket clients split evenly across `--chats` group
+chats, and has `--senders` of them each post `--messages` messages through
+`POST /social/chats/{chat_id}/messages`, closed loop or at `--rate` per sender.
+
+Reports:
+
+- send→receive latency (p50/p99 over every delivered frame) and the HTTP ack latency;
+- delivered frames per second;
+- RSS growth per websocket connection. Clients and server share the process,
+  so this is an upper bound.
+
+Results can be written with `--output` and diffed against an earlier run with `--compare`:
+
+    python -m bench.load --users 500 --senders 50 --output bench/results/load.json
+    python -m bench.load --users 500 --senders 50 --compare bench/results/load.json
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import gc
+import json
+import platform
+import socket
+import statistics
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import httpx
+import uvicorn
+import websockets
+
+from app.config import settings
+from app.main import app
+from app.routes.social import get_social_service
+from app.services.social_service import SocialService
+from bench.fake_supabase import FakeSupabase
+
+# Lower is better for these; everything else numeric is higher-is-better.
+_LOWER_IS_BETTER = ("latency", "rss", "errors", "missing")
+
+
+def _rss_bytes() -> int:
+    try:
+        with open("/proc/self/status", encoding="ascii") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    import resource
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def _start_server(db: FakeSupabase) -> tuple[uvicorn.Server, threading.Thread, int]:
+    service = SocialService(db)
+
+    def _provider() -> SocialService:
+        return service
+
+    app.dependency_overrides[get_social_service] = _provider
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, log_level="warning", lifespan="on"))
+    thread = threading.Thread(target=server.run, kwargs={"sockets": [sock]}, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    return server, thread, port
+
+
+async def _receiver(websocket, latencies: list[float], received: list[int], done: asyncio.Event, expected: int) -> None:
+    async for frame in websocket:
+        content = json.loads(frame).get("content", "")
+        if not content.startswith("bench|"):
+            continue
+        latencies.append(time.perf_counter() - float(content.rsplit("|", 1)[1]))
+        received[0] += 1
+        if received[0] >= expected:
+            done.set()
+
+
+async def _sender(
+    client: httpx.AsyncClient,
+    chat_id: str,
+    sender_id: str,
+    count: int,
+    interval: float,
+    acks: list[float],
+    errors: list[int],
+) -> None:
+    for seq in range(count):
+        started = time.perf_counter()
+        response = await client.post(
+            f"/social/chats/{chat_id}/messages",
+            json={"sender_id": sender_id, "content": f"bench|{sender_id}|{seq}|{started!r}"},
+        )
+        acks.append(time.perf_counter() - started)
+        if response.status_code != 200:
+            errors[0] += 1
+        if interval:
+            await asyncio.sleep(max(0.0, interval - (time.perf_counter() - started)))
+
+
+async def _drive(args: argparse.Namespace, port: int, groups: list[tuple[str, list[str]]]) -> dict:
+    base = f"127.0.0.1:{port}"
+    gc.collect()
+    rss_before = _rss_bytes()
+    sockets = []
+    for chat_id, members in groups:
+        for user_id in members:
+            sockets.append(await websockets.connect(f"ws://{base}/ws/messages?user_id={user_id}", max_queue=None))
+    await asyncio.sleep(0.2)
+    gc.collect()
+    rss_per_connection = (_rss_bytes() - rss_before) / max(len(sockets), 1)
+
+    senders = []
+    for index in range(args.senders):
+        chat_id, members = groups[index % len(groups)]
+        senders.append((chat_id, members[(index // len(groups)) % len(members)]))
+    group_size = {chat_id: len(members) for chat_id, members in groups}
+    expected = sum(group_size[chat_id] for chat_id, _ in senders) * args.messages
+
+    latencies: list[float] = []
+    received = [0]
+    acks: list[float] = []
+    errors = [0]
+    done = asyncio.Event()
+    receivers = [
+        asyncio.create_task(_receiver(websocket, latencies, received, done, expected)) for websocket in sockets
+    ]
+    interval = 1 / args.rate if args.rate else 0.0
+    limits = httpx.Limits(max_connections=args.senders, max_keepalive_connections=args.senders)
+    started = time.perf_counter()
+    async with httpx.AsyncClient(base_url=f"http://{base}", limits=limits, timeout=30) as client:
+        await asyncio.gather(
+            *(
+                _sender(client, chat_id, sender_id, args.messages, interval, acks, errors)
+                for chat_id, sender_id in senders
+            )
+        )
+    sent_elapsed = time.perf_counter() - started
+    try:
+        await asyncio.wait_for(done.wait(), args.drain_timeout)
+    except asyncio.TimeoutError:
+        pass
+    elapsed = time.perf_counter() - started
+
+    for task in receivers:
+        task.cancel()
+    await asyncio.gather(*(websocket.close() for websocket in sockets), return_exceptions=True)
+    return {
+        "sent": len(acks),
+        "send_errors": errors[0],
+        "sends_per_second": len(acks) / sent_elapsed,
+        "ack_latency_p50_ms": _percentile(acks, 0.50) * 1000,
+        "ack_latency_p99_ms": _percentile(acks, 0.99) * 1000,
+        "expected_deliveries": expected,
+        "delivered": received[0],
+        "missing_deliveries": expected - received[0],
+        "deliveries_per_second": received[0] / elapsed,
+        "delivery_latency_p50_ms": _percentile(latencies, 0.50) * 1000,
+        "delivery_latency_p99_ms": _percentile(latencies, 0.99) * 1000,
+        "delivery_latency_mean_ms": (statistics.fmean(latencies) * 1000) if latencies else 0.0,
+        "rss_per_connection_bytes": rss_per_connection,
+    }
+
+
+def _compare(previous: dict, current: dict) -> None:
+    print(f"\ncompared with {previous.get('timestamp', '?')}:")
+    for key, value in current["results"].items():
+        before = previous.get("results", {}).get(key)
+        if not isinstance(value, (int, float)) or not isinstance(before, (int, float)):
+            continue
+        change = (value - before) / before * 100 if before else 0.0
+        worse = change > 0 if any(word in key for word in _LOWER_IS_BETTER) else change < 0
+        flag = "  <-- regression" if worse and abs(change) >= 10 else ""
+        print(f"  {key:28} {before:12.2f} -> {value:12.2f}  ({change:+.1f}%){flag}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=200, help="websocket clients")
+    parser.add_argument("--chats", type=int, default=10, help="group chats the users are split across")
+    parser.add_argument("--senders", type=int, default=20)
+    parser.add_argument("--messages", type=int, default=50, help="messages per sender")
+    parser.add_argument("--rate", type=float, default=0.0, help="messages/s per sender; 0 = closed loop")
+    parser.add_argument("--latency-ms", type=float, default=2.0, help="fake PostgREST round trip")
+    parser.add_argument("--jitter-ms", type=float, default=0.5)
+    parser.add_argument("--drain-timeout", type=float, default=30.0)
+    parser.add_argument("--rate-limit", action="store_true", help="keep per-user rate limits on")
+    parser.add_argument("--output", type=Path, help="write results as JSON")
+    parser.add_argument("--compare", type=Path, help="earlier --output file to diff against")
+    args = parser.parse_args()
+
+    # Benchmark senders post far faster than the per-user send bucket allows.
+    settings.rate_limit_enabled = args.rate_limit
+    settings.warm_up_on_start = False  # the fake replaces the real client
+    db = FakeSupabase(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms)
+    user_ids = db.add_profiles(args.users)
+    chats = max(1, min(args.chats, args.users))
+    groups = []
+    for index in range(chats):
+        members = user_ids[index::chats]
+        groups.append((db.add_chat(members[0], members, title=f"bench-{index}"), members))
+
+    server, thread, port = _start_server(db)
+    try:
+        results = asyncio.run(_drive(args, port, groups))
+    finally:
+        server.should_exit = True
+        thread.join(timeout=10)
+
+    report = {
+        "benchmark": "load",
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "config": {key: (str(value) if isinstance(value, Path) else value) for key, value in vars(args).items()},
+        "results": results,
+        "supabase_calls": {f"{table}.{action}": count for (table, action), count in sorted(db.calls.items())},
+    }
+    for key, value in results.items():
+        print(f"{key:28} {value:12.2f}" if isinstance(value, float) else f"{key:28} {value:12d}")
+    if args.compare and args.compare.exists():
+        _compare(json.loads(args.compare.read_text()), report)
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps(report, indent=2) + "\n")
+        print(f"\nwrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Local overload test for the admission limiter.
+
+Simulates a backend whose executor can do `--workers` blocking calls of
+`--service-ms` each, offers `--overload` times that capacity as open-loop
+traffic with a mix of priorities, and reports goodput (responses delivered
+within the client timeout) with and without admission control.
+
+    python -m bench.overload --overload 5
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import random
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from app.admission import AdaptiveLimiter, Overloaded, Priority
+
+_MIX = [(Priority.send, 0.3), (Priority.history, 0.4), (Priority.friends, 0.3)]
+
+
+def _blocking_call(service_seconds: float) -> None:
+    time.sleep(service_seconds)
+
+
+async def _request(
+    limiter: AdaptiveLimiter | None,
+    priority: Priority,
+    service_seconds: float,
+    client_timeout: float,
+    results: Counter,
+) -> None:
+    started = time.perf_counter()
+
+    async def _handle() -> None:
+        if limiter is None:
+            await asyncio.to_thread(_blocking_call, service_seconds)
+            return
+        await limiter.acquire(priority)
+        handled = time.perf_counter()
+        try:
+            await asyncio.to_thread(_blocking_call, service_seconds)
+        finally:
+            limiter.release(time.perf_counter() - handled)
+
+    try:
+        await asyncio.wait_for(_handle(), client_timeout)
+    except Overloaded:
+        results[(priority, "shed")] += 1
+        return
+    except asyncio.TimeoutError:
+        results[(priority, "timeout")] += 1
+        return
+    if time.perf_counter() - started <= client_timeout:
+        results[(priority, "ok")] += 1
+
+
+async def _run(limiter: AdaptiveLimiter | None, args: argparse.Namespace) -> Counter:
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=args.workers))
+    capacity = args.workers / (args.service_ms / 1000)
+    rate = capacity * args.overload
+    results: Counter = Counter()
+    tasks = []
+    deadline = time.perf_counter() + args.duration
+    rng = random.Random(7)
+    next_at = time.perf_counter()
+    while next_at < deadline:
+        priority = rng.choices([p for p, _ in _MIX], weights=[w for _, w in _MIX])[0]
+        tasks.append(
+            asyncio.create_task(
+                _request(limiter, priority, args.service_ms / 1000, args.client_timeout, results)
+            )
+        )
+        next_at += rng.expovariate(rate)
+        delay = next_at - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+    await asyncio.gather(*tasks)
+    return results
+
+
+def _report(label: str, results: Counter, args: argparse.Namespace) -> None:
+    capacity = args.workers / (args.service_ms / 1000)
+    ok = sum(count for (_, outcome), count in results.items() if outcome == "ok")
+    total = sum(results.values())
+    print(f"{label}: offered={total / args.duration:.0f}/s capacity={capacity:.0f}/s goodput={ok / args.duration:.0f}/s")
+    for priority in Priority:
+        row = {outcome: results[(priority, outcome)] for outcome in ("ok", "shed", "timeout")}
+        print(f"    {priority.name:>8}: {row}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--service-ms", type=float, default=20.0)
+    parser.add_argument("--overload", type=float, default=5.0)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--client-timeout", type=float, default=1.0)
+    parser.add_argument("--queue-budget-ms", type=float, default=500.0)
+    parser.add_argument("--latency-target-ms", type=float, default=100.0)
+    args = parser.parse_args()
+
+    _report("no admission control", asyncio.run(_run(None, args)), args)
+    limiter = AdaptiveLimiter(
+        initial_limit=args.workers * 2,
+        queue_budget_seconds=args.queue_budget_ms / 1000,
+        latency_target_seconds=args.latency_target_ms / 1000,
+    )
+    _report("adaptive limiter", asyncio.run(_run(limiter, args)), args)
+    print(f"    final limit={limiter.limit:.1f} shed={limiter.shed}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""Microbenchmark for the history / friend-request response paths.
+
+Serves synthetic PostgREST rows through the real routes with the fast path
+on and off and reports per-request latency and payload size:
+
+    python -m bench.serialization --sizes 1000 10000
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import statistics
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from fastapi.testclient import TestClient
+
+from app.config import settings
+from app.main import app
+from app.routes.social import get_social_service
+from app.services.social_service import SocialService
+
+_TEXTS = [
+    "好的，明天见！",
+    "今天的会议改到下午三点了，记得带上周的报告。",
+    "ok 👍",
+    "Did you see the new build? 新版本的启动速度快了很多。",
+    "哈哈哈哈哈",
+]
+
+
+def _message_rows(count: int) -> list[dict]:
+    rng = random.Random(count)
+    chat_id = str(uuid.uuid4())
+    senders = [(str(uuid.uuid4()), name) for name in ("张伟", "李娜", "Alex")]
+    started = datetime(2024, 11, 1, tzinfo=timezone.utc)
+    rows = []
+    for index in range(count):
+        sender_id, name = rng.choice(senders)
+        rows.append(
+            {
+                "id": str(uuid.uuid4()),
+                "chat_id": chat_id,
+                "sender_id": sender_id,
+                "content": rng.choice(_TEXTS),
+                "created_at": (started + timedelta(seconds=index * 7)).isoformat(),
+                "sender": {"display_name": name},
+            }
+        )
+    return rows
+
+
+def _request_rows(count: int) -> list[dict]:
+    addressee = {"id": str(uuid.uuid4()), "display_name": "李娜", "phone": "+8613800000000",
+                 "avatar_url": None, "status_message": "在忙"}
+    rows = []
+    for index in range(count):
+        requester = {"id": str(uuid.uuid4()), "display_name": f"用户{index}", "phone": f"+86139{index:08d}",
+                     "avatar_url": None, "status_message": None}
+        rows.append(
+            {
+                "id": str(uuid.uuid4()),
+                "requester_id": requester["id"],
+                "addressee_id": addressee["id"],
+                "status": "pending",
+                "created_at": "2024-11-09T10:00:00.123456+00:00",
+                "requester": requester,
+                "addressee": addressee,
+            }
+        )
+    return rows
+
+
+class _StaticService(SocialService):
+    def __init__(self, message_rows: list[dict], request_rows: list[dict]) -> None:
+        super().__init__(client=None)
+        self.message_rows = message_rows
+        self.request_rows = request_rows
+
+    def _fetch_message_rows(self, client, chat_id):
+        return self.message_rows
+
+    async def is_member(self, chat_id, user_id):
+        return True
+
+    async def list_friend_request_rows(self, user_id, role, before=None, limit=None):
+        return self.request_rows if limit is None else self.request_rows[:limit]
+
+
+def _provider(service: SocialService):
+    # A closure rather than a default argument: FastAPI would treat the default as a query param.
+    return lambda: service
+
+
+def _measure(client: TestClient, url: str, rounds: int) -> tuple[float, float, int]:
+    samples = []
+    size = 0
+    for _ in range(rounds):
+        started = time.perf_counter()
+        response = client.get(url)
+        samples.append((time.perf_counter() - started) * 1000)
+        response.raise_for_status()
+        size = len(response.content)
+    samples.sort()
+    return statistics.median(samples), samples[-1], size
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    settings.rate_limit_enabled = False
+    settings.admission_enabled = False
+    client = TestClient(app)
+    user_id = uuid.uuid4()
+    routes = {
+        "list_messages": f"/social/chats/{uuid.uuid4()}/messages?user_id={user_id}",
+        "list_friend_requests": f"/social/friends/requests?user_id={user_id}&role=incoming",
+    }
+    original = set(settings.fast_json_routes)
+    try:
+        for size in args.sizes:
+            service = _StaticService(_message_rows(size), _request_rows(size))
+            app.dependency_overrides[get_social_service] = _provider(service)
+            for route, url in routes.items():
+                for label, enabled in (("models", set()), ("fast", {route})):
+                    settings.fast_json_routes = enabled
+                    p50, worst, nbytes = _measure(client, url, args.rounds)
+                    print(f"{route:>20} n={size:<6} {label:>6}: p50={p50:8.2f}ms max={worst:8.2f}ms body={nbytes / 1024:.0f}KiB")
+    finally:
+        settings.fast_json_routes = original
+        app.dependency_overrides.clear()
+
+
+if __name__ == "__main__":
+    main()
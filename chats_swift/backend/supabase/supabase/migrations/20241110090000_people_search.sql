@@ -0,0 +1,35 @@
+-- Database-side people search (alternative to the backend's in-process index)
+
+create extension if not exists "pg_trgm";
+
+create index if not exists profiles_display_name_trgm_idx
+    on public.profiles using gin (lower(display_name) gin_trgm_ops);
+
+create index if not exists profiles_phone_trgm_idx
+    on public.profiles using gin (phone gin_trgm_ops);
+
+-- Incremental index refresh pages through profiles by (updated_at, id)
+create index if not exists profiles_updated_at_idx
+    on public.profiles(updated_at, id);
+
+create or replace function public.search_profiles(q text, max_results int default 20)
+returns setof public.profiles as $$
+    with needle as (
+        select
+            lower(q) as term,
+            replace(replace(replace(lower(q), '\', '\\'), '%', '\%'), '_', '\_') as pattern
+    )
+    select p.*
+    from public.profiles p, needle n
+    where lower(p.display_name) like '%' || n.pattern || '%'
+        or p.phone like '%' || n.pattern || '%'
+        or lower(p.display_name) % n.term
+    order by
+        (lower(p.display_name) = n.term) desc,
+        (lower(p.display_name) like n.pattern || '%') desc,
+        similarity(lower(p.display_name), n.term) desc,
+        p.display_name
+    limit greatest(1, least(max_results, 100));
+$$ language sql stable;
+
+alter function public.search_profiles(text, int) set search_path = public, extensions;
@@ -0,0 +1,13 @@
+-- Large group chats: membership lookups by user, and owner-or-self member removal
+
+create index if not exists chat_members_user_idx on public.chat_members(user_id, chat_id);
+
+-- Owners may remove members; members may leave on their own
+drop policy if exists "delete chat membership" on public.chat_members;
+create policy "delete chat membership" on public.chat_members
+    for delete
+    using (
+        auth.uid() = user_id
+        or auth.uid() = public.chat_owner(chat_members.chat_id)
+        or auth.role() = 'service_role'
+    );
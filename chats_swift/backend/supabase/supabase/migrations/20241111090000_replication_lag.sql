@@ -0,0 +1,15 @@
+-- Lag probe for read-replica routing in the chats backend (CHAT_SUPABASE_READ_URLS).
+-- On a replica: seconds since the last replayed transaction, or 0 once every
+-- received WAL record has been replayed (an idle primary would otherwise look
+-- like growing lag). On the primary: always 0.
+create or replace function public.replication_lag_seconds()
+returns double precision as $$
+    select case
+        when not pg_is_in_recovery() then 0
+        when pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() then 0
+        else coalesce(extract(epoch from now() - pg_last_xact_replay_timestamp()), 0)
+    end::double precision;
+$$ language sql stable;
+
+revoke all on function public.replication_lag_seconds() from public;
+grant execute on function public.replication_lag_seconds() to service_role;
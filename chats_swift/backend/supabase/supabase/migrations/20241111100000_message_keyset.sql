@@ -0,0 +1,4 @@
+-- Keyset reads of a chat's history (exports, paged history) walk (created_at, id)
+-- within one chat; this index serves both the filter and the order.
+create index if not exists messages_chat_created_id_idx
+    on public.messages(chat_id, created_at, id);
@@ -0,0 +1,5 @@
+-- Attachment metadata travels with the message row (id, name, mime_type, size,
+-- width, height, thumbnail); the bytes live in the chats backend's attachment
+-- store and are fetched lazily by id.
+alter table public.messages
+    add column if not exists attachments jsonb not null default '[]'::jsonb;
@@ -0,0 +1,10 @@
+-- Pending friend requests per user, newest first: serves the paged lists
+-- (created_at desc, id desc keyset) and the badge counts without touching
+-- answered requests.
+create index if not exists friend_requests_incoming_pending_idx
+    on public.friend_requests(addressee_id, created_at desc, id desc)
+    where status = 'pending';
+
+create index if not exists friend_requests_outgoing_pending_idx
+    on public.friend_requests(requester_id, created_at desc, id desc)
+    where status = 'pending';
@@ -0,0 +1,31 @@
+-- People search: phones match only on the full number, so partial digits cannot enumerate the directory.
+-- Both sides are compared as bare digits, like the backend's in-process index (`phone_digits`).
+
+drop index if exists public.profiles_phone_trgm_idx;
+
+create index if not exists profiles_phone_digits_idx
+    on public.profiles((regexp_replace(phone, '\D', '', 'g')));
+
+create or replace function public.search_profiles(q text, max_results int default 20)
+returns setof public.profiles as $$
+    with needle as (
+        select
+            lower(q) as term,
+            replace(replace(replace(lower(q), '\', '\\'), '%', '\%'), '_', '\_') as pattern,
+            nullif(regexp_replace(q, '\D', '', 'g'), '') as digits
+    )
+    select p.*
+    from public.profiles p, needle n
+    where (char_length(n.term) >= 2 and lower(p.display_name) like '%' || n.pattern || '%')
+        or (char_length(n.term) >= 2 and lower(p.display_name) % n.term)
+        or regexp_replace(p.phone, '\D', '', 'g') = n.digits
+    order by
+        (regexp_replace(p.phone, '\D', '', 'g') = n.digits) is true desc,
+        (lower(p.display_name) = n.term) desc,
+        (lower(p.display_name) like n.pattern || '%') desc,
+        similarity(lower(p.display_name), n.term) desc,
+        p.display_name
+    limit greatest(1, least(max_results, 100));
+$$ language sql stable;
+
+alter function public.search_profiles(text, int) set search_path = public, extensions;
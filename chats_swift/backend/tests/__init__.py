@@ -0,0 +1,6 @@
+import os
+
+# Settings require a Supabase project; tests only ever talk to bench.fake_supabase.
+os.environ.setdefault("CHAT_SUPABASE_URL", "http://supabase.invalid")
+os.environ.setdefault("CHAT_SUPABASE_SERVICE_KEY", "test")
+os.environ.setdefault("CHAT_WARM_UP_ON_START", "false")
@@ -0,0 +1,108 @@
+"""Chat routes only serve the chat's members, and only to the verified caller."""
+from __future__ import annotations
+
+import tempfile
+import time
+import unittest
+
+import jwt
+from fastapi.testclient import TestClient
+
+from app.attachments import LocalAttachmentStore
+from app.auth import get_token_verifier
+from app.config import settings
+from app.main import app
+from app.routes.social import get_social_service, require_attachment_store
+from app.services.social_service import SocialService
+from bench.fake_supabase import FakeSupabase
+
+_SECRET = "test-secret-at-least-thirty-two-bytes"
+_OVERRIDDEN = ("auth_mode", "supabase_jwt_secret", "rate_limit_enabled", "admission_enabled")
+
+
+def bearer(user_id: str) -> dict[str, str]:
+    claims = {"sub": user_id, "aud": "authenticated", "exp": int(time.time()) + 3600}
+    return {"Authorization": f"Bearer {jwt.encode(claims, _SECRET, algorithm='HS256')}"}
+
+
+class ChatAccessTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.saved = {name: getattr(settings, name) for name in _OVERRIDDEN}
+        settings.auth_mode = "required"
+        settings.supabase_jwt_secret = _SECRET
+        settings.rate_limit_enabled = False
+        settings.admission_enabled = False
+        get_token_verifier.cache_clear()
+
+        self.db = FakeSupabase()
+        self.member, self.other, self.outsider = self.db.add_profiles(3)
+        self.chat_id = self.db.add_chat(self.member, [self.member, self.other])
+        service = SocialService(self.db)
+        attachment_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(attachment_dir.cleanup)
+        store = LocalAttachmentStore(attachment_dir.name)
+        app.dependency_overrides[get_social_service] = lambda: service
+        app.dependency_overrides[require_attachment_store] = lambda: store
+        self.client = TestClient(app)
+
+    def tearDown(self) -> None:
+        app.dependency_overrides.clear()
+        for name, value in self.saved.items():
+            setattr(settings, name, value)
+        get_token_verifier.cache_clear()
+
+    def list_messages(self, user_id: str, headers: dict[str, str] | None = None):
+        return self.client.get(
+            f"/social/chats/{self.chat_id}/messages", params={"user_id": user_id}, headers=headers or {}
+        )
+
+    def send(self, sender_id: str):
+        return self.client.post(
+            f"/social/chats/{self.chat_id}/messages",
+            json={"sender_id": sender_id, "content": "hi"},
+            headers=bearer(sender_id),
+        )
+
+    def test_member_reads_history(self) -> None:
+        self.assertEqual(self.send(self.member).status_code, 200)
+        response = self.list_messages(self.member, bearer(self.member))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([m["content"] for m in response.json()["messages"]], ["hi"])
+
+    def test_non_member_gets_403(self) -> None:
+        self.assertEqual(self.list_messages(self.outsider, bearer(self.outsider)).status_code, 403)
+
+    def test_missing_token_gets_401(self) -> None:
+        self.assertEqual(self.list_messages(self.member).status_code, 401)
+
+    def test_non_member_gets_no_304(self) -> None:
+        etag = self.list_messages(self.member, bearer(self.member)).headers["etag"]
+        headers = {**bearer(self.outsider), "If-None-Match": etag}
+        self.assertEqual(self.list_messages(self.outsider, headers).status_code, 403)
+
+    def test_non_member_cannot_send(self) -> None:
+        self.assertEqual(self.send(self.outsider).status_code, 403)
+        self.assertEqual(self.db.tables["messages"], [])
+
+    def upload(self, uploader_id: str, body: bytes, content_type: str):
+        return self.client.post(
+            f"/social/chats/{self.chat_id}/attachments",
+            params={"uploader_id": uploader_id, "filename": "page.html"},
+            content=body,
+            headers={**bearer(uploader_id), "Content-Type": content_type},
+        )
+
+    def test_non_member_cannot_upload(self) -> None:
+        self.assertEqual(self.upload(self.outsider, b"x", "text/plain").status_code, 403)
+
+    def test_uploaded_html_is_not_served_inline(self) -> None:
+        uploaded = self.upload(self.member, b"<script>alert(1)</script>", "text/html")
+        self.assertEqual(uploaded.status_code, 200)
+        response = self.client.get(
+            f"/social/chats/{self.chat_id}/attachments/{uploaded.json()['id']}",
+            params={"user_id": self.other},
+            headers=bearer(self.other),
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["x-content-type-options"], "nosniff")
+        self.assertTrue(response.headers["content-disposition"].startswith("attachment;"))
@@ -0,0 +1,55 @@
+"""Both people search backends must answer a query the same way.
+
+The database backend runs against `bench.fake_supabase`, whose
+`search_profiles` mirrors the latest migration.
+"""
+from __future__ import annotations
+
+import unittest
+
+from app.config import settings
+from app.people_index import people_index
+from app.services.social_service import SocialService
+from bench.fake_supabase import FakeSupabase
+
+
+class PeopleSearchBackendsTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        self.db = FakeSupabase()
+        self.ids = self.db.add_profiles(20)
+        self.service = SocialService(self.db)
+        self.backend = settings.people_search_backend
+        people_index.clear()
+        people_index.refreshed_at = 0.0
+
+    def tearDown(self) -> None:
+        settings.people_search_backend = self.backend
+        people_index.clear()
+        people_index.refreshed_at = 0.0
+
+    async def search(self, backend: str, query: str) -> list[str]:
+        settings.people_search_backend = backend
+        result = await self.service.search_people(query, 10)
+        return [str(person.id) for person in result.people]
+
+    async def assert_same(self, query: str) -> list[str]:
+        memory = await self.search("memory", query)
+        database = await self.search("database", query)
+        self.assertEqual(memory, database, query)
+        return memory
+
+    async def test_formatted_phone_matches_in_both(self) -> None:
+        # add_profiles stores "+1555" followed by the zero-padded index.
+        for query in ("+15550000003", "15550000003", "+1 555-000 0003", "(155) 5000-0003"):
+            self.assertEqual(await self.assert_same(query), [self.ids[3]])
+
+    async def test_partial_phone_matches_in_neither(self) -> None:
+        for query in ("5550000", "+1555", "555-0000"):
+            self.assertEqual(await self.assert_same(query), [])
+
+    async def test_phones_are_masked_in_both(self) -> None:
+        for backend in ("memory", "database"):
+            settings.people_search_backend = backend
+            result = await self.service.search_people("+15550000003", 10)
+            self.assertEqual(result.people[0].phone, "155******03")
+
@@ -48,7 +48,9 @@ final class ChatService {
     }
 
     func messages(for chatID: UUID, currentUserID: UUID) async throws -> [Message] {
-        let url = baseURL.appendingPathComponent("/social/chats/\(chatID.uuidString)/messages")
+        var components = URLComponents(url: baseURL.appendingPathComponent("/social/chats/\(chatID.uuidString)/messages"), resolvingAgainstBaseURL: false)
+        components?.queryItems = [URLQueryItem(name: "user_id", value: currentUserID.uuidString)]
+        guard let url = components?.url else { throw ChatServiceError.invalidURL }
         var request = URLRequest(url: url)
         request.httpMethod = "GET"
         let data = try await perform(request)
@@ -1,10 +1,19 @@
-from typing import Optional, Dict, Any
+import asyncio
+import hashlib
+import logging
+import time
+from typing import Optional, Dict, Any, Tuple
 
-from fastapi import Depends, Header, HTTPException, status
+import httpx
+from fastapi import Header, HTTPException, Request, status
 from jose import JWTError, jwt
 from pydantic import BaseModel
 
-from .config import Settings, get_settings
+from .config import Settings
+
+logger = logging.getLogger(__name__)
+
+ASYMMETRIC_ALGORITHMS = frozenset({"RS256", "RS384", "RS512", "ES256", "ES384", "ES512"})
 
 
 class AuthContext(BaseModel):
@@ -13,19 +22,175 @@ class AuthContext(BaseModel):
     claims: Optional[Dict[str, Any]] = None
 
 
+class JwksKeySet:
+    """Signing keys from a JWKS endpoint, kept in memory and refreshed in the background.
+
+    An unknown `kid` (a key rotated in since the last refresh) triggers one
+    refresh, shared by concurrent callers and at most once every
+    `min_refresh_interval_seconds`, so forged kids cannot turn into a fetch per request.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        http_client: httpx.AsyncClient,
+        refresh_seconds: float = 600.0,
+        min_refresh_interval_seconds: float = 30.0,
+    ) -> None:
+        self.url = url
+        self._http = http_client
+        self.refresh_seconds = refresh_seconds
+        self.min_refresh_interval_seconds = min_refresh_interval_seconds
+        self._keys: Dict[str, dict] = {}
+        self._last_attempt = float("-inf")
+        self._inflight: Optional[asyncio.Task] = None
+
+    async def refresh(self) -> None:
+        self._last_attempt = time.monotonic()
+        resp = await self._http.get(self.url)
+        resp.raise_for_status()
+        keys = resp.json().get("keys", [])
+        self._keys = {key["kid"]: key for key in keys if key.get("kid")}
+
+    async def get(self, kid: Optional[str]) -> Optional[dict]:
+        key = self._keys.get(kid)
+        if key is not None or not kid:
+            return key
+        if self._inflight is None:
+            if time.monotonic() - self._last_attempt < self.min_refresh_interval_seconds:
+                return None
+            self._inflight = asyncio.create_task(self.refresh())
+            self._inflight.add_done_callback(self._refresh_done)
+        try:
+            await asyncio.shield(self._inflight)
+        except Exception:
+            return None
+        return self._keys.get(kid)
+
+    def _refresh_done(self, task: asyncio.Task) -> None:
+        self._inflight = None
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning("JWKS refresh from %s failed: %s", self.url, task.exception())
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(self.refresh_seconds)
+            try:
+                await self.refresh()
+            except Exception as exc:
+                # Keep serving the last good key set; the next tick tries again.
+                logger.warning("JWKS refresh from %s failed: %s", self.url, exc)
+
+
+class TokenVerifier:
+    """Verifies Supabase JWTs and remembers the claims of valid ones by token digest until `exp`.
+
+    HS256 tokens are checked against the shared secret; RS*/ES* tokens against
+    the JWKS key named by their `kid`. Either or both may be configured, which
+    lets a project move to asymmetric keys while old tokens are still live.
+    """
+
+    def __init__(
+        self,
+        secret: Optional[str] = None,
+        jwks: Optional[JwksKeySet] = None,
+        audience: Optional[str] = None,
+        max_entries: int = 50_000,
+    ) -> None:
+        self.secret = secret
+        self.jwks = jwks
+        self.audience = audience
+        self.max_entries = max_entries
+        self._claims: Dict[bytes, Tuple[Dict[str, Any], float]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.rejected = 0
+
+    @property
+    def enforced(self) -> bool:
+        return bool(self.secret or self.jwks)
+
+    async def verify(self, token: str) -> Dict[str, Any]:
+        digest = hashlib.sha256(token.encode()).digest()
+        cached = self._claims.get(digest)
+        if cached is not None:
+            if time.time() < cached[1]:
+                self.hits += 1
+                return cached[0]
+            del self._claims[digest]
+        self.misses += 1
+        try:
+            claims = await self._decode(token)
+        except JWTError:
+            self.rejected += 1
+            raise
+        exp = claims.get("exp")
+        if isinstance(exp, (int, float)):
+            if len(self._claims) >= self.max_entries:
+                # dicts keep insertion order, so the first key is the oldest verification.
+                self._claims.pop(next(iter(self._claims)))
+            self._claims[digest] = (claims, float(exp))
+        return claims
+
+    async def _decode(self, token: str) -> Dict[str, Any]:
+        header = jwt.get_unverified_header(token)
+        algorithm = header.get("alg")
+        if algorithm == "HS256" and self.secret:
+            key: Any = self.secret
+        elif algorithm in ASYMMETRIC_ALGORITHMS and self.jwks is not None:
+            key = await self.jwks.get(header.get("kid"))
+            if key is None:
+                raise JWTError(f"unknown signing key {header.get('kid')!r}")
+        else:
+            raise JWTError(f"unsupported signing algorithm {algorithm!r}")
+        return jwt.decode(
+            token,
+            key,
+            algorithms=[algorithm],
+            audience=self.audience,
+            options={"verify_aud": self.audience is not None},
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._claims),
+            "hits": self.hits,
+            "misses": self.misses,
+            "rejected": self.rejected,
+        }
+
+
+def create_verifier(settings: Settings, http_client: httpx.AsyncClient) -> TokenVerifier:
+    jwks = None
+    if settings.supabase_jwks_url:
+        jwks = JwksKeySet(
+            settings.supabase_jwks_url,
+            http_client,
+            refresh_seconds=settings.jwks_refresh_seconds,
+            min_refresh_interval_seconds=settings.jwks_min_refresh_interval_seconds,
+        )
+    return TokenVerifier(
+        secret=settings.supabase_jwt_secret,
+        jwks=jwks,
+        audience=settings.supabase_jwt_audience or None,
+        max_entries=settings.auth_cache_max_entries,
+    )
+
+
 async def get_auth_context(
+    request: Request,
     authorization: Optional[str] = Header(default=None),
     x_debug_user: Optional[str] = Header(default=None, alias="X-Debug-User"),
-    settings: Settings = Depends(get_settings),
 ) -> AuthContext:
     """
     Resolve caller identity.
 
-    - If SUPABASE_JWT_SECRET is set, require `Authorization: Bearer <jwt>` and validate.
+    - If SUPABASE_JWT_SECRET or SUPABASE_JWKS_URL is set, require `Authorization: Bearer <jwt>` and validate.
     - Otherwise allow caller to pass `X-Debug-User`, falling back to None.
     """
 
-    if settings.supabase_jwt_secret:
+    verifier: TokenVerifier = request.app.state.verifier
+    if verifier.enforced:
         if not authorization:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -38,7 +203,7 @@ async def get_auth_context(
                 detail="Authorization header must be Bearer token",
             )
         try:
-            claims = jwt.decode(token, settings.supabase_jwt_secret, algorithms=["HS256"])
+            claims = await verifier.verify(token)
         except JWTError as exc:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -0,0 +1,183 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import AsyncIterator, Awaitable, Callable, List, Optional, Tuple
+
+import httpx
+from fastapi import HTTPException
+
+from .models import MessageBatchSendBody, MessageSendResult
+from .openim import OpenIMClient
+
+TEXT_CONTENT_TYPE = 101
+SINGLE_CHAT_SESSION = 1
+
+Job = Callable[[], Awaitable[List[MessageSendResult]]]
+
+
+def text_message(sender: str, recv_id: str, text: str, client_msg_id: Optional[str] = None) -> dict:
+    return {
+        "recvID": recv_id,
+        "sendID": sender,
+        "senderPlatformID": 1,
+        "contentType": TEXT_CONTENT_TYPE,
+        "sessionType": SINGLE_CHAT_SESSION,
+        "content": {"content": text},
+        "clientMsgID": client_msg_id or "",
+    }
+
+
+def _error_detail(exc: Exception) -> str:
+    return str(exc.detail) if isinstance(exc, HTTPException) else f"{type(exc).__name__}: {exc}"
+
+
+class RecipientQuota:
+    """Per-sender token bucket charged one token per recipient.
+
+    A sender may reach `burst` recipients at once and `per_second` after
+    that. Buckets idle long enough to have refilled are indistinguishable from
+    new ones, so the least recently used are dropped past `max_senders`.
+    """
+
+    def __init__(self, burst: int = 5000, per_second: float = 10.0, max_senders: int = 50_000) -> None:
+        self.burst = max(burst, 1)
+        self.per_second = max(per_second, 1e-6)
+        self.max_senders = max_senders
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    def take(self, sender: str, recipients: int) -> float:
+        """Charge `recipients` tokens; return 0 when allowed, else seconds until they would be."""
+        now = time.monotonic()
+        tokens, stamp = self._buckets.pop(sender, (float(self.burst), now))
+        tokens = min(float(self.burst), tokens + (now - stamp) * self.per_second)
+        wait = 0.0
+        if tokens >= recipients:
+            tokens -= recipients
+        else:
+            wait = (recipients - tokens) / self.per_second
+        self._buckets[sender] = (tokens, now)
+        while len(self._buckets) > self.max_senders:
+            self._buckets.popitem(last=False)
+        return wait
+
+
+class BatchSender:
+    """Sends one message to many users, or many messages, with at most `concurrency` calls to OpenIM in flight.
+
+    A shared text goes through `/msg/batch_send_msg` in chunks of `chunk_size`
+    recipients. The first chunk doubles as a probe: an OpenIM without that
+    route answers 404, and from then on every recipient is sent individually
+    through `/msg/send_msg`, as per-recipient messages always are.
+    """
+
+    def __init__(self, openim: OpenIMClient, concurrency: int = 8, chunk_size: int = 100) -> None:
+        self._openim = openim
+        self.concurrency = max(concurrency, 1)
+        self.chunk_size = max(chunk_size, 1)
+        self.batch_api_available: Optional[bool] = None
+
+    async def send(self, sender: str, body: MessageBatchSendBody) -> AsyncIterator[MessageSendResult]:
+        if body.messages:
+            jobs = [self._single_job(sender, m.toUserID, m.text, m.clientMsgID) for m in body.messages]
+        else:
+            recipients = list(dict.fromkeys(body.toUserIDs))
+            chunks = [recipients[i : i + self.chunk_size] for i in range(0, len(recipients), self.chunk_size)]
+            if self.batch_api_available is None:
+                first = await self._send_chunk(sender, chunks[0], body.text)
+                if first is not None:
+                    for result in first:
+                        yield result
+                    chunks = chunks[1:]
+            if self.batch_api_available:
+                jobs = [self._chunk_job(sender, chunk, body.text) for chunk in chunks]
+            else:
+                jobs = [self._single_job(sender, user_id, body.text) for chunk in chunks for user_id in chunk]
+        async for result in self._run(jobs):
+            yield result
+
+    async def _run(self, jobs: List[Job]) -> AsyncIterator[MessageSendResult]:
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def guarded(job: Job) -> List[MessageSendResult]:
+            async with semaphore:
+                return await job()
+
+        tasks = [asyncio.ensure_future(guarded(job)) for job in jobs]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                for result in await finished:
+                    yield result
+        finally:
+            # The caller stopped reading (client went away): do not keep sending on its behalf.
+            for task in tasks:
+                task.cancel()
+
+    def _single_job(self, sender: str, recv_id: str, text: str, client_msg_id: Optional[str] = None) -> Job:
+        async def job() -> List[MessageSendResult]:
+            try:
+                data = await self._openim.post_as_admin(
+                    "/msg/send_msg", text_message(sender, recv_id, text, client_msg_id)
+                )
+            except (HTTPException, httpx.HTTPError) as exc:
+                return [MessageSendResult(toUserID=recv_id, ok=False, clientMsgID=client_msg_id, detail=_error_detail(exc))]
+            return [
+                MessageSendResult(
+                    toUserID=recv_id,
+                    ok=True,
+                    clientMsgID=data.get("clientMsgID") or client_msg_id,
+                    serverMsgID=data.get("serverMsgID"),
+                )
+            ]
+
+        return job
+
+    def _chunk_job(self, sender: str, recv_ids: List[str], text: str) -> Job:
+        async def job() -> List[MessageSendResult]:
+            results = await self._send_chunk(sender, recv_ids, text)
+            if results is None:
+                # The route vanished mid-batch (OpenIM downgraded under us): finish this chunk one by one.
+                results = []
+                for recv_id in recv_ids:
+                    results.extend(await self._single_job(sender, recv_id, text)())
+            return results
+
+        return job
+
+    async def _send_chunk(self, sender: str, recv_ids: List[str], text: str) -> Optional[List[MessageSendResult]]:
+        payload = {
+            "sendID": sender,
+            "senderPlatformID": 1,
+            "contentType": TEXT_CONTENT_TYPE,
+            "sessionType": SINGLE_CHAT_SESSION,
+            "content": {"content": text},
+            "isSendAll": False,
+            "recvIDs": recv_ids,
+        }
+        try:
+            data = await self._openim.post_as_admin("/msg/batch_send_msg", payload)
+        except httpx.HTTPStatusError as exc:
+            if exc.response.status_code == 404:
+                self.batch_api_available = False
+                return None
+            return [MessageSendResult(toUserID=r, ok=False, detail=_error_detail(exc)) for r in recv_ids]
+        except (HTTPException, httpx.HTTPError) as exc:
+            return [MessageSendResult(toUserID=r, ok=False, detail=_error_detail(exc)) for r in recv_ids]
+        self.batch_api_available = True
+
+        sent = {item.get("recvID"): item for item in data.get("results") or [] if isinstance(item, dict)}
+        failed = set(data.get("failedUserIDs") or [])
+        results = []
+        for recv_id in recv_ids:
+            if recv_id in failed:
+                results.append(MessageSendResult(toUserID=recv_id, ok=False, detail="rejected by OpenIM"))
+                continue
+            item = sent.get(recv_id, {})
+            results.append(
+                MessageSendResult(
+                    toUserID=recv_id,
+                    ok=True,
+                    clientMsgID=item.get("clientMsgID"),
+                    serverMsgID=item.get("serverMsgID"),
+                )
+            )
+        return results
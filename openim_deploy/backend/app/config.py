@@ -16,12 +16,43 @@ class Settings(BaseSettings):
     openim_ws_url: str = "wss://api.guanqunhuang.com/msg_gateway"
 
     request_timeout_seconds: float = 10.0
+    connect_timeout_seconds: float = 3.0
+    http_max_connections: int = 100
+    http_max_keepalive_connections: int = 20
+    http_keepalive_expiry_seconds: float = 30.0
+    retry_max_attempts: int = 3
+    retry_backoff_seconds: float = 0.1
+    retry_budget_ratio: float = 0.2
+    retry_budget_min_per_second: float = 5.0
+    breaker_failure_threshold: int = 5
+    breaker_reset_seconds: float = 10.0
+    hedge_delay_seconds: float = 0.0
+    proxy_max_inflight_bytes: int = 8 * 1024 * 1024
+    proxy_cache_paths: str = ""
+    proxy_cache_ttl_seconds: float = 30.0
+    proxy_cache_max_bytes: int = 32 * 1024 * 1024
+    proxy_coalesce_paths: str = ""
     default_platform_id: int = 1
 
     supabase_jwt_secret: Union[str, None] = None
+    supabase_jwks_url: Union[str, None] = None
+    supabase_jwt_audience: str = "authenticated"
+    jwks_refresh_seconds: float = 600.0
+    jwks_min_refresh_interval_seconds: float = 30.0
+    auth_cache_max_entries: int = 50_000
 
     im_admin_user_id: str = "imAdmin"
 
+    batch_send_concurrency: int = 8
+    batch_send_chunk_size: int = 100
+    batch_send_recipient_burst: int = 5000
+    batch_send_recipients_per_second: float = 10.0
+
+    token_safety_margin_seconds: float = 300.0
+    token_refresh_ahead_seconds: float = 900.0
+    token_fallback_ttl_seconds: float = 300.0
+    token_cache_max_entries: int = 50_000
+
     listen_host: str = "0.0.0.0"
     listen_port: int = 8080
 
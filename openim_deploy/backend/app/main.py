@@ -1,12 +1,17 @@
+import asyncio
+import logging
+import math
 from contextlib import asynccontextmanager
 
 import httpx
-from typing import Optional, Any
+from typing import AsyncIterator, Optional, Any
 
 from fastapi import Depends, FastAPI, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
 import json
 
-from .auth import AuthContext, get_auth_context
+from .auth import AuthContext, create_verifier, get_auth_context
+from .batch_send import BatchSender, RecipientQuota, text_message
 from .config import Settings, get_settings
 from .models import (
     AccountLoginRequest,
@@ -15,23 +20,79 @@ from .models import (
     FriendRequestBody,
     FriendResponseBody,
     HealthResponse,
+    MessageBatchSendBody,
     MessageSendBody,
     TokenRequest,
     TokenResponse,
 )
 from .openim import OpenIMClient
+from .proxy import ByteBudget, buffered_openim_post, stream_openim_post
+from .resilience import is_read
+from .response_cache import ResponseCache
+from .single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+
+def _read_paths(name: str, value: str) -> frozenset:
+    """Comma-separated proxy paths; anything but a `get_*` read is dropped with a warning.
+
+    A write served from the cache or shared with an identical concurrent call
+    would never reach OpenIM, and would not invalidate the cache either.
+    """
+    paths = {p.strip() for p in value.split(",") if p.strip()}
+    for path in sorted(p for p in paths if not is_read(p)):
+        logger.warning("%s: ignoring %s, only get_* reads can be cached or coalesced", name, path)
+    return frozenset(p for p in paths if is_read(p))
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     settings = get_settings()
-    http_client = httpx.AsyncClient(timeout=settings.request_timeout_seconds)
+    http_client = httpx.AsyncClient(
+        timeout=httpx.Timeout(settings.request_timeout_seconds, connect=settings.connect_timeout_seconds),
+        limits=httpx.Limits(
+            max_connections=settings.http_max_connections,
+            max_keepalive_connections=settings.http_max_keepalive_connections,
+            keepalive_expiry=settings.http_keepalive_expiry_seconds,
+        ),
+    )
     app.state.settings = settings
     app.state.http_client = http_client
     app.state.openim = OpenIMClient(settings, http_client)
+    app.state.proxy_budget = ByteBudget(settings.proxy_max_inflight_bytes)
+    app.state.response_cache = ResponseCache(
+        paths=_read_paths("PROXY_CACHE_PATHS", settings.proxy_cache_paths),
+        ttl_seconds=settings.proxy_cache_ttl_seconds,
+        max_bytes=settings.proxy_cache_max_bytes,
+    )
+    app.state.coalesce_paths = _read_paths("PROXY_COALESCE_PATHS", settings.proxy_coalesce_paths)
+    app.state.proxy_flights = SingleFlight()
+    app.state.batch_sender = BatchSender(
+        app.state.openim,
+        concurrency=settings.batch_send_concurrency,
+        chunk_size=settings.batch_send_chunk_size,
+    )
+    app.state.batch_quota = RecipientQuota(
+        burst=settings.batch_send_recipient_burst,
+        per_second=settings.batch_send_recipients_per_second,
+    )
+    verifier = create_verifier(settings, http_client)
+    app.state.verifier = verifier
+    jwks_refresher = None
+    if verifier.jwks is not None:
+        try:
+            await verifier.jwks.refresh()
+        except Exception as exc:
+            # Unknown kids retry the fetch on demand, so a JWKS hiccup at boot is not fatal.
+            logger.warning("initial JWKS fetch from %s failed: %s", verifier.jwks.url, exc)
+        jwks_refresher = asyncio.create_task(verifier.jwks.run())
     try:
         yield
     finally:
+        if jwks_refresher is not None:
+            jwks_refresher.cancel()
+        await app.state.openim.tokens.aclose()
         await http_client.aclose()
 
 
@@ -54,6 +115,34 @@ async def health() -> HealthResponse:
     return HealthResponse()
 
 
+@app.get("/stats/tokens")
+async def token_cache_stats(openim: OpenIMClient = Depends(get_openim_client)) -> dict:
+    return openim.tokens.stats()
+
+
+@app.get("/stats/upstream")
+async def upstream_stats(openim: OpenIMClient = Depends(get_openim_client)) -> dict:
+    return openim.upstream.stats()
+
+
+@app.get("/stats/proxy-cache")
+async def proxy_cache_stats() -> dict:
+    return get_response_cache().stats()
+
+
+@app.get("/stats/coalescing")
+async def coalescing_stats(
+    request: Request,
+    openim: OpenIMClient = Depends(get_openim_client),
+) -> dict:
+    return {"openim": openim.flights.stats(), "proxy": request.app.state.proxy_flights.stats()}
+
+
+@app.get("/stats/auth")
+async def auth_stats(request: Request) -> dict:
+    return request.app.state.verifier.stats()
+
+
 async def _parse_account_body(request: Request) -> AccountLoginRequest:
     try:
         payload: Any = await request.json()
@@ -93,26 +182,35 @@ async def account_login(
     )
 
 
+def get_batch_sender() -> BatchSender:
+    return app.state.batch_sender
+
+
+def get_proxy_budget() -> ByteBudget:
+    return app.state.proxy_budget
+
+
+def get_response_cache() -> ResponseCache:
+    return app.state.response_cache
+
+
 async def proxy_openim_post(
     request: Request,
     openim: OpenIMClient,
     path: str,
 ) -> Response:
-    body = await request.body()
-    headers = {}
-    for header in ["Content-Type", "operationID", "token"]:
-        if header_value := request.headers.get(header):
-            headers[header] = header_value
-    resp = await openim._http.post(
-        f"{openim._base}{path}",
-        content=body,
-        headers=headers,
-    )
-    return Response(
-        content=resp.content,
-        status_code=resp.status_code,
-        media_type=resp.headers.get("content-type"),
-    )
+    cache = get_response_cache()
+    if cache.cacheable(path) or path in app.state.coalesce_paths:
+        return await buffered_openim_post(request, openim, cache, app.state.proxy_flights, path)
+    if is_read(path):
+        return await stream_openim_post(request, openim, get_proxy_budget(), path)
+    # Invalidate on both sides of a write: before, so nothing stale is served while it runs, and
+    # after, so reads that raced it do not repopulate the family with pre-write answers.
+    cache.invalidate(path)
+    try:
+        return await stream_openim_post(request, openim, get_proxy_budget(), path)
+    finally:
+        cache.invalidate(path)
 
 
 @app.post("/user/{subpath:path}")
@@ -145,6 +243,26 @@ async def proxy_group_routes(
     return await proxy_openim_post(request, openim, path)
 
 
+@app.post("/msg/{subpath:path}")
+async def proxy_msg_routes(
+    subpath: str,
+    request: Request,
+    openim: OpenIMClient = Depends(get_openim_client),
+):
+    path = f"/msg/{subpath}" if subpath else "/msg"
+    return await proxy_openim_post(request, openim, path)
+
+
+@app.post("/conversation/{subpath:path}")
+async def proxy_conversation_routes(
+    subpath: str,
+    request: Request,
+    openim: OpenIMClient = Depends(get_openim_client),
+):
+    path = f"/conversation/{subpath}" if subpath else "/conversation"
+    return await proxy_openim_post(request, openim, path)
+
+
 @app.post("/api/v1/token", response_model=TokenResponse)
 async def issue_token(
     body: TokenRequest,
@@ -170,13 +288,13 @@ async def send_friend_request(
     openim: OpenIMClient = Depends(get_openim_client),
 ) -> ActionResult:
     from_user = resolve_user_id(body.fromUserID, auth_ctx)
-    token_data = await openim.get_user_token(from_user, None)
     payload = {
         "fromUserID": from_user,
         "toUserID": body.toUserID,
         "reqMsg": body.reqMsg or "",
     }
-    await openim.post_with_token("/friend/add_friend", token_data["token"], payload)
+    await openim.post_as_user("/friend/add_friend", from_user, payload)
+    get_response_cache().invalidate("/friend/add_friend")
     return ActionResult()
 
 
@@ -187,14 +305,14 @@ async def respond_friend_request(
     openim: OpenIMClient = Depends(get_openim_client),
 ) -> ActionResult:
     to_user = resolve_user_id(body.toUserID, auth_ctx)
-    token_data = await openim.get_user_token(to_user, None)
     payload = {
         "fromUserID": body.fromUserID,
         "toUserID": to_user,
         "handleResult": 1 if body.accept else -1,
         "handleMsg": body.handleMsg or "",
     }
-    await openim.post_with_token("/friend/add_friend_response", token_data["token"], payload)
+    await openim.post_as_user("/friend/add_friend_response", to_user, payload)
+    get_response_cache().invalidate("/friend/add_friend_response")
     return ActionResult()
 
 
@@ -205,15 +323,50 @@ async def send_message(
     openim: OpenIMClient = Depends(get_openim_client),
 ) -> ActionResult:
     sender = resolve_user_id(body.sendID, auth_ctx)
-    admin_token = await openim.get_admin_token()
-    payload = {
-        "recvID": body.toUserID,
-        "sendID": sender,
-        "senderPlatformID": 1,
-        "contentType": 101,
-        "sessionType": 1,
-        "content": {"content": body.text},
-        "clientMsgID": body.clientMsgID or "",
-    }
-    await openim.post_with_token("/msg/send_msg", admin_token["token"], payload)
+    payload = text_message(sender, body.toUserID, body.text, body.clientMsgID)
+    await openim.post_as_admin("/msg/send_msg", payload)
     return ActionResult()
+
+
+@app.post("/api/v1/message/batch_send")
+async def batch_send_messages(
+    request: Request,
+    body: MessageBatchSendBody,
+    auth_ctx: AuthContext = Depends(get_auth_context),
+    batch_sender: BatchSender = Depends(get_batch_sender),
+) -> StreamingResponse:
+    # Sends go out with the admin token, so the sender must be a verified identity, never the debug header.
+    if not request.app.state.verifier.enforced:
+        raise HTTPException(
+            status_code=403,
+            detail="batch send requires SUPABASE_JWT_SECRET or SUPABASE_JWKS_URL",
+        )
+    sender = auth_ctx.user_id
+    if body.sendID and body.sendID != sender:
+        raise HTTPException(status_code=403, detail="sendID must be the authenticated user")
+    recipients = len(body.messages) or len(set(body.toUserIDs))
+    quota: RecipientQuota = request.app.state.batch_quota
+    if recipients > quota.burst:
+        raise HTTPException(
+            status_code=413,
+            detail=f"at most {quota.burst} recipients per batch (BATCH_SEND_RECIPIENT_BURST)",
+        )
+    wait = quota.take(sender, recipients)
+    if wait > 0:
+        raise HTTPException(
+            status_code=429,
+            detail="batch send quota exhausted",
+            headers={"Retry-After": str(max(1, math.ceil(wait)))},
+        )
+
+    async def lines() -> AsyncIterator[str]:
+        sent = failed = 0
+        async for result in batch_sender.send(sender, body):
+            if result.ok:
+                sent += 1
+            else:
+                failed += 1
+            yield result.model_dump_json(exclude_none=True) + "\n"
+        yield json.dumps({"done": True, "sent": sent, "failed": failed}, separators=(",", ":")) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
@@ -1,7 +1,9 @@
 from datetime import datetime
-from typing import Any, Optional
+from typing import Any, List, Optional
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
+
+MAX_BATCH_RECIPIENTS = 5000
 
 
 def utc_ts_ms() -> int:
@@ -46,6 +48,38 @@ class MessageSendBody(BaseModel):
     clientMsgID: Optional[str] = None
 
 
+class BatchMessageItem(BaseModel):
+    toUserID: str
+    text: str
+    clientMsgID: Optional[str] = None
+
+
+class MessageBatchSendBody(BaseModel):
+    """Either one `text` for every user in `toUserIDs`, or a list of per-recipient `messages`."""
+
+    sendID: Optional[str] = None
+    text: Optional[str] = None
+    toUserIDs: List[str] = Field(default_factory=list, max_length=MAX_BATCH_RECIPIENTS)
+    messages: List[BatchMessageItem] = Field(default_factory=list, max_length=MAX_BATCH_RECIPIENTS)
+
+    @model_validator(mode="after")
+    def check_shape(self) -> "MessageBatchSendBody":
+        if self.messages:
+            if self.toUserIDs or self.text is not None:
+                raise ValueError("send either messages or text + toUserIDs, not both")
+        elif not self.toUserIDs or not self.text:
+            raise ValueError("text and toUserIDs are required when messages is empty")
+        return self
+
+
+class MessageSendResult(BaseModel):
+    toUserID: str
+    ok: bool
+    clientMsgID: Optional[str] = None
+    serverMsgID: Optional[str] = None
+    detail: Optional[Any] = None
+
+
 class ActionResult(BaseModel):
     ok: bool = True
     detail: Optional[Any] = None
@@ -1,40 +1,97 @@
 from typing import Optional, Dict, Any
+import json as json_module
 import uuid
 
 import httpx
 from fastapi import HTTPException, status
 
 from .config import Settings
+from .resilience import RetryBudget, UpstreamPolicy, is_idempotent
+from .single_flight import SingleFlight
+from .token_cache import TokenCache
+
+# errCodes OpenIM uses for expired, malformed, kicked or unknown tokens.
+TOKEN_ERROR_CODES = frozenset(range(1501, 1508))
+
+ADMIN_TOKEN_KEY = ("admin",)
 
 
 def new_operation_id(prefix: str) -> str:
     return f"{prefix}-{uuid.uuid4().hex}"
 
 
+class OpenIMError(HTTPException):
+    def __init__(self, path: str, err_code: int, err_msg: str) -> None:
+        super().__init__(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"{path} -> {err_code}: {err_msg}",
+        )
+        self.err_code = err_code
+
+
 class OpenIMClient:
     def __init__(self, settings: Settings, http_client: httpx.AsyncClient) -> None:
         self._settings = settings
         self._http = http_client
         self._base = settings.openim_base_url.rstrip("/")
+        self.tokens = TokenCache(
+            safety_margin_seconds=settings.token_safety_margin_seconds,
+            refresh_ahead_seconds=settings.token_refresh_ahead_seconds,
+            fallback_ttl_seconds=settings.token_fallback_ttl_seconds,
+            max_entries=settings.token_cache_max_entries,
+        )
+        self.upstream = UpstreamPolicy(
+            max_attempts=settings.retry_max_attempts,
+            backoff_seconds=settings.retry_backoff_seconds,
+            budget=RetryBudget(settings.retry_budget_ratio, settings.retry_budget_min_per_second),
+            failure_threshold=settings.breaker_failure_threshold,
+            reset_seconds=settings.breaker_reset_seconds,
+            hedge_delay_seconds=settings.hedge_delay_seconds,
+        )
+        self.flights = SingleFlight()
 
     async def _post(self, path: str, json: dict, headers: Optional[dict] = None) -> dict:
+        if not is_idempotent(path):
+            return await self._send(path, json, headers)
+        # operationID differs per call and does not change the answer, so it stays out of the key.
+        key = (path, (headers or {}).get("token"), json_module.dumps(json, sort_keys=True))
+        return await self.flights.do(key, lambda: self._send(path, json, headers))
+
+    async def _send(self, path: str, json: dict, headers: Optional[dict] = None) -> dict:
         url = f"{self._base}{path}"
         req_headers = {"Content-Type": "application/json"}
         if headers:
             req_headers.update(headers)
-        resp = await self._http.post(url, json=json, headers=req_headers)
+        try:
+            resp = await self.upstream.call(
+                path,
+                lambda: self._http.post(url, json=json, headers=req_headers),
+                idempotent=is_idempotent(path),
+            )
+        except httpx.TransportError as exc:
+            raise HTTPException(
+                status_code=status.HTTP_502_BAD_GATEWAY,
+                detail=f"{path} -> upstream unavailable: {exc}",
+            ) from exc
         resp.raise_for_status()
         payload = resp.json()
         err_code = payload.get("errCode", 0)
         if err_code != 0:
             err_msg = payload.get("errMsg") or "OpenIM request failed"
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"{path} -> {err_code}: {err_msg}",
-            )
+            raise OpenIMError(path, err_code, err_msg)
         return payload.get("data") or payload
 
     async def get_user_token(self, user_id: str, platform_id: Optional[int] = None) -> dict:
+        platform_id = platform_id or self._settings.default_platform_id
+        return await self.tokens.get(
+            (user_id, platform_id),
+            lambda: self.fetch_user_token(user_id, platform_id),
+        )
+
+    async def get_admin_token(self) -> dict:
+        return await self.tokens.get(ADMIN_TOKEN_KEY, self.fetch_admin_token)
+
+    async def fetch_user_token(self, user_id: str, platform_id: Optional[int] = None) -> dict:
         operation_id = new_operation_id(self._settings.openim_operation_prefix)
         data = await self._post(
             "/auth/user_token",
@@ -47,7 +104,7 @@ class OpenIMClient:
         )
         return data
 
-    async def get_admin_token(self) -> dict:
+    async def fetch_admin_token(self) -> dict:
         data = await self._post(
             "/auth/get_admin_token",
             json={
@@ -64,3 +121,29 @@ class OpenIMClient:
             json=payload,
             headers={"operationID": operation_id, "token": token},
         )
+
+    async def post_as_user(
+        self, path: str, user_id: str, payload: dict, platform_id: Optional[int] = None
+    ) -> dict:
+        platform_id = platform_id or self._settings.default_platform_id
+        return await self._post_with_cached_token(
+            path,
+            payload,
+            (user_id, platform_id),
+            lambda: self.fetch_user_token(user_id, platform_id),
+        )
+
+    async def post_as_admin(self, path: str, payload: dict) -> dict:
+        return await self._post_with_cached_token(path, payload, ADMIN_TOKEN_KEY, self.fetch_admin_token)
+
+    async def _post_with_cached_token(self, path: str, payload: dict, key: tuple, fetch) -> dict:
+        token = (await self.tokens.get(key, fetch))["token"]
+        try:
+            return await self.post_with_token(path, token, payload)
+        except OpenIMError as exc:
+            if exc.err_code not in TOKEN_ERROR_CODES:
+                raise
+        # The cached token was revoked or kicked before it expired: drop it and retry once.
+        self.tokens.invalidate(key, token)
+        token = (await self.tokens.get(key, fetch))["token"]
+        return await self.post_with_token(path, token, payload)
@@ -0,0 +1,168 @@
+import asyncio
+import hashlib
+from typing import AsyncIterator
+
+import httpx
+from fastapi import HTTPException, Request
+from starlette.background import BackgroundTask
+from starlette.responses import Response, StreamingResponse
+
+from .openim import OpenIMClient
+from .response_cache import ResponseCache
+from .single_flight import SingleFlight
+
+REQUEST_HEADERS = (
+    "content-type",
+    "content-length",
+    "content-encoding",
+    "accept",
+    "accept-encoding",
+    "operationid",
+    "token",
+)
+RESPONSE_HEADERS = (
+    "content-type",
+    "content-length",
+    "content-encoding",
+    "cache-control",
+    "etag",
+    "last-modified",
+)
+
+
+class ByteBudget:
+    """Bounds the bytes that proxied bodies hold in memory across all in-flight requests.
+
+    A chunk is charged when it is read and released once the next hop has
+    taken it, so a slow client or upstream stalls only the requests it is
+    part of. A chunk larger than the whole budget is let through on its own
+    rather than blocking forever.
+    """
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self.in_use = 0
+        self._changed = asyncio.Condition()
+
+    async def acquire(self, size: int) -> None:
+        async with self._changed:
+            await self._changed.wait_for(lambda: self.in_use == 0 or self.in_use + size <= self.max_bytes)
+            self.in_use += size
+
+    async def release(self, size: int) -> None:
+        async with self._changed:
+            self.in_use -= size
+            self._changed.notify_all()
+
+    async def metered(self, chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+        async for chunk in chunks:
+            await self.acquire(len(chunk))
+            try:
+                yield chunk
+            finally:
+                await self.release(len(chunk))
+
+
+async def stream_openim_post(
+    request: Request,
+    openim: OpenIMClient,
+    budget: ByteBudget,
+    path: str,
+) -> StreamingResponse:
+    headers = {name: value for name in REQUEST_HEADERS if (value := request.headers.get(name))}
+    upstream_request = openim._http.build_request(
+        "POST",
+        f"{openim._base}{path}",
+        content=budget.metered(request.stream()),
+        headers=headers,
+        params=request.query_params,
+    )
+    # The body is consumed as it streams, so proxied calls are never retried; they only honour the breaker.
+    breaker = openim.upstream.admit(path)
+    try:
+        upstream = await openim._http.send(upstream_request, stream=True)
+    except httpx.RequestError as exc:
+        breaker.record(False)
+        raise HTTPException(status_code=502, detail=f"{path} -> upstream unavailable: {exc}") from exc
+    breaker.record(upstream.status_code < 500)
+
+    async def body() -> AsyncIterator[bytes]:
+        # aiter_raw passes compressed bytes through untouched; content-encoding is forwarded with them.
+        try:
+            async for chunk in budget.metered(upstream.aiter_raw()):
+                yield chunk
+        finally:
+            await upstream.aclose()
+
+    return StreamingResponse(
+        body(),
+        status_code=upstream.status_code,
+        headers={name: value for name in RESPONSE_HEADERS if (value := upstream.headers.get(name))},
+        background=BackgroundTask(upstream.aclose),
+    )
+
+
+async def buffered_openim_post(
+    request: Request,
+    openim: OpenIMClient,
+    cache: ResponseCache,
+    flights: SingleFlight,
+    path: str,
+) -> Response:
+    """Reads that are cached or coalesced: the body is needed for the key, so both directions are buffered."""
+    body = await request.body()
+    token = request.headers.get("token")
+    query = str(request.query_params)
+    subject = cache.subject_for(token)
+    cacheable = cache.cacheable(path)
+    if cacheable and subject is not None:
+        hit = cache.get(path, subject, query, body)
+        if hit is not None:
+            return Response(hit.body, media_type=hit.media_type, headers={"X-Bridge-Cache": "hit"})
+
+    headers = {
+        name: value
+        for name in REQUEST_HEADERS
+        if name not in ("content-length", "accept-encoding") and (value := request.headers.get(name))
+    }
+    # Identity encoding keeps the body servable to every caller that shares it, now or from the cache.
+    headers["accept-encoding"] = "identity"
+
+    async def fetch() -> httpx.Response:
+        generation = cache.generation(path)
+        breaker = openim.upstream.admit(path)
+        try:
+            upstream = await openim._http.post(
+                f"{openim._base}{path}", content=body, headers=headers, params=request.query_params
+            )
+        except httpx.RequestError as exc:
+            breaker.record(False)
+            raise HTTPException(status_code=502, detail=f"{path} -> upstream unavailable: {exc}") from exc
+        breaker.record(upstream.status_code < 500)
+        if cacheable and upstream.status_code == 200 and token:
+            try:
+                payload = upstream.json()
+            except ValueError:
+                payload = None
+            cache.store(path, token, query, body, payload, upstream.content, upstream.headers.get("content-type"), generation)
+        return upstream
+
+    # Only identical calls from the same caller share an answer: OpenIM authorizes per token, so
+    # handing one user's response to another would skip that check.
+    caller = subject or hashlib.sha256((token or "").encode()).hexdigest()
+    key = (path, caller, hashlib.sha256(body).digest(), query)
+    upstream = await flights.do(key, fetch)
+
+    response_headers = {
+        name: value
+        for name in RESPONSE_HEADERS
+        if name not in ("content-length", "content-encoding", "content-type") and (value := upstream.headers.get(name))
+    }
+    if cacheable:
+        response_headers["X-Bridge-Cache"] = "miss"
+    return Response(
+        upstream.content,
+        status_code=upstream.status_code,
+        media_type=upstream.headers.get("content-type"),
+        headers=response_headers,
+    )
@@ -0,0 +1,221 @@
+import asyncio
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+import httpx
+from fastapi import HTTPException, status
+
+Attempt = Callable[[], Awaitable[httpx.Response]]
+
+# Paths that only mint tokens or read; sending them twice is harmless.
+IDEMPOTENT_PATHS = frozenset({"/auth/user_token", "/auth/get_admin_token"})
+
+
+def is_read(path: str) -> bool:
+    return path.rsplit("/", 1)[-1].startswith("get_")
+
+
+def is_idempotent(path: str) -> bool:
+    return path in IDEMPOTENT_PATHS or is_read(path)
+
+
+class RetryBudget:
+    """Caps retries (and hedges) at `ratio` of recent requests, with a floor of `min_per_second`.
+
+    Each request deposits `ratio` of a retry and each retry withdraws one, so
+    during an outage retries stop adding load instead of multiplying it.
+    """
+
+    def __init__(self, ratio: float = 0.2, min_per_second: float = 5.0, window_seconds: float = 10.0) -> None:
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.cap = max(min_per_second * window_seconds, 1.0)
+        self._balance = min(min_per_second, self.cap)
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._balance = min(self._balance + (now - self._updated) * self.min_per_second, self.cap)
+        self._updated = now
+
+    def deposit(self) -> None:
+        self._refill()
+        self._balance = min(self._balance + self.ratio, self.cap)
+
+    def try_withdraw(self) -> bool:
+        self._refill()
+        if self._balance < 1.0:
+            return False
+        self._balance -= 1.0
+        return True
+
+
+class CircuitBreaker:
+    """Opens after `failure_threshold` consecutive failures and rejects calls for `reset_seconds`.
+
+    After that one probe goes through (half-open): success closes the
+    breaker, failure opens it again. A probe that never reports back is
+    replaced after another `reset_seconds`.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_seconds: float = 10.0) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = self.CLOSED
+        self.failures = 0
+        self.trips = 0
+        self._opened_at = 0.0
+        self._probe_at = None
+
+    def allow(self) -> bool:
+        if self.state == self.CLOSED:
+            return True
+        now = time.monotonic()
+        if self.state == self.OPEN:
+            if now - self._opened_at < self.reset_seconds:
+                return False
+            self.state = self.HALF_OPEN
+        if self._probe_at is not None and now - self._probe_at < self.reset_seconds:
+            return False
+        self._probe_at = now
+        return True
+
+    def record(self, ok: bool) -> None:
+        self._probe_at = None
+        if ok:
+            self.state = self.CLOSED
+            self.failures = 0
+            return
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.trips += 1
+            self.state = self.OPEN
+            self._opened_at = time.monotonic()
+
+
+class UpstreamPolicy:
+    """Retries, per-path circuit breakers and hedging around calls to OpenIM.
+
+    Transport errors and 5xx responses count as failures. OpenIM errCodes
+    arrive with HTTP 200, so they never trip a breaker.
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        backoff_seconds: float = 0.1,
+        budget: RetryBudget = None,
+        failure_threshold: int = 5,
+        reset_seconds: float = 10.0,
+        hedge_delay_seconds: float = 0.0,
+        max_breakers: int = 256,
+    ) -> None:
+        self.max_attempts = max(max_attempts, 1)
+        self.backoff_seconds = backoff_seconds
+        self.budget = budget or RetryBudget()
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.hedge_delay_seconds = hedge_delay_seconds
+        self.max_breakers = max_breakers
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self.requests = 0
+        self.retries = 0
+        self.retries_denied = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.rejected = 0
+
+    def breaker(self, path: str) -> CircuitBreaker:
+        key = path
+        if key not in self._breakers and len(self._breakers) >= self.max_breakers:
+            # Proxied paths come from clients; past the cap they share one breaker per top-level segment.
+            key = "/" + path.lstrip("/").split("/", 1)[0]
+        breaker = self._breakers.get(key)
+        if breaker is None:
+            breaker = self._breakers[key] = CircuitBreaker(self.failure_threshold, self.reset_seconds)
+        return breaker
+
+    def admit(self, path: str) -> CircuitBreaker:
+        breaker = self.breaker(path)
+        if not breaker.allow():
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail=f"{path} -> OpenIM unavailable, circuit open",
+            )
+        return breaker
+
+    async def call(self, path: str, attempt: Attempt, idempotent: bool = False) -> httpx.Response:
+        self.requests += 1
+        self.budget.deposit()
+        attempts = self.max_attempts if idempotent else 1
+        hedge = idempotent and is_read(path) and self.hedge_delay_seconds > 0
+        n = 0
+        while True:
+            breaker = self.admit(path)
+            n += 1
+            last = n >= attempts
+            try:
+                resp = await (self._hedged(attempt) if hedge else attempt())
+            except httpx.TransportError:
+                breaker.record(False)
+                if last or not self._may_retry():
+                    raise
+            else:
+                ok = resp.status_code < 500
+                breaker.record(ok)
+                if ok or last or not self._may_retry():
+                    return resp
+            await asyncio.sleep(self.backoff_seconds * (2 ** (n - 1)) * random.uniform(0.5, 1.5))
+
+    def _may_retry(self) -> bool:
+        if self.budget.try_withdraw():
+            self.retries += 1
+            return True
+        self.retries_denied += 1
+        return False
+
+    async def _hedged(self, attempt: Attempt) -> httpx.Response:
+        first = asyncio.ensure_future(attempt())
+        tasks = [first]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.hedge_delay_seconds)
+            if done or not self.budget.try_withdraw():
+                return await first
+            self.hedges += 1
+            second = asyncio.ensure_future(attempt())
+            tasks.append(second)
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None and task.result().status_code < 500:
+                        if task is second:
+                            self.hedge_wins += 1
+                        return task.result()
+            return first.result()
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "retries": self.retries,
+            "retries_denied": self.retries_denied,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "rejected": self.rejected,
+            "breakers": {
+                path: {"state": b.state, "failures": b.failures, "trips": b.trips}
+                for path, b in self._breakers.items()
+                if b.state != CircuitBreaker.CLOSED or b.trips
+            },
+        }
@@ -0,0 +1,156 @@
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+
+from jose import JWTError, jwt
+
+Key = Tuple[str, str, bytes]
+
+
+def path_family(path: str) -> str:
+    return "/" + path.lstrip("/").split("/", 1)[0]
+
+
+class CachedResponse:
+    __slots__ = ("body", "media_type", "expires_at", "family")
+
+    def __init__(self, body: bytes, media_type: Optional[str], expires_at: float, family: str) -> None:
+        self.body = body
+        self.media_type = media_type
+        self.expires_at = expires_at
+        self.family = family
+
+
+class ResponseCache:
+    """Read-through cache for proxied OpenIM reads, keyed by (path, token subject, query + body digest).
+
+    Only paths listed in `paths` are cached, and only answers with errCode 0.
+    The subject is the `UserID` inside the caller's OpenIM token. That claim is
+    trusted only after OpenIM has accepted the token, and only for `ttl_seconds`
+    afterwards, so a forged token cannot read someone else's entry.
+
+    Entries expire after `ttl_seconds`. Least recently used entries are evicted
+    once the bodies exceed `max_bytes`. A write on a path family (`/friend`,
+    `/group`, ...) drops every entry in that family and bumps its generation,
+    so a read that was in flight during the write does not store stale data.
+    """
+
+    def __init__(self, paths: Iterable[str] = (), ttl_seconds: float = 30.0, max_bytes: int = 32 * 1024 * 1024) -> None:
+        self.paths = frozenset(p for p in paths if p)
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max(max_bytes // 8, 1)
+        self.max_subjects = 50_000
+        self._entries: "OrderedDict[Key, CachedResponse]" = OrderedDict()
+        self._families: Dict[str, Set[Key]] = {}
+        self._generations: Dict[str, int] = {}
+        self._subjects: Dict[bytes, Tuple[str, float]] = {}
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def cacheable(self, path: str) -> bool:
+        return path in self.paths
+
+    def generation(self, path: str) -> int:
+        return self._generations.get(path_family(path), 0)
+
+    def subject_for(self, token: Optional[str]) -> Optional[str]:
+        if not token:
+            return None
+        digest = hashlib.sha256(token.encode()).digest()
+        known = self._subjects.get(digest)
+        if known is None or time.monotonic() >= known[1]:
+            self._subjects.pop(digest, None)
+            return None
+        return known[0]
+
+    @staticmethod
+    def _key(path: str, subject: str, query: str, body: bytes) -> Key:
+        digest = hashlib.sha256(query.encode())
+        digest.update(b"\0")
+        digest.update(body)
+        return (path, subject, digest.digest())
+
+    def get(self, path: str, subject: str, query: str, body: bytes) -> Optional[CachedResponse]:
+        key = self._key(path, subject, query, body)
+        entry = self._entries.get(key)
+        if entry is None or time.monotonic() >= entry.expires_at:
+            if entry is not None:
+                self._remove(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def store(
+        self,
+        path: str,
+        token: str,
+        query: str,
+        body: bytes,
+        payload: Any,
+        content: bytes,
+        media_type: Optional[str],
+        generation: int,
+    ) -> None:
+        if not isinstance(payload, dict) or payload.get("errCode", 0) != 0:
+            return
+        try:
+            subject = jwt.get_unverified_claims(token).get("UserID")
+        except JWTError:
+            return
+        if not subject:
+            return
+        now = time.monotonic()
+        # OpenIM just accepted this token, which is what makes its claims usable as a key.
+        if len(self._subjects) >= self.max_subjects:
+            self._subjects.pop(next(iter(self._subjects)))
+        self._subjects[hashlib.sha256(token.encode()).digest()] = (subject, now + self.ttl_seconds)
+        if generation != self.generation(path) or len(content) > self.max_entry_bytes:
+            return
+
+        key = self._key(path, subject, query, body)
+        if key in self._entries:
+            self._remove(key)
+        family = path_family(path)
+        self._entries[key] = CachedResponse(content, media_type, now + self.ttl_seconds, family)
+        self._families.setdefault(family, set()).add(key)
+        self.bytes += len(content)
+        self.stores += 1
+        while self.bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def invalidate(self, path: str) -> None:
+        family = path_family(path)
+        self._generations[family] = self._generations.get(family, 0) + 1
+        keys = self._families.pop(family, set())
+        for key in keys:
+            self._remove(key)
+        self.invalidations += 1
+
+    def _remove(self, key: Key) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self.bytes -= len(entry.body)
+        family = self._families.get(entry.family)
+        if family is not None:
+            family.discard(key)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
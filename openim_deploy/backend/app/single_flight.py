@@ -0,0 +1,41 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """Shares one in-flight call among concurrent callers asking for the same key.
+
+    Nothing is remembered once the call finishes; this only collapses
+    duplicates that overlap in time. Every caller receives the same result
+    object (or exception), so results must be treated as read-only.
+    """
+
+    def __init__(self) -> None:
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+        self.calls = 0
+        self.shared = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._calls.get(key)
+        if task is None:
+            self.calls += 1
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._finished(key, done))
+        else:
+            self.shared += 1
+        # shield: a caller that gives up must not cancel the call the others are waiting on.
+        return await asyncio.shield(task)
+
+    def _finished(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            task.exception()  # retrieved here in case every waiter was cancelled
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "upstream_calls": self.calls,
+            "calls_saved": self.shared,
+            "in_flight": len(self._calls),
+        }
@@ -0,0 +1,133 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+Fetch = Callable[[], Awaitable[dict]]
+
+
+class _Entry:
+    __slots__ = ("data", "expires_at", "refresh_at")
+
+    def __init__(self, data: dict, expires_at: float, refresh_at: float) -> None:
+        self.data = data
+        self.expires_at = expires_at
+        self.refresh_at = refresh_at
+
+    def view(self, now: float) -> dict:
+        # Callers hand `expireTimeSeconds` to clients, so report what is left, not the original TTL.
+        return {**self.data, "expireTimeSeconds": max(int(self.expires_at - now), 0)}
+
+
+class TokenCache:
+    """OpenIM tokens keyed by (user_id, platform_id), shared by every request in the process.
+
+    - An entry lives for `expireTimeSeconds` minus `safety_margin_seconds`.
+    - Within `refresh_ahead_seconds` of that, a hit still returns the cached
+      token but starts one background refresh, so callers never wait on expiry.
+    - Concurrent misses for a key share a single upstream call.
+    - `invalidate` drops a token OpenIM rejected; it is a no-op when the entry
+      already holds a newer token.
+    """
+
+    def __init__(
+        self,
+        safety_margin_seconds: float = 300.0,
+        refresh_ahead_seconds: float = 900.0,
+        fallback_ttl_seconds: float = 300.0,
+        max_entries: int = 50_000,
+    ) -> None:
+        self.safety_margin_seconds = safety_margin_seconds
+        self.refresh_ahead_seconds = refresh_ahead_seconds
+        self.fallback_ttl_seconds = fallback_ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self._background: Set[asyncio.Task] = set()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.refreshes = 0
+        self.invalidations = 0
+        self.fetch_errors = 0
+
+    async def get(self, key: Hashable, fetch: Fetch) -> dict:
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is not None and now < entry.expires_at:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            if now >= entry.refresh_at and key not in self._inflight:
+                self.refreshes += 1
+                task = self._start_fetch(key, fetch)
+                self._background.add(task)
+                task.add_done_callback(self._background.discard)
+            return entry.view(now)
+
+        self.misses += 1
+        task = self._inflight.get(key)
+        if task is None:
+            task = self._start_fetch(key, fetch)
+        else:
+            self.coalesced += 1
+        # shield: one caller giving up must not cancel the fetch the others are waiting on.
+        entry = await asyncio.shield(task)
+        return entry.view(time.monotonic())
+
+    def invalidate(self, key: Hashable, token: Optional[str] = None) -> None:
+        entry = self._entries.get(key)
+        if entry is None or (token is not None and entry.data.get("token") != token):
+            return
+        del self._entries[key]
+        self.invalidations += 1
+
+    def _start_fetch(self, key: Hashable, fetch: Fetch) -> asyncio.Task:
+        task = asyncio.create_task(self._fetch(key, fetch))
+        self._inflight[key] = task
+        task.add_done_callback(self._log_failure)
+        return task
+
+    async def _fetch(self, key: Hashable, fetch: Fetch) -> _Entry:
+        try:
+            data = await fetch()
+            ttl = float(data.get("expireTimeSeconds") or 0)
+            lifetime = max(ttl - self.safety_margin_seconds, 0.0) if ttl else self.fallback_ttl_seconds
+            now = time.monotonic()
+            entry = _Entry(data, now + lifetime, now + max(lifetime - self.refresh_ahead_seconds, lifetime / 2))
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return entry
+        except Exception:
+            self.fetch_errors += 1
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    @staticmethod
+    def _log_failure(task: asyncio.Task) -> None:
+        # Also marks the exception as retrieved when every waiter was cancelled.
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning("OpenIM token fetch failed: %s", task.exception())
+
+    async def aclose(self) -> None:
+        tasks = list(self._background) + list(self._inflight.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "inflight": len(self._inflight),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "refreshes": self.refreshes,
+            "invalidations": self.invalidations,
+            "fetch_errors": self.fetch_errors,
+        }